@@ -2,6 +2,8 @@
 ASGI config for skill_barter_zone project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP goes to Django; WebSocket connections go to the chat endpoint in
+``skillzone.chat``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
@@ -13,4 +15,27 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'skill_barter_zone.settings')
 
-application = get_asgi_application()
+# Set up Django (apps, settings) before importing anything that uses models.
+django_application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler  # noqa: E402
+
+from skillzone.chat import chat_application  # noqa: E402
+
+if settings.DEBUG:
+    # Serve static files like runserver does during development.
+    django_application = ASGIStaticFilesHandler(django_application)
+
+if settings.WARM_UP:
+    # Compile templates and build the URL resolver before serving requests.
+    from skillzone.startup import warm_up  # noqa: E402
+
+    warm_up()
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        await chat_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
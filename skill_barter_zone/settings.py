@@ -11,7 +11,7 @@ https://docs.djangoproject.com/en/3.1/ref/settings/
 """
 
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 import os
 
 
@@ -49,8 +49,11 @@ CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap4"
 CRISPY_TEMPLATE_PACK = "bootstrap4"
 
 MIDDLEWARE = [
+    'skillzone.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'skillzone.staticfiles.StaticFilesMiddleware',
+    'skillzone.replicas.PrimaryPinningMiddleware',
+    'skillzone.sessions.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -71,6 +74,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'skillzone.context_processors.nav_counts',
             ],
         },
     },
@@ -78,16 +82,75 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'skill_barter_zone.wsgi.application'
 
+# Compile all project templates and the URL resolver when wsgi.py/asgi.py
+# load, before the first request (skillzone.startup).
+WARM_UP = config('WARM_UP', default=True, cast=bool)
+
 
 # Database
 # https://docs.djangoproject.com/en/3.1/ref/settings/#databases
 
+# DATABASE_PROFILE=postgresql switches to PostgreSQL (needs psycopg); the
+# connection details come from the environment or a .env file.
+DATABASE_PROFILE = config('DATABASE_PROFILE', default='sqlite')
+
+if DATABASE_PROFILE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config('DATABASE_NAME', default='skill_barter_zone'),
+            'USER': config('DATABASE_USER', default=''),
+            'PASSWORD': config('DATABASE_PASSWORD', default=''),
+            'HOST': config('DATABASE_HOST', default=''),
+            'PORT': config('DATABASE_PORT', default=''),
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': config('DATABASE_NAME', default=str(BASE_DIR / 'db.sqlite3')),
+            'OPTIONS': {
+                # atomic() takes the write lock up front, where it can wait
+                # for it, instead of failing when it first writes.
+                'transaction_mode': config('SQLITE_TRANSACTION_MODE', default='IMMEDIATE'),
+            },
+        }
+    }
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Keep connections open between requests, checking them before reuse.
+DATABASES['default']['CONN_MAX_AGE'] = config('CONN_MAX_AGE', default=60, cast=int)
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+# Read replicas (skillzone.replicas): a comma-separated list of SQLite files,
+# or of PostgreSQL hosts with DATABASE_PROFILE=postgresql. Reads are spread
+# over them; a client that wrote reads from the primary for
+# REPLICA_PIN_SECONDS.
+REPLICA_DATABASES = []
+for number, location in enumerate(config('DATABASE_REPLICAS', default='', cast=Csv()), 1):
+    alias = f'replica{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST' if DATABASE_PROFILE == 'postgresql' else 'NAME': location,
+        'OPTIONS': dict(DATABASES['default'].get('OPTIONS', {})),
+        'TEST': {'MIRROR': 'default'},
     }
+    REPLICA_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ['skillzone.replicas.ReplicaRouter']
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=10, cast=int)
+
+# Run on every new SQLite connection (skillzone.database).
+SQLITE_PRAGMAS = {
+    'journal_mode': config('SQLITE_JOURNAL_MODE', default='WAL'),
+    'synchronous': config('SQLITE_SYNCHRONOUS', default='NORMAL'),
+    # Generous: SQLite's lock waits are not fair, and with many threads an
+    # unlucky writer can wait several seconds for its turn.
+    'busy_timeout': config('SQLITE_BUSY_TIMEOUT_MS', default=20000, cast=int),
+    'mmap_size': config('SQLITE_MMAP_SIZE', default=256 * 1024 * 1024, cast=int),
+    # Negative: KiB rather than pages.
+    'cache_size': -config('SQLITE_CACHE_SIZE_KB', default=64 * 1024, cast=int),
+    'temp_store': 'MEMORY',
 }
 
 
@@ -138,19 +201,132 @@ MEDIA_ROOT = (BASE_DIR / 'media')
 
 MEDIA_URL = '/media/'
 
+# Background threads rendering avatar thumbnails of uploads (users.thumbnails).
+THUMBNAIL_WORKERS = 2
+
 STATICFILES_DIRS = [
     BASE_DIR / 'static'
 ]
 
 STATIC_ROOT = (BASE_DIR / 'asset')
 
+# collectstatic writes content-hashed copies plus .gz/.br siblings, which
+# skillzone.staticfiles.StaticFilesMiddleware serves with immutable caching.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'skillzone.staticfiles.CompressedManifestStaticFilesStorage',
+    },
+}
+
+
+# Mail is queued in the outbox table and sent by `manage.py deliver_email`
+# over OUTBOX_DELIVERY_BACKEND (skillzone.outbox). Any email backend works;
+# only SMTP's reply codes let permanent failures skip the retries.
+EMAIL_BACKEND = 'skillzone.outbox.OutboxEmailBackend'
+OUTBOX_DELIVERY_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_MAX_ATTEMPTS = 8
+# Seconds before the first retry; doubled after every further failure.
+OUTBOX_RETRY_DELAY = 60
+
+# Notification digests (skillzone.notifications), queued by
+# `manage.py send_digests`: at most one per user per interval (seconds),
+# users handled in chunks by a pool of worker threads.
+NOTIFICATION_DIGEST_INTERVAL = config('NOTIFICATION_DIGEST_INTERVAL', default=60 * 60, cast=int)
+NOTIFICATION_DIGEST_CHUNK_SIZE = 100
+NOTIFICATION_DIGEST_WORKERS = 4
 
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_HOST_USER = config('Email_for_otp')
 EMAIL_HOST_PASSWORD = config('Password_for_otp')
 EMAIL_PORT = config('Port_for_otp')
 EMAIL_USE_TLS = True
+EMAIL_TIMEOUT = 30
 
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Rows per page for the keyset-paginated list views (skillzone.pagination).
+PAGINATE_BY = 20
+
+# Publish/subscribe backend for live chat sockets (skillzone.channel_layers).
+# The in-memory layer only reaches sockets held by the same process.
+CHAT_CHANNEL_LAYER = 'skillzone.channel_layers.InMemoryChannelLayer'
+
+# Sampled request profiling (skillzone.profiling): a share of requests
+# (0 turns it off) gets a Server-Timing header with SQL, template and view
+# times, and those slower than PROFILING_SLOW_MS are logged to
+# PROFILING_LOG_FILE with their most repeated SQL.
+PROFILING_SAMPLE_RATE = config('PROFILING_SAMPLE_RATE', default=0.01, cast=float)
+PROFILING_SLOW_MS = config('PROFILING_SLOW_MS', default=500, cast=int)
+PROFILING_SERVER_TIMING = config('PROFILING_SERVER_TIMING', default=True, cast=bool)
+PROFILING_LOG_FILE = config('PROFILING_LOG_FILE', default=str(BASE_DIR / 'slow_requests.log'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'slow_requests': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': PROFILING_LOG_FILE,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            # Created on the first slow request, not at startup.
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'skillzone.profiling': {
+            'handlers': ['slow_requests'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+# Session and flash message storage (skillzone.sessions). SESSION_PROFILE:
+#   db              Django's defaults: a django_session query per request
+#   cached_db       sessions read from the 'sessions' cache, written through
+#                   to the database; flash messages in a cookie. Needs a
+#                   cache shared by every worker (check skillzone.W001).
+#   signed_cookies  no server-side state at all; flash messages in a
+#                   cookie. A copied cookie stays valid until it expires,
+#                   as logging out cannot revoke it.
+SESSION_PROFILE = config('SESSION_PROFILE', default='db')
+SESSION_ENGINE = {
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+    'db': 'django.contrib.sessions.backends.db',
+}[SESSION_PROFILE]
+SESSION_CACHE_ALIAS = 'sessions'
+if SESSION_PROFILE != 'db':
+    MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
+# Per-user navbar counters are cached (skillzone.counters). Local memory is
+# per process; use a shared backend (Redis, Memcached) with several workers
+# so that invalidations reach every process.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Rendered skill cards (skillzone.fragments), kept apart so that they
+    # cannot evict the counters. Entries are versioned, never deleted.
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'skillzone-fragments',
+        'TIMEOUT': 24 * 60 * 60,
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+    # Sessions with SESSION_PROFILE=cached_db. A miss falls back to the
+    # database, but with several workers this must be a shared backend too,
+    # or a process can keep serving a session that was logged out elsewhere;
+    # the skillzone.W001 check warns while it is local memory.
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'skillzone-sessions',
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+}
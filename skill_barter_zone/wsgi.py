@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'skill_barter_zone.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.WARM_UP:
+    # Compile templates and build the URL resolver before serving requests.
+    from skillzone.startup import warm_up  # noqa: E402
+
+    warm_up()
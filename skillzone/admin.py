@@ -1,5 +1,21 @@
 from django.contrib import admin
-from .models import Skill, Barter, Feedback
+from django.utils import timezone
+from .exports import export_for_model, export_response
+from .models import Skill, Barter, BarterEvent, Feedback, Message, BarterCycle, BarterCycleLeg, ImportCheckpoint, OutgoingEmail
+from .transitions import apply_transition
+
+
+# Streamed, so "select all" on a filtered changelist exports every
+# matching row without loading them (see skillzone.exports).
+
+@admin.action(description='Export selected rows as CSV')
+def export_csv(modeladmin, request, queryset):
+    return export_response(request, export_for_model(modeladmin.model), queryset, 'csv')
+
+
+@admin.action(description='Export selected rows as NDJSON')
+def export_ndjson(modeladmin, request, queryset):
+    return export_response(request, export_for_model(modeladmin.model), queryset, 'ndjson')
 
 
 @admin.register(Skill)
@@ -23,18 +39,79 @@ class BarterAdmin(admin.ModelAdmin):
         'skill_from', 'skill_to',
         'status', 'date_requested'
     )
-    list_filter = ('status',)
-    actions = ['approve_barters']
+    list_filter = ('status', 'date_requested')
+    actions = ['approve_barters', export_csv, export_ndjson]
 
     def approve_barters(self, request, queryset):
-        queryset.filter(status="Pending").update(
-            status="Admin Approved",
-            admin=request.user
-        )
+        # One conditional update per barter, each logged as an event.
+        for barter in queryset.filter(status=Barter.STATUS_PENDING):
+            apply_transition(barter, 'approve', request.user)
     approve_barters.short_description = "Approve selected barters"
 
+
+@admin.register(BarterEvent)
+class BarterEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'barter', 'transition', 'from_status', 'to_status', 'actor', 'created_at')
+    list_filter = ('transition', 'to_status')
+    search_fields = ('barter__id', 'actor__username')
+
+    # Append-only audit log.
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 @admin.register(Feedback)
 class FeedbackAdmin(admin.ModelAdmin):
     list_display = ('id', 'barter', 'user', 'rating', 'date')
     list_filter = ('rating', 'date')
     search_fields = ('user__username', 'barter__id')
+    actions = [export_csv, export_ndjson]
+
+
+@admin.register(Message)
+class MessageAdmin(admin.ModelAdmin):
+    list_display = ('id', 'sender', 'recipient', 'created_at', 'is_read')
+    list_filter = ('is_read', 'created_at')
+    search_fields = ('sender__username', 'recipient__username')
+    raw_id_fields = ('sender', 'recipient')
+    actions = [export_csv, export_ndjson]
+
+
+class BarterCycleLegInline(admin.TabularInline):
+    model = BarterCycleLeg
+    raw_id_fields = ('teacher', 'learner')
+    extra = 0
+
+
+@admin.register(BarterCycle)
+class BarterCycleAdmin(admin.ModelAdmin):
+    list_display = ('id', 'signature', 'length', 'status', 'created_at')
+    list_filter = ('status', 'length')
+    inlines = [BarterCycleLegInline]
+
+
+@admin.register(ImportCheckpoint)
+class ImportCheckpointAdmin(admin.ModelAdmin):
+    list_display = ('file_name', 'rows_done', 'users_created', 'rows_rejected', 'started_at', 'finished_at')
+    readonly_fields = ('digest',)
+
+
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ('id', 'subject', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('subject', 'recipients')
+    exclude = ('message',)
+    readonly_fields = ('claim', 'last_error')
+    actions = ['retry_now']
+
+    @admin.action(description='Retry selected messages now')
+    def retry_now(self, request, queryset):
+        queryset.exclude(status=OutgoingEmail.STATUS_SENT).update(
+            status=OutgoingEmail.STATUS_QUEUED, next_attempt_at=timezone.now(), claim=None
+        )
@@ -1,5 +1,12 @@
 from django.apps import AppConfig
+from django.core import checks
 
 
 class SkillzoneConfig(AppConfig):
     name = 'skillzone'
+
+    def ready(self):
+        import skillzone.signals
+        from skillzone.sessions import check_session_cache
+
+        checks.register(check_session_cache, checks.Tags.caches)
@@ -0,0 +1,106 @@
+"""
+Per-view latency benchmark.
+
+``benchmark_views`` requests every view that ``query_audit.view_urls`` can
+fill in as one user, through the test client, and records for each: the
+median and 95th percentile latency, the number of queries and the size of
+the response. ``compare`` checks a run against a stored baseline so that a
+slower view, or one that grew extra queries, is caught before it ships.
+
+Results are keyed by URL name (plus query string) rather than by URL, so
+runs against different data sets compare cleanly.
+"""
+
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from .query_audit import view_urls
+
+
+# GET views that change data; requesting them repeatedly measures nothing.
+STATE_CHANGING = ("skillzone:update_barter_status",)
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of ``values``."""
+    ordered = sorted(values)
+    index = max(int(round(fraction * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def _body_size(response):
+    if response.streaming:
+        return sum(len(chunk) for chunk in response.streaming_content)
+    return len(response.content)
+
+
+def benchmark_views(user, repeat=20, warmup=2):
+    """
+    Time every view as ``user``; return ``(results, skipped)``.
+
+    Each view is requested ``warmup`` times first (filling caches, as in a
+    running server) and then ``repeat`` times.
+    """
+    client = Client()
+    client.force_login(user)
+    urls, skipped = view_urls(user)
+    results = {}
+    for name, url in urls:
+        if name in STATE_CHANGING:
+            skipped.append(name)
+            continue
+        query = urlsplit(url).query
+        key = f"{name}?{query}" if query else name
+        for _ in range(warmup):
+            _body_size(client.get(url))
+
+        timings = []
+        queries = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as ctx:
+                start = time.perf_counter()
+                response = client.get(url)
+                size = _body_size(response)
+                timings.append((time.perf_counter() - start) * 1000)
+            queries.append(len(ctx.captured_queries))
+        results[key] = {
+            "url": url,
+            "status": response.status_code,
+            "p50_ms": round(percentile(timings, 0.5), 3),
+            "p95_ms": round(percentile(timings, 0.95), 3),
+            "queries": int(statistics.median(queries)),
+            "bytes": size,
+        }
+    return results, skipped
+
+
+def compare(baseline, results, tolerance=0.5, min_ms=5.0):
+    """
+    Regressions of ``results`` against ``baseline`` (both as returned by
+    ``benchmark_views``), as readable strings.
+
+    A view regresses when its p95 grew by more than ``tolerance`` (a
+    fraction) *and* by more than ``min_ms``, which keeps run-to-run
+    noise out, when it runs more queries, or when its status code changed.
+    Views missing from either side are ignored.
+    """
+    regressions = []
+    for key, current in results.items():
+        before = baseline.get(key)
+        if before is None:
+            continue
+        if current["status"] != before["status"]:
+            regressions.append(f"{key}: status {before['status']} -> {current['status']}")
+        if current["queries"] > before["queries"]:
+            regressions.append(f"{key}: queries {before['queries']} -> {current['queries']}")
+        slower = current["p95_ms"] - before["p95_ms"]
+        if slower > min_ms and current["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{key}: p95 {before['p95_ms']:.1f}ms -> {current['p95_ms']:.1f}ms"
+            )
+    return regressions
@@ -0,0 +1,131 @@
+"""
+Publish/subscribe backends for real-time chat.
+
+A WebSocket connection subscribes to a group (one per user) and receives
+the events published to it: new messages, typing notices and read
+receipts. ``InMemoryChannelLayer`` keeps subscribers in the current
+process, which is enough for a single ASGI worker and for tests. Another
+backend (e.g. one built on Redis pub/sub for several workers) can be
+plugged in with the ``CHAT_CHANNEL_LAYER`` setting (dotted path to a
+class implementing ``subscribe``, ``unsubscribe`` and ``publish``).
+"""
+
+import asyncio
+import threading
+
+from django.conf import settings
+from django.dispatch import receiver
+from django.test.signals import setting_changed
+from django.utils.module_loading import import_string
+
+
+DEFAULT_CHANNEL_LAYER = "skillzone.channel_layers.InMemoryChannelLayer"
+
+# Events buffered per connection before it is considered too slow.
+SUBSCRIPTION_BUFFER = 100
+
+# Put in a subscription's queue when it overflowed; the consumer should
+# drop the connection and let the client resume from its last message id.
+OVERFLOW = {"type": "overflow"}
+
+
+def user_group(user_id):
+    return f"user.{user_id}"
+
+
+class Subscription:
+    """A subscriber's bounded event queue, bound to its event loop."""
+
+    def __init__(self, group, maxsize=SUBSCRIPTION_BUFFER):
+        self.group = group
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def deliver(self, event):
+        """Queue ``event``; must run on ``self.loop``."""
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(OVERFLOW)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class BaseChannelLayer:
+    def subscribe(self, group):
+        """Return a ``Subscription`` receiving the events sent to ``group``."""
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription):
+        raise NotImplementedError
+
+    def publish(self, group, event):
+        """
+        Send ``event`` (a JSON-serialisable dict) to every subscriber of
+        ``group``. Safe to call from any thread, sync or async code.
+        """
+        raise NotImplementedError
+
+
+class InMemoryChannelLayer(BaseChannelLayer):
+    """Subscribers of the current process, keyed by group."""
+
+    def __init__(self):
+        self._groups = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, group):
+        subscription = Subscription(group)
+        with self._lock:
+            self._groups.setdefault(group, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            members = self._groups.get(subscription.group)
+            if members is not None:
+                members.discard(subscription)
+                if not members:
+                    del self._groups[subscription.group]
+
+    def publish(self, group, event):
+        with self._lock:
+            members = list(self._groups.get(group, ()))
+        for subscription in members:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # The subscriber's loop is closed; it is going away anyway.
+                self.unsubscribe(subscription)
+
+    def subscriber_count(self, group=None):
+        with self._lock:
+            if group is not None:
+                return len(self._groups.get(group, ()))
+            return sum(len(members) for members in self._groups.values())
+
+
+_layer = None
+
+
+def get_channel_layer():
+    """Return the configured channel layer instance."""
+    global _layer
+    if _layer is None:
+        path = getattr(settings, "CHAT_CHANNEL_LAYER", DEFAULT_CHANNEL_LAYER)
+        _layer = import_string(path)()
+    return _layer
+
+
+@receiver(setting_changed)
+def _reset_layer(setting, **kwargs):
+    global _layer
+    if setting == "CHAT_CHANNEL_LAYER":
+        _layer = None
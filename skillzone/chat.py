@@ -0,0 +1,301 @@
+"""
+Real-time chat over WebSockets.
+
+``chat_application`` is a plain ASGI application mounted by
+``skill_barter_zone.asgi`` for ``/ws/chat/<user_id>/``. Each connection is a
+coroutine waiting on its socket and on its channel layer subscription, so
+idle connections cost no thread; the database is only touched (in the
+shared sync thread) when a client sends something.
+
+Client -> server frames (JSON):
+
+* ``{"type": "message", "body": "..."}`` sends a message;
+* ``{"type": "typing"}`` tells the other user we are typing;
+* ``{"type": "read"}`` marks the conversation read.
+
+Server -> client frames: ``message`` (the full message, for both sides of
+the conversation), ``typing``, ``read`` (with ``up_to``, the newest message
+id that was read) and ``error``.
+
+A client that reconnects passes ``?after=<last message id>`` and first
+receives everything it missed. If it falls too far behind while connected
+the server closes with code 4408 and the client resumes the same way.
+"""
+
+import asyncio
+import json
+import re
+import time
+from importlib import import_module
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlsplit
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import aget_user
+from django.contrib.auth.models import User
+from django.db import close_old_connections
+from django.http import parse_cookie
+from django.http.request import validate_host
+
+from .channel_layers import OVERFLOW, get_channel_layer, user_group
+from .models import Message, Thread
+from .threads import mark_read
+
+
+PATH_RE = re.compile(r"^/ws/chat/(?P<user_id>\d+)/$")
+
+# Messages replayed on reconnect; clients further behind reload the page.
+RESUME_LIMIT = 200
+
+MAX_BODY_LENGTH = 5000
+
+# Minimum seconds between two typing notices forwarded for one connection.
+TYPING_INTERVAL = 2.0
+
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_FORBIDDEN = 4403
+CLOSE_NOT_FOUND = 4404
+CLOSE_RESYNC = 4408
+
+
+def serialize_message(message):
+    return {
+        "type": "message",
+        "id": message.id,
+        "sender": message.sender_id,
+        "recipient": message.recipient_id,
+        "body": message.body,
+        "created_at": message.created_at.isoformat(),
+    }
+
+
+def publish_message(message):
+    """Push a saved message to both participants' open connections."""
+    event = serialize_message(message)
+    layer = get_channel_layer()
+    layer.publish(user_group(message.sender_id), event)
+    if message.recipient_id != message.sender_id:
+        layer.publish(user_group(message.recipient_id), event)
+
+
+def database_sync_to_async(func):
+    """
+    ``sync_to_async`` for ORM work outside the request cycle: drop
+    connections that went stale while the socket sat idle.
+    """
+    def inner(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(inner, thread_sensitive=True)
+
+
+def _headers(scope):
+    return {
+        name.decode("latin1").lower(): value.decode("latin1")
+        for name, value in scope.get("headers", [])
+    }
+
+
+def _origin_allowed(headers):
+    """Refuse cross-site sockets: a browser always sends ``Origin``."""
+    origin = headers.get("origin")
+    if origin is None:
+        return True
+    host = urlsplit(origin).netloc
+    allowed = settings.ALLOWED_HOSTS
+    if settings.DEBUG and not allowed:
+        allowed = [".localhost", "127.0.0.1", "[::1]"]
+    return host == headers.get("host") or validate_host(host.rsplit(":", 1)[0], allowed)
+
+
+async def _authenticate(headers):
+    cookies = parse_cookie(headers.get("cookie", ""))
+    engine = import_module(settings.SESSION_ENGINE)
+    session = engine.SessionStore(cookies.get(settings.SESSION_COOKIE_NAME))
+    return await aget_user(SimpleNamespace(session=session))
+
+
+@database_sync_to_async
+def _user_exists(user_id):
+    return User.objects.filter(pk=user_id).exists()
+
+
+@database_sync_to_async
+def _missed_messages(user_id, other_id, after):
+    """
+    Up to ``RESUME_LIMIT + 1`` of the newest messages after ``after``, oldest
+    first. Each direction is read on its own so both are index range reads.
+    """
+    newest = []
+    for sender_id, recipient_id in ((user_id, other_id), (other_id, user_id)):
+        newest.extend(
+            Message.objects.filter(
+                sender_id=sender_id, recipient_id=recipient_id, id__gt=after
+            ).order_by("-created_at", "-id")[: RESUME_LIMIT + 1]
+        )
+    newest.sort(key=lambda m: (m.created_at, m.id), reverse=True)
+    return [serialize_message(m) for m in reversed(newest[: RESUME_LIMIT + 1])]
+
+
+@database_sync_to_async
+def _create_message(user_id, other_id, body):
+    Message.objects.create(sender_id=user_id, recipient_id=other_id, body=body)
+
+
+@database_sync_to_async
+def _mark_read(user_id, other_id):
+    """Mark the conversation read; return the newest id read, or None."""
+    thread = Thread.objects.filter(owner_id=user_id, other_id=other_id).first()
+    if not thread or not thread.unread_count:
+        return None
+    mark_read(thread)
+    return (
+        Message.objects.filter(sender_id=other_id, recipient_id=user_id)
+        .order_by("-created_at", "-id")
+        .values_list("id", flat=True)
+        .first()
+    )
+
+
+class ChatConnection:
+    """One open socket: the current user talking to ``other_id``."""
+
+    def __init__(self, send, user_id, other_id, last_id):
+        self._send = send
+        self._send_lock = asyncio.Lock()
+        self.user_id = user_id
+        self.other_id = other_id
+        self.last_id = last_id
+        self.last_typing = 0.0
+
+    async def send_json(self, data):
+        async with self._send_lock:
+            await self._send({"type": "websocket.send", "text": json.dumps(data)})
+
+    async def close(self, code):
+        async with self._send_lock:
+            await self._send({"type": "websocket.close", "code": code})
+
+    def _is_ours(self, event):
+        kind = event.get("type")
+        if kind == "message":
+            pair = {event["sender"], event["recipient"]}
+            return pair == {self.user_id, self.other_id} and event["id"] > self.last_id
+        if kind == "typing":
+            return event.get("from") == self.other_id
+        if kind == "read":
+            return event.get("by") == self.other_id
+        return False
+
+    async def deliver(self, event):
+        if self._is_ours(event):
+            if event["type"] == "message":
+                self.last_id = event["id"]
+            await self.send_json(event)
+
+    async def resume(self):
+        missed = await _missed_messages(self.user_id, self.other_id, self.last_id)
+        if len(missed) > RESUME_LIMIT:
+            await self.send_json({"type": "error", "error": "resync"})
+            missed = missed[-RESUME_LIMIT:]
+        for event in missed:
+            await self.deliver(event)
+
+    async def pump(self, subscription):
+        while True:
+            event = await subscription.get()
+            if event is OVERFLOW:
+                await self.close(CLOSE_RESYNC)
+                return
+            await self.deliver(event)
+
+    async def handle(self, text):
+        try:
+            data = json.loads(text)
+            kind = data["type"]
+        except (TypeError, ValueError, KeyError):
+            await self.send_json({"type": "error", "error": "invalid frame"})
+            return
+
+        layer = get_channel_layer()
+        if kind == "message":
+            body = str(data.get("body", "")).strip()
+            if not body or len(body) > MAX_BODY_LENGTH:
+                await self.send_json({"type": "error", "error": "invalid body"})
+                return
+            # Delivered back to us (and to the other user) by the Message
+            # signal once committed.
+            await _create_message(self.user_id, self.other_id, body)
+        elif kind == "typing":
+            now = time.monotonic()
+            if now - self.last_typing >= TYPING_INTERVAL:
+                self.last_typing = now
+                layer.publish(
+                    user_group(self.other_id), {"type": "typing", "from": self.user_id}
+                )
+        elif kind == "read":
+            up_to = await _mark_read(self.user_id, self.other_id)
+            if up_to is not None:
+                layer.publish(
+                    user_group(self.other_id),
+                    {"type": "read", "by": self.user_id, "up_to": up_to},
+                )
+        else:
+            await self.send_json({"type": "error", "error": "unknown type"})
+
+
+async def chat_application(scope, receive, send):
+    """ASGI entry point for ``websocket`` scopes."""
+    event = await receive()
+    if event["type"] != "websocket.connect":
+        return
+
+    match = PATH_RE.match(scope.get("path", ""))
+    headers = _headers(scope)
+    if not match:
+        await send({"type": "websocket.close", "code": CLOSE_NOT_FOUND})
+        return
+    if not _origin_allowed(headers):
+        await send({"type": "websocket.close", "code": CLOSE_FORBIDDEN})
+        return
+    user = await _authenticate(headers)
+    if not user.is_authenticated:
+        await send({"type": "websocket.close", "code": CLOSE_UNAUTHORIZED})
+        return
+    other_id = int(match["user_id"])
+    if other_id == user.pk or not await _user_exists(other_id):
+        await send({"type": "websocket.close", "code": CLOSE_NOT_FOUND})
+        return
+
+    query = parse_qs(scope.get("query_string", b"").decode("latin1"))
+    try:
+        last_id = max(int(query.get("after", ["0"])[0]), 0)
+    except ValueError:
+        last_id = 0
+
+    await send({"type": "websocket.accept"})
+    connection = ChatConnection(send, user.pk, other_id, last_id)
+    layer = get_channel_layer()
+    # Subscribe before replaying, so nothing sent in between is lost;
+    # duplicates are dropped by message id.
+    subscription = layer.subscribe(user_group(user.pk))
+    pump = None
+    try:
+        if last_id:
+            await connection.resume()
+        pump = asyncio.create_task(connection.pump(subscription))
+        while True:
+            event = await receive()
+            if event["type"] == "websocket.disconnect":
+                break
+            if event["type"] == "websocket.receive":
+                await connection.handle(event.get("text") or event.get("bytes"))
+    finally:
+        layer.unsubscribe(subscription)
+        if pump is not None:
+            pump.cancel()
@@ -0,0 +1,17 @@
+from django.utils.functional import SimpleLazyObject
+
+from .counters import get_nav_counts
+
+
+def nav_counts(request):
+    """
+    ``nav_counts.unread_messages`` and ``nav_counts.pending_barters`` for
+    the navbar. Lazy, so pages that never read them pay nothing.
+    """
+    def load():
+        user = getattr(request, "user", None)
+        if user is None or not user.is_authenticated:
+            return {}
+        return get_nav_counts(user.pk)
+
+    return {"nav_counts": SimpleLazyObject(load)}
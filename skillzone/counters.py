@@ -0,0 +1,89 @@
+"""
+Navbar counters: unread messages and barters waiting on the user.
+
+Every page renders the navbar, so the counts are cached per user and read
+with a single query (two scalar subqueries) on a miss. The cache entry is
+dropped whenever something that feeds it changes: the signals in
+``skillzone.signals`` cover saved and deleted ``Message``/``Barter`` rows,
+and code that changes them with ``QuerySet.update()`` calls
+``invalidate_nav_counts`` itself.
+"""
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F, Func, IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Barter, Thread
+
+
+CACHE_KEY = "skillzone:nav-counts:{}"
+
+# Entries are invalidated explicitly; the timeout only bounds how long a
+# missed invalidation could show a wrong badge.
+CACHE_TIMEOUT = 15 * 60
+
+
+def awaiting_action(user):
+    """
+    Q for barters that wait on ``user`` (a user instance, id or ``OuterRef``):
+    approved requests to accept or reject, and accepted barters the user has
+    not marked completed yet.
+    """
+    return Q(user_to=user, status=Barter.STATUS_ADMIN_APPROVED) | (
+        Q(status=Barter.STATUS_ACCEPTED)
+        & (
+            Q(user_from=user, completed_by_from=False)
+            | Q(user_to=user, completed_by_to=False)
+        )
+    )
+
+
+def _count_nav_counts(user_id):
+    unread = (
+        Thread.objects.filter(owner=OuterRef("pk"))
+        .order_by()
+        .values("owner")
+        .annotate(total=Sum("unread_count"))
+        .values("total")
+    )
+    pending = (
+        Barter.objects.filter(awaiting_action(OuterRef("pk")))
+        .order_by()
+        .annotate(total=Func(F("id"), function="COUNT"))
+        .values("total")
+    )
+    # From the primary: a lagging replica would put stale counts back
+    # into the cache right after an invalidation.
+    row = (
+        User.objects.using(DEFAULT_DB_ALIAS)
+        .filter(pk=user_id)
+        .values_list(
+            Coalesce(Subquery(unread, output_field=IntegerField()), 0),
+            Coalesce(Subquery(pending, output_field=IntegerField()), 0),
+        )
+        .first()
+    )
+    unread_messages, pending_barters = row or (0, 0)
+    return {"unread_messages": unread_messages, "pending_barters": pending_barters}
+
+
+def get_nav_counts(user_id):
+    key = CACHE_KEY.format(user_id)
+    counts = cache.get(key)
+    if counts is None:
+        counts = _count_nav_counts(user_id)
+        cache.set(key, counts, CACHE_TIMEOUT)
+    return counts
+
+
+def invalidate_nav_counts(*user_ids):
+    """
+    Drop the cached counts of ``user_ids`` once the current transaction
+    commits (immediately in autocommit mode), so a concurrent request cannot
+    cache the old values again before the change is visible.
+    """
+    keys = [CACHE_KEY.format(user_id) for user_id in set(user_ids) if user_id]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
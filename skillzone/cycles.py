@@ -0,0 +1,326 @@
+"""
+Multi-party barter cycle discovery.
+
+Two-way swaps need two users who each want what the other teaches. Longer
+chains (A teaches B, B teaches C, C teaches A) are far more common. This
+module builds a directed graph from ``SkillIndexEntry`` -- an edge A -> B
+when A offers a term B wants -- and looks for cycles of length 3 and 4.
+
+The search is bounded:
+
+* every node has at most ``max_degree`` successors and predecessors, and a
+  single term contributes at most ``TERM_FANOUT`` of them (popular terms
+  would otherwise connect everyone to everyone);
+* cycles through a start node are found by meeting in the middle (two
+  steps forward from the start, up to two steps backward), which costs
+  O(max_degree ** 2) per start node instead of O(max_degree ** 3);
+* the whole run stops at a wall-clock deadline.
+
+``SkillGraph`` can be filled from the database in one pass
+(``SkillGraph.from_index``), loaded lazily around a few users
+(``SkillGraph.lazy``), or built from plain dicts, which is what the
+synthetic benchmark does.
+"""
+
+import bisect
+import time
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from users.models import ProfileModel
+from .matching import TERM_FANOUT
+from .models import (
+    BarterCycle,
+    BarterCycleLeg,
+    CycleDiscoveryRun,
+    SkillIndexEntry,
+)
+
+
+OFFER = SkillIndexEntry.KIND_OFFER
+WANT = SkillIndexEntry.KIND_WANT
+
+MAX_DEGREE = 12
+MAX_CYCLES_PER_USER = 3
+STORE_BATCH = 500
+
+
+class SkillGraph:
+    """
+    Offer/want graph over users.
+
+    ``terms[kind][user]`` is the list of terms a user offers/wants and
+    ``members[kind][term]`` the sorted user ids offering/wanting a term.
+    Missing entries are fetched through ``loader`` when one is given.
+    """
+
+    def __init__(self, terms=None, members=None, max_degree=MAX_DEGREE, loader=None):
+        self.terms = terms or {OFFER: {}, WANT: {}}
+        self.members = members or {OFFER: {}, WANT: {}}
+        self.max_degree = max_degree
+        self.loader = loader
+        self._succ = {}
+        self._pred = {}
+
+    @classmethod
+    def from_index(cls, max_degree=MAX_DEGREE, chunk_size=10000):
+        """Load the whole index in one ordered pass."""
+        terms = {OFFER: defaultdict(list), WANT: defaultdict(list)}
+        members = {OFFER: defaultdict(list), WANT: defaultdict(list)}
+        rows = (
+            SkillIndexEntry.objects.order_by("kind", "term", "user_id")
+            .values_list("kind", "term", "user_id")
+            .iterator(chunk_size=chunk_size)
+        )
+        for kind, term, user_id in rows:
+            terms[kind][user_id].append(term)
+            members[kind][term].append(user_id)
+        return cls(terms, members, max_degree)
+
+    @classmethod
+    def lazy(cls, max_degree=MAX_DEGREE):
+        """A graph that reads the index on demand (incremental runs)."""
+        return cls(max_degree=max_degree, loader=_load_from_index)
+
+    def users(self):
+        return sorted(set(self.terms[OFFER]) & set(self.terms[WANT]))
+
+    def _terms(self, kind, user):
+        if user not in self.terms[kind] and self.loader:
+            self.terms[kind][user] = self.loader.user_terms(kind, user)
+        return self.terms[kind].get(user, ())
+
+    def _members(self, kind, term):
+        if term not in self.members[kind] and self.loader:
+            self.members[kind][term] = self.loader.term_members(kind, term)
+        return self.members[kind].get(term, ())
+
+    def _neighbours(self, user, own_kind, other_kind):
+        found = []
+        seen = {user}
+        for term in self._terms(own_kind, user):
+            members = self._members(other_kind, term)
+            # Rotate each member list to start after ``user`` so that
+            # different users of a popular term reach different partners.
+            start = bisect.bisect_right(members, user)
+            taken = 0
+            for i in range(len(members)):
+                other = members[(start + i) % len(members)]
+                if other in seen:
+                    continue
+                seen.add(other)
+                found.append(other)
+                taken += 1
+                if taken >= TERM_FANOUT or len(found) >= self.max_degree:
+                    break
+            if len(found) >= self.max_degree:
+                break
+        return found
+
+    def successors(self, user):
+        """Users who want something ``user`` offers."""
+        if user not in self._succ:
+            self._succ[user] = self._neighbours(user, OFFER, WANT)
+        return self._succ[user]
+
+    def predecessors(self, user):
+        """Users who offer something ``user`` wants."""
+        if user not in self._pred:
+            self._pred[user] = self._neighbours(user, WANT, OFFER)
+        return self._pred[user]
+
+    def edge_term(self, teacher, learner):
+        wanted = set(self._terms(WANT, learner))
+        for term in self._terms(OFFER, teacher):
+            if term in wanted:
+                return term
+        return None
+
+
+class _IndexLoader:
+    """Fetches single users' terms and single terms' members from the index."""
+
+    def user_terms(self, kind, user):
+        return list(
+            SkillIndexEntry.objects.filter(user_id=user, kind=kind)
+            .order_by("term")
+            .values_list("term", flat=True)
+        )
+
+    def term_members(self, kind, term):
+        return list(
+            SkillIndexEntry.objects.filter(kind=kind, term=term)
+            .order_by("user_id")
+            .values_list("user_id", flat=True)
+        )
+
+
+_load_from_index = _IndexLoader()
+
+
+def cycles_through(graph, start, max_length=4, smallest=True):
+    """
+    Yield cycles (tuples of user ids, ``start`` first) through ``start``.
+
+    With ``smallest=True`` only cycles whose other members all have larger
+    ids are produced, so a sweep over every user finds each cycle once.
+    """
+    def allowed(user):
+        return user != start and (not smallest or user > start)
+
+    back_one = [c for c in graph.predecessors(start) if allowed(c)]
+    back_one_set = set(back_one)
+    back_two = defaultdict(list)
+    if max_length >= 4:
+        for c in back_one:
+            for b in graph.predecessors(c):
+                if allowed(b) and b != c:
+                    back_two[b].append(c)
+
+    for a in graph.successors(start):
+        if not allowed(a):
+            continue
+        for b in graph.successors(a):
+            if not allowed(b) or b == a:
+                continue
+            if b in back_one_set:
+                yield (start, a, b)
+            for c in back_two.get(b, ()):
+                if c != a:
+                    yield (start, a, b, c)
+
+
+def canonical(cycle):
+    """Rotate a cycle so that it starts at its smallest member."""
+    i = cycle.index(min(cycle))
+    return tuple(cycle[i:] + cycle[:i])
+
+
+def signature(cycle):
+    return "-".join(str(user) for user in cycle)
+
+
+def find_cycles(
+    graph,
+    starts,
+    max_length=4,
+    deadline=None,
+    smallest=True,
+    per_user_limit=MAX_CYCLES_PER_USER,
+    busy=None,
+):
+    """
+    Search cycles through each user in ``starts``.
+
+    Returns ``(cycles, explored, timed_out)``. Each user takes part in at
+    most ``per_user_limit`` cycles (``busy`` holds counts carried over from
+    cycles that already exist), which keeps proposals spread out.
+    """
+    busy = defaultdict(int, busy or {})
+    found = {}
+    explored = 0
+    for start in starts:
+        if deadline is not None and time.monotonic() > deadline:
+            return list(found.values()), explored, True
+        explored += 1
+        if busy[start] >= per_user_limit:
+            continue
+        for cycle in cycles_through(graph, start, max_length, smallest):
+            cycle = canonical(cycle)
+            key = signature(cycle)
+            if key in found or any(busy[u] >= per_user_limit for u in cycle):
+                continue
+            found[key] = cycle
+            for user in cycle:
+                busy[user] += 1
+            if busy[start] >= per_user_limit:
+                break
+    return list(found.values()), explored, False
+
+
+def store_cycles(graph, cycles):
+    """Save new cycles with their legs; already stored signatures are skipped."""
+    created = 0
+    for i in range(0, len(cycles), STORE_BATCH):
+        batch = {signature(c): c for c in cycles[i:i + STORE_BATCH]}
+        existing = set(
+            BarterCycle.objects.filter(signature__in=batch).values_list(
+                "signature", flat=True
+            )
+        )
+        new = [(key, c) for key, c in batch.items() if key not in existing]
+        with transaction.atomic():
+            rows = BarterCycle.objects.bulk_create(
+                BarterCycle(signature=key, length=len(c)) for key, c in new
+            )
+            BarterCycleLeg.objects.bulk_create(
+                BarterCycleLeg(
+                    cycle=row,
+                    position=pos,
+                    teacher_id=teacher,
+                    learner_id=learner,
+                    term=graph.edge_term(teacher, learner) or "",
+                )
+                for row, (_, cycle) in zip(rows, new)
+                for pos, (teacher, learner) in enumerate(
+                    zip(cycle, cycle[1:] + cycle[:1])
+                )
+            )
+        created += len(new)
+    return created
+
+
+def discover(incremental=False, max_length=4, time_budget=None, max_degree=MAX_DEGREE):
+    """
+    Run one discovery pass and record it as a ``CycleDiscoveryRun``.
+
+    A full pass rebuilds every proposed cycle. An incremental pass only
+    revisits users whose skills changed since the last run started: their
+    existing proposals are dropped and cycles through them searched again.
+    Without a previous run an incremental pass falls back to a full one.
+    """
+    started = timezone.now()
+    deadline = time.monotonic() + time_budget if time_budget else None
+    last = CycleDiscoveryRun.objects.filter(finished_at__isnull=False).order_by(
+        "-started_at"
+    ).first()
+    incremental = incremental and last is not None
+
+    if incremental:
+        touched = list(
+            ProfileModel.objects.filter(skills_changed_at__gte=last.started_at)
+            .order_by("user_id")
+            .values_list("user_id", flat=True)
+        )
+        stale = BarterCycle.objects.filter(
+            status=BarterCycle.STATUS_PROPOSED, legs__teacher__in=touched
+        )
+        BarterCycle.objects.filter(pk__in=list(stale.values_list("pk", flat=True))).delete()
+
+        busy = defaultdict(int)
+        for teacher in BarterCycleLeg.objects.filter(
+            cycle__status=BarterCycle.STATUS_PROPOSED
+        ).values_list("teacher_id", flat=True):
+            busy[teacher] += 1
+        graph = SkillGraph.lazy(max_degree=max_degree)
+        cycles, explored, timed_out = find_cycles(
+            graph, touched, max_length, deadline, smallest=False, busy=busy
+        )
+    else:
+        graph = SkillGraph.from_index(max_degree=max_degree)
+        BarterCycle.objects.filter(status=BarterCycle.STATUS_PROPOSED).delete()
+        cycles, explored, timed_out = find_cycles(
+            graph, graph.users(), max_length, deadline
+        )
+
+    created = store_cycles(graph, cycles)
+    return CycleDiscoveryRun.objects.create(
+        started_at=started,
+        finished_at=timezone.now(),
+        incremental=incremental,
+        explored_users=explored,
+        cycles_found=created,
+        timed_out=timed_out,
+    )
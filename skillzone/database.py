@@ -0,0 +1,35 @@
+"""
+Connection tuning for SQLite.
+
+Out of the box every write takes a lock on the whole database file that
+also waits for readers to finish, and a transaction that reads before it
+writes fails at once with "database is locked" when another connection
+got the write lock first. The settings fix both:
+
+* ``SQLITE_PRAGMAS`` are run on every new connection by
+  ``configure_connection`` (connected to ``connection_created`` in
+  ``skillzone.signals``). WAL lets readers and one writer work side by
+  side, ``synchronous=NORMAL`` drops an fsync per commit (still durable
+  against application crashes), ``busy_timeout`` makes a writer wait for
+  the lock instead of failing, and ``mmap_size``/``cache_size`` keep hot
+  pages in memory.
+* ``transaction_mode: IMMEDIATE`` in ``DATABASES`` makes ``atomic()``
+  take the write lock when it begins, where waiting is still possible.
+
+``benchmark_db_concurrency`` compares this with the defaults.
+"""
+
+from django.conf import settings
+
+
+def sqlite_pragmas():
+    return getattr(settings, "SQLITE_PRAGMAS", {})
+
+
+def configure_connection(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    # On the raw connection, so that the statements are not counted as
+    # queries of whatever happened to open the connection.
+    for name, value in sqlite_pragmas().items():
+        connection.connection.execute(f"PRAGMA {name} = {value}")
@@ -0,0 +1,173 @@
+"""
+Streaming exports of barters, feedback and messages.
+
+Rows are read with ``values_list(...).iterator(chunk_size=...)`` (a
+server-side cursor where the database has one), with the related names
+joined in the same query, and written out as CSV or NDJSON one chunk at a
+time. Nothing holds more than ``chunk_size`` rows, so memory stays flat
+however large the table is.
+
+``export_response`` wraps an export in a ``StreamingHttpResponse`` for the
+admin actions; under ASGI it streams from an async iterator, because
+Django would otherwise read a sync iterator to the end before sending
+anything. The ``export_data`` command writes the same output to a file.
+"""
+
+import csv
+import datetime
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .models import Barter, Feedback, Message
+
+
+FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+CHUNK_SIZE = 2000
+
+
+class Export:
+    """
+    What to export from one model: ``columns`` are ``(header, lookup)``
+    pairs, where a lookup may follow foreign keys (``"user_from__username"``).
+    ``date_field`` is the field ``since``/``until`` filter on.
+    """
+
+    def __init__(self, name, model, date_field, columns):
+        self.name = name
+        self.model = model
+        self.date_field = date_field
+        self.columns = columns
+
+    @property
+    def headers(self):
+        return [header for header, _ in self.columns]
+
+    def queryset(self, since=None, until=None, filters=None):
+        queryset = self.model._default_manager.filter(**(filters or {}))
+        if since:
+            queryset = queryset.filter(**{f"{self.date_field}__gte": since})
+        if until:
+            queryset = queryset.filter(**{f"{self.date_field}__lt": until})
+        return queryset
+
+    def rows(self, queryset):
+        # Ordered by primary key so the scan follows the table and the
+        # output is stable; no model instances are built.
+        return queryset.order_by("pk").values_list(*(lookup for _, lookup in self.columns))
+
+
+EXPORTS = {
+    export.name: export
+    for export in [
+        Export("barters", Barter, "date_requested", [
+            ("id", "id"),
+            ("status", "status"),
+            ("date_requested", "date_requested"),
+            ("date_responded", "date_responded"),
+            ("user_from", "user_from__username"),
+            ("user_to", "user_to__username"),
+            ("skill_from", "skill_from__name"),
+            ("skill_to", "skill_to__name"),
+            ("completed_by_from", "completed_by_from"),
+            ("completed_by_to", "completed_by_to"),
+            ("admin", "admin__username"),
+        ]),
+        Export("feedback", Feedback, "date", [
+            ("id", "id"),
+            ("barter", "barter_id"),
+            ("user", "user__username"),
+            ("receiver", "barter__user_to__username"),
+            ("rating", "rating"),
+            ("comment", "comment"),
+            ("date", "date"),
+        ]),
+        Export("messages", Message, "created_at", [
+            ("id", "id"),
+            ("sender", "sender__username"),
+            ("recipient", "recipient__username"),
+            ("body", "body"),
+            ("created_at", "created_at"),
+            ("is_read", "is_read"),
+        ]),
+    ]
+}
+
+
+def export_for_model(model):
+    return next(export for export in EXPORTS.values() if export.model is model)
+
+
+class _Echo:
+    """File-like object whose ``write`` hands the line back to ``csv.writer``."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    return value.isoformat() if isinstance(value, datetime.datetime) else value
+
+
+class _Formatter:
+    def __init__(self, export, format):
+        if format not in FORMATS:
+            raise ValueError(f"Unknown export format {format!r}; use one of {', '.join(FORMATS)}.")
+        self.format = format
+        self.headers = export.headers
+        self.csv = csv.writer(_Echo())
+
+    def header(self):
+        return self.csv.writerow(self.headers) if self.format == "csv" else ""
+
+    def lines(self, rows):
+        if self.format == "csv":
+            return "".join(self.csv.writerow([_csv_value(v) for v in row]) for row in rows)
+        return "".join(
+            json.dumps(dict(zip(self.headers, row)), cls=DjangoJSONEncoder) + "\n"
+            for row in rows
+        )
+
+
+def stream_export(export, queryset, format="csv", chunk_size=CHUNK_SIZE):
+    """Yield the export of ``queryset`` as text, one chunk of rows at a time."""
+    formatter = _Formatter(export, format)
+    yield formatter.header()
+    chunk = []
+    for row in export.rows(queryset).iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield formatter.lines(chunk)
+            chunk = []
+    if chunk:
+        yield formatter.lines(chunk)
+
+
+async def astream_export(export, queryset, format="csv", chunk_size=CHUNK_SIZE):
+    """
+    ``stream_export`` as an async iterator, for ASGI responses. Each chunk
+    is produced in the sync thread, which keeps the cursor open in between.
+    """
+    chunks = stream_export(export, queryset, format, chunk_size)
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    while (chunk := await next_chunk(chunks, None)) is not None:
+        yield chunk
+
+
+def export_response(request, export, queryset, format="csv"):
+    if isinstance(request, ASGIRequest):
+        content = astream_export(export, queryset, format)
+    else:
+        content = stream_export(export, queryset, format)
+    response = StreamingHttpResponse(content, content_type=FORMATS[format])
+    stamp = timezone.now().strftime("%Y%m%d-%H%M%S")
+    response["Content-Disposition"] = f'attachment; filename="{export.name}-{stamp}.{format}"'
+    return response
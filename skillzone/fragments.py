@@ -0,0 +1,159 @@
+"""
+Versioned fragment cache for skill cards.
+
+Home and user pages show a card per skill, and rendering hundreds of them
+through the template engine dominates those pages. The rendered HTML of
+each card is cached in the ``fragments`` cache under a key that contains
+a version number of the skill and one of its owner (whose name is on the
+card)::
+
+    skillzone:card:<layout>:<actions>:<skill id>:<skill version>:<user version>
+
+Saving a ``Skill`` bumps the skill's version, and saving a ``User`` or
+``ProfileModel`` bumps the user's (signals in ``skillzone.signals``), so
+the next page builds new keys and the old entries are never read again;
+nothing has to be found and deleted, and the cache evicts them in time.
+A version that has been evicted is recreated from the clock, so it cannot
+collide with an earlier one.
+
+A card is only ever rendered for the cache from a row of the primary
+database: a page that read its skills from a lagging replica (see
+``skillzone.replicas``) would otherwise store the old row under the new
+version, where nothing would replace it. ``primary_skills`` reloads such
+rows for the cards that missed.
+
+A page reads all versions and cards with two ``get_many`` calls (see the
+``skill_cards`` template tags). ``stats()`` counts hits and misses since
+the last ``reset_stats()``; ``benchmark_skill_cards`` shows the effect.
+"""
+
+import threading
+import time
+
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from .models import Skill
+
+
+CACHE_ALIAS = "fragments"
+
+VERSION_KEY = "skillzone:version:{}:{}"
+CARD_KEY = "skillzone:card:{}:{:d}:{}:{}:{}"
+
+SKILL = "skill"
+USER = "user"
+
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+
+def fragment_cache():
+    return caches[CACHE_ALIAS]
+
+
+def _count(hits, misses):
+    with _lock:
+        _stats["hits"] += hits
+        _stats["misses"] += misses
+
+
+def stats():
+    with _lock:
+        return dict(_stats)
+
+
+def reset_stats():
+    with _lock:
+        _stats.update(hits=0, misses=0)
+
+
+def bump_versions(kind, *ids):
+    """
+    Give ``ids`` of ``kind`` (``SKILL`` or ``USER``) a new version once the
+    current transaction commits, so a concurrent request cannot cache the
+    old rows under the new version.
+    """
+    keys = [VERSION_KEY.format(kind, pk) for pk in set(ids) if pk]
+
+    def bump():
+        cache = fragment_cache()
+        for key in keys:
+            try:
+                cache.incr(key)
+            except ValueError:
+                # Never read (or evicted): nothing is cached under it.
+                pass
+
+    if keys:
+        transaction.on_commit(bump)
+
+
+def get_versions(kind, ids):
+    """Map each of ``ids`` to its current version, creating missing ones."""
+    cache = fragment_cache()
+    keys = {pk: VERSION_KEY.format(kind, pk) for pk in ids}
+    found = cache.get_many(keys.values())
+    versions = {}
+    for pk, key in keys.items():
+        if key not in found:
+            # add() so that two requests creating it agree on one value.
+            cache.add(key, time.time_ns(), timeout=None)
+            found[key] = cache.get(key, time.time_ns())
+        versions[pk] = found[key]
+    return versions
+
+
+def show_actions(skill, viewer):
+    """Barter and message buttons are for signed-in users on others' skills."""
+    return bool(
+        viewer is not None
+        and viewer.is_authenticated
+        and skill.user_id is not None
+        and viewer.pk != skill.user_id
+    )
+
+
+def card_keys(skills, layout, viewer):
+    """Map each skill id to the key of its card as ``viewer`` sees it."""
+    skills = list(skills)
+    skill_versions = get_versions(SKILL, {skill.pk for skill in skills})
+    user_versions = get_versions(USER, {skill.user_id for skill in skills})
+    return {
+        skill.pk: CARD_KEY.format(
+            layout,
+            show_actions(skill, viewer),
+            skill.pk,
+            skill_versions[skill.pk],
+            user_versions[skill.user_id],
+        )
+        for skill in skills
+    }
+
+
+def get_cards(keys):
+    """Cached HTML for the given keys; missing ones are left out."""
+    found = fragment_cache().get_many(keys)
+    _count(len(found), len(keys) - len(found))
+    return found
+
+
+def store_card(key, html):
+    fragment_cache().set(key, html)
+
+
+def primary_skills(skills):
+    """
+    Map the ids of ``skills`` to rows read from the primary database,
+    reloading (in one query) those that were read from a replica. Skills
+    deleted on the primary are left out.
+    """
+    skills = list(skills)
+    # _state.db is None for rows built in memory (benchmark_skill_cards).
+    fresh = {skill.pk: skill for skill in skills if skill._state.db in (None, DEFAULT_DB_ALIAS)}
+    stale = [skill.pk for skill in skills if skill.pk not in fresh]
+    if stale:
+        fresh.update(
+            Skill.objects.using(DEFAULT_DB_ALIAS).select_related("user").in_bulk(stale)
+        )
+    return fresh
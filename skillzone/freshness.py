@@ -0,0 +1,115 @@
+"""
+Conditional GET for pages that rarely change.
+
+A validator function looks at the few rows a page is built from, using
+indexed ``MAX(updated_at)`` lookups and counts (a count catches deletions,
+which leave no timestamp behind), and returns a ``Validator``. The
+``conditional`` decorator turns it into an ``ETag`` and ``Last-Modified``
+through Django's ``condition``, so a client whose copy is still current
+gets a 304 before the view loads a queryset or renders a template.
+
+Pages shown to a logged-in user also depend on who is looking: the navbar
+counters and the CSRF token in the logout form are folded into the
+validator, and a request with flash messages waiting is always rendered.
+A validator returns ``None`` when a page cannot be validated cheaply; the
+view then runs as usual.
+"""
+
+import hashlib
+
+from django.contrib.messages import get_messages
+from django.db.models import Count, Max
+from django.middleware.csrf import get_token
+from django.views.decorators.http import condition
+
+from users.models import ProfileModel
+from .counters import get_nav_counts
+from .models import Skill
+
+
+class Validator:
+    def __init__(self, parts, last_modified):
+        self.etag = hashlib.sha256(repr(parts).encode()).hexdigest()[:32]
+        self.last_modified = last_modified
+
+
+def _latest(*moments):
+    moments = [moment for moment in moments if moment is not None]
+    return max(moments) if moments else None
+
+
+def viewer_state(request):
+    """
+    What a page shows about the current user, or ``None`` if the page must
+    be rendered anyway (flash messages would otherwise not be displayed).
+    """
+    user = request.user
+    if not user.is_authenticated:
+        return ("anonymous",)
+    if len(get_messages(request)):
+        return None
+    counts = get_nav_counts(user.pk)
+    # The page embeds a token for this CSRF secret; make sure there is one
+    # (as rendering would) so the first response already gets an ETag.
+    get_token(request)
+    return (
+        user.pk,
+        user.username,
+        counts["unread_messages"],
+        counts["pending_barters"],
+        request.META["CSRF_COOKIE"],
+    )
+
+
+def home_validator(request):
+    # Only the anonymous page: a user's own dashboard changes too often.
+    if request.user.is_authenticated or len(get_messages(request)):
+        return None
+    skills = Skill.objects.aggregate(latest=Max("updated_at"), count=Count("id"))
+    # Owner names are shown and searched, and only change on a profile save.
+    profiles = ProfileModel.objects.aggregate(latest=Max("updated_at"))
+    return Validator(
+        ("home", request.get_full_path(), skills, profiles),
+        _latest(skills["latest"], profiles["latest"]),
+    )
+
+
+def user_detail_validator(request, user_id):
+    viewer = viewer_state(request)
+    if viewer is None:
+        return None
+    profile = (
+        ProfileModel.objects.filter(user_id=user_id)
+        # The rating counters change with feedback, without a profile save.
+        .values("updated_at", "rating_count", "rating_sum", "user__username")
+        .first()
+    )
+    skills = Skill.objects.filter(user_id=user_id).aggregate(
+        latest=Max("updated_at"), count=Count("id")
+    )
+    return Validator(
+        ("user_detail", user_id, viewer, profile, skills),
+        _latest(profile and profile["updated_at"], skills["latest"]),
+    )
+
+
+def conditional(validator):
+    """
+    Decorator answering conditional GETs with ``validator(request, *args,
+    **kwargs)``, which is run once per request.
+    """
+
+    def get(request, *args, **kwargs):
+        if not hasattr(request, "_validator"):
+            request._validator = validator(request, *args, **kwargs)
+        return request._validator
+
+    def etag(request, *args, **kwargs):
+        found = get(request, *args, **kwargs)
+        return found and found.etag
+
+    def last_modified(request, *args, **kwargs):
+        found = get(request, *args, **kwargs)
+        return found and found.last_modified
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
@@ -0,0 +1,319 @@
+"""
+Bulk import of user accounts, e.g. when onboarding a partner organisation.
+
+Going through ``SignUpForm`` costs several saves per user plus the
+``users.signals.create_profile`` round-trip. ``UserImporter`` instead
+streams a CSV or JSON Lines file and, per chunk of rows, inserts the
+``User``, ``ProfileModel`` and ``Skill`` rows with one ``bulk_create``
+each, inside one transaction.
+
+``bulk_create`` sends no signals, so the importer does the work the
+signal handlers would have done itself: it creates the profiles, fills the
+search index and the match index for the new skills and stamps
+``skills_changed_at``. Brand new users own nothing else that is derived.
+
+Each row has a ``username`` and optionally ``email``, ``password`` (plain
+text, validated and hashed here, in a process pool if asked to),
+``password_hash`` (already hashed with one of ``PASSWORD_HASHERS``),
+``full_name``, ``address``, ``gender`` (M/F/T) and ``skills`` (a list in
+JSON, ``;``-separated in CSV). Invalid rows are reported and skipped.
+
+Progress is kept in an ``ImportCheckpoint`` committed with every chunk, so
+a run that fails part way is resumed by running it again on the same file.
+"""
+
+import csv
+import hashlib
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.contrib.auth.models import User
+from django.contrib.auth.password_validation import validate_password
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.utils import timezone
+
+from users.models import ProfileModel
+from .matching import index_names
+from .models import ImportCheckpoint, Skill, SkillIndexEntry
+from .search import get_search_backend
+
+
+FORMATS = ("csv", "jsonl")
+
+# Skill ids per search index call, to keep SQL parameter lists short.
+INDEX_BATCH = 500
+
+_username_validator = UnicodeUsernameValidator()
+_gender_values = {value for value, _ in ProfileModel.GENDER_CHOICES}
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_rows(path, format=None):
+    """Yield ``(line number, row dict)``; a row that cannot be parsed is a string."""
+    format = format or os.path.splitext(path)[1].lstrip(".").lower()
+    if format not in FORMATS:
+        raise ValueError(f"Unknown import format {format!r}; use one of {', '.join(FORMATS)}.")
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        if format == "csv":
+            reader = csv.DictReader(f)
+            for row in reader:
+                row["skills"] = (row.get("skills") or "").split(";")
+                yield reader.line_num, row
+        else:
+            for line_num, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    row = f"invalid JSON: {e}"
+                else:
+                    if not isinstance(row, dict):
+                        row = "expected a JSON object"
+                yield line_num, row
+
+
+class ImportRow:
+    """One validated input row."""
+
+    def __init__(self, line, username, email, password, password_hash,
+                 full_name, address, gender, skills):
+        self.line = line
+        self.username = username
+        self.email = email
+        self.password = password
+        self.password_hash = password_hash
+        self.full_name = full_name
+        self.address = address
+        self.gender = gender
+        self.skills = skills
+
+    @property
+    def first_and_last_name(self):
+        # Split the same way as SignUpForm.
+        parts = self.full_name.split()
+        if not parts:
+            return "", ""
+        return parts[0], parts[-1] if len(parts) > 1 else ""
+
+
+def clean_row(line, row):
+    """Return an ``ImportRow``, or raise ``ValidationError``."""
+    if isinstance(row, str):
+        raise ValidationError(row)
+
+    def text(key):
+        value = row.get(key)
+        return "" if value is None else str(value).strip()
+
+    errors = []
+    username = text("username")
+    if not username:
+        errors.append("username is required")
+    elif len(username) > 150:
+        errors.append("username is longer than 150 characters")
+    else:
+        try:
+            _username_validator(username)
+        except ValidationError as e:
+            errors.extend(e.messages)
+
+    email = User.objects.normalize_email(text("email"))
+    if email:
+        try:
+            validate_email(email)
+        except ValidationError:
+            errors.append(f"invalid email {email!r}")
+
+    full_name = text("full_name")
+    if len(full_name) > 150:
+        errors.append("full_name is longer than 150 characters")
+    gender = text("gender").upper()
+    if gender and gender not in _gender_values:
+        errors.append(f"gender must be one of {', '.join(sorted(_gender_values))}")
+
+    skills = row.get("skills") or []
+    if isinstance(skills, str):
+        skills = skills.split(";")
+    skills = list(dict.fromkeys(str(name).strip() for name in skills if str(name).strip()))
+    errors.extend(f"skill {name!r} is longer than 25 characters" for name in skills if len(name) > 25)
+
+    password = str(row["password"]) if row.get("password") else None
+    password_hash = text("password_hash") or None
+    if password and password_hash:
+        errors.append("give either password or password_hash, not both")
+    elif password_hash:
+        try:
+            identify_hasher(password_hash)
+        except ValueError:
+            errors.append("password_hash is not in a known hasher format")
+    elif password:
+        try:
+            validate_password(password, User(username=username, email=email))
+        except ValidationError as e:
+            errors.extend(e.messages)
+
+    if errors:
+        raise ValidationError(errors)
+    return ImportRow(line, username, email, password, password_hash,
+                     full_name, text("address"), gender, skills)
+
+
+def _init_hasher_process():
+    # Spawned (not forked) workers start without Django configured.
+    django.setup()
+
+
+class UserImporter:
+    """
+    Import one file. ``workers`` > 1 hashes plain-text passwords in that
+    many processes (hashing is deliberately slow and dominates the cost of
+    an import); ``on_error(line, messages)`` is called for every rejected
+    row.
+    """
+
+    def __init__(self, path, format=None, chunk_size=500, workers=None, on_error=None):
+        self.path = path
+        self.format = format
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.on_error = on_error or (lambda line, messages: None)
+        self.emails = None
+
+    def get_checkpoint(self):
+        checkpoint, _ = ImportCheckpoint.objects.get_or_create(
+            digest=file_digest(self.path),
+            defaults={"file_name": os.path.basename(self.path)[:255]},
+        )
+        return checkpoint
+
+    def run(self):
+        """Import the rows not imported yet; return the ``ImportCheckpoint``."""
+        checkpoint = self.get_checkpoint()
+        if checkpoint.finished_at:
+            return checkpoint
+        # Emails are unique in practice (SignUpForm enforces it) but not
+        # indexed case-insensitively, so check against a set loaded once.
+        self.emails = {
+            email.lower()
+            for email in User.objects.exclude(email="").values_list("email", flat=True).iterator()
+        }
+        rows = itertools.islice(read_rows(self.path, self.format), checkpoint.rows_done, None)
+        pool = None
+        if self.workers and self.workers > 1:
+            pool = ProcessPoolExecutor(self.workers, initializer=_init_hasher_process)
+        try:
+            while True:
+                chunk = list(itertools.islice(rows, self.chunk_size))
+                if not chunk:
+                    break
+                self.import_chunk(checkpoint, chunk, pool)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        checkpoint.finished_at = timezone.now()
+        checkpoint.save(update_fields=["finished_at", "updated_at"])
+        return checkpoint
+
+    def clean_chunk(self, chunk):
+        rows = []
+        for line, raw in chunk:
+            try:
+                rows.append(clean_row(line, raw))
+            except ValidationError as e:
+                self.on_error(line, e.messages)
+        taken = set(
+            User.objects.filter(username__in={row.username for row in rows})
+            .values_list("username", flat=True)
+        )
+
+        valid = []
+        for row in rows:
+            if row.username in taken:
+                self.on_error(row.line, [f"username {row.username!r} already exists"])
+            elif row.email and row.email.lower() in self.emails:
+                self.on_error(row.line, [f"email {row.email!r} is already in use"])
+            else:
+                taken.add(row.username)
+                if row.email:
+                    self.emails.add(row.email.lower())
+                valid.append(row)
+        return valid
+
+    def hash_passwords(self, rows, pool):
+        """Fill ``password_hash`` for rows given a plain-text password (or none)."""
+        pending = [row for row in rows if not row.password_hash]
+        passwords = [row.password for row in pending]
+        if pool is None:
+            hashes = map(make_password, passwords)
+        else:
+            chunksize = max(len(passwords) // (self.workers * 4), 1)
+            hashes = pool.map(make_password, passwords, chunksize=chunksize)
+        for row, password_hash in zip(pending, hashes):
+            row.password_hash = password_hash
+            row.password = None
+
+    def import_chunk(self, checkpoint, chunk, pool):
+        rows = self.clean_chunk(chunk)
+        self.hash_passwords(rows, pool)
+        now = timezone.now()
+
+        with transaction.atomic():
+            users = User.objects.bulk_create([
+                User(
+                    username=row.username,
+                    email=row.email,
+                    password=row.password_hash,
+                    first_name=row.first_and_last_name[0],
+                    last_name=row.first_and_last_name[1],
+                    date_joined=now,
+                )
+                for row in rows
+            ])
+            ProfileModel.objects.bulk_create([
+                ProfileModel(
+                    user=user,
+                    login_name=row.username,
+                    full_name=row.full_name,
+                    address=row.address,
+                    gender=row.gender,
+                    skills_changed_at=now if row.skills else None,
+                )
+                for user, row in zip(users, rows)
+            ])
+            skills = Skill.objects.bulk_create([
+                Skill(user=user, name=name)
+                for user, row in zip(users, rows)
+                for name in row.skills
+            ])
+
+            # What the Skill/User/Profile signal handlers would have done.
+            index_names(SkillIndexEntry.KIND_OFFER, [(s.user_id, s.name) for s in skills])
+            backend = get_search_backend()
+            for start in range(0, len(skills), INDEX_BATCH):
+                backend.index_skills(s.pk for s in skills[start:start + INDEX_BATCH])
+
+            checkpoint.rows_done += len(chunk)
+            checkpoint.users_created += len(users)
+            checkpoint.skills_created += len(skills)
+            checkpoint.rows_rejected += len(chunk) - len(rows)
+            checkpoint.save()
+
+
+def import_users(path, **options):
+    """Import ``path`` with ``UserImporter``; return the ``ImportCheckpoint``."""
+    return UserImporter(path, **options).run()
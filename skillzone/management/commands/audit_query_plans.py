@@ -0,0 +1,56 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from skillzone.query_audit import audit_views
+from skillzone.seeding import scratch_database, seed_database
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a scratch database, request every view and check the query "
+        "plan of each SELECT. Fails on full scans and temporary sorts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=300)
+        parser.add_argument("--barters", type=int, default=3000)
+        parser.add_argument("--messages", type=int, default=6000)
+        parser.add_argument(
+            "--show-plans",
+            action="store_true",
+            help="Print every query with its plan, not only the failing ones.",
+        )
+        parser.add_argument(
+            "--no-follow-pages",
+            action="store_true",
+            help="Do not also request the second page of paginated lists.",
+        )
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            user_ids = seed_database(
+                users=options["users"],
+                barters=options["barters"],
+                messages=options["messages"],
+            )
+            hub = User.objects.get(pk=user_ids[0])
+            report, problems, skipped = audit_views(
+                hub, follow_pages=not options["no_follow_pages"]
+            )
+
+        for url, (status, queries) in report.items():
+            self.stdout.write(f"{status} {len(queries):3d} queries  {url}")
+            if options["show_plans"]:
+                for sql, plan in queries:
+                    self.stdout.write(f"  {sql}")
+                    for line in plan:
+                        self.stdout.write(f"    {line}")
+        for name in skipped:
+            self.stdout.write(f"skipped {name} (no sample parameters)")
+        if problems:
+            for problem in problems:
+                self.stderr.write(str(problem))
+            raise CommandError(f"{len(problems)} queries with bad plans.")
+        self.stdout.write(self.style.SUCCESS(
+            f"All plans use indexes ({len(report)} URLs checked)."
+        ))
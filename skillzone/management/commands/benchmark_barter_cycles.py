@@ -0,0 +1,84 @@
+import itertools
+import random
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from skillzone.cycles import MAX_DEGREE, OFFER, WANT, SkillGraph, find_cycles
+
+
+class Command(BaseCommand):
+    help = "Time cycle discovery on a synthetic in-memory offer/want graph."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100000)
+        parser.add_argument("--terms", type=int, default=5000)
+        parser.add_argument(
+            "--skills-per-user",
+            type=int,
+            default=3,
+            help="Offered and wanted terms per user (default: 3).",
+        )
+        parser.add_argument("--max-length", type=int, choices=(3, 4), default=4)
+        parser.add_argument("--max-degree", type=int, default=MAX_DEGREE)
+        parser.add_argument("--time-budget", type=float, default=None)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def build_graph(self, options):
+        rng = random.Random(options["seed"])
+        # Zipf-like popularity: a few terms are wanted/offered by many users.
+        cum_weights = list(itertools.accumulate(
+            1 / (rank + 1) for rank in range(options["terms"])
+        ))
+        terms = [f"term{i}" for i in range(options["terms"])]
+        user_terms = {OFFER: {}, WANT: {}}
+        members = {OFFER: defaultdict(list), WANT: defaultdict(list)}
+        for user in range(1, options["users"] + 1):
+            for kind in (OFFER, WANT):
+                chosen = sorted(set(
+                    rng.choices(terms, cum_weights=cum_weights, k=options["skills_per_user"])
+                ))
+                user_terms[kind][user] = chosen
+                for term in chosen:
+                    members[kind][term].append(user)
+        return SkillGraph(user_terms, members, options["max_degree"])
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        graph = self.build_graph(options)
+        built = time.perf_counter()
+        deadline = (
+            time.monotonic() + options["time_budget"]
+            if options["time_budget"] else None
+        )
+        cycles, explored, timed_out = find_cycles(
+            graph, graph.users(), options["max_length"], deadline
+        )
+        searched = time.perf_counter()
+
+        # Incremental pass: 1% of users changed their skills. The real job
+        # starts from an empty SkillGraph.lazy(), so use a graph without the
+        # neighbours the full search memoized (the terms stand in for the
+        # index).
+        touched = random.Random(options["seed"] + 1).sample(
+            range(1, options["users"] + 1), max(1, options["users"] // 100)
+        )
+        incremental_start = time.perf_counter()
+        fresh = SkillGraph(graph.terms, graph.members, options["max_degree"])
+        find_cycles(fresh, sorted(touched), options["max_length"], smallest=False)
+        incremental = time.perf_counter()
+
+        lengths = defaultdict(int)
+        for cycle in cycles:
+            lengths[len(cycle)] += 1
+        self.stdout.write(
+            f"users={options['users']} terms={options['terms']} "
+            f"max_degree={options['max_degree']}\n"
+            f"graph build:       {built - start:.2f}s\n"
+            f"full search:       {searched - built:.2f}s "
+            f"({explored} users explored{', timed out' if timed_out else ''})\n"
+            f"incremental (1%):  {incremental - incremental_start:.2f}s\n"
+            f"cycles found:      {len(cycles)} "
+            + " ".join(f"len{k}={v}" for k, v in sorted(lengths.items()))
+        )
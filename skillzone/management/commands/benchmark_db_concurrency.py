@@ -0,0 +1,128 @@
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections, transaction
+from django.test import override_settings
+
+from skillzone.benchmark import percentile
+from skillzone.models import Message, Skill
+from skillzone.seeding import scratch_database, seed_database
+
+
+class Command(BaseCommand):
+    help = (
+        "Run mixed reads and writes from many threads against a scratch SQLite "
+        "file, once with SQLite's defaults and once with the configured tuning, "
+        "and report throughput, latency and 'database is locked' errors."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=32)
+        parser.add_argument("--operations", type=int, default=100, help="Operations per thread.")
+        parser.add_argument("--write-ratio", type=float, default=0.3)
+        parser.add_argument("--users", type=int, default=200, help="Users to seed.")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def modes(self):
+        database = connections["default"].settings_dict
+        # (pragmas, transaction mode); journal_mode is stored in the file,
+        # so the defaults have to set it back explicitly.
+        yield "sqlite defaults", {"journal_mode": "DELETE"}, None
+        yield "tuned", settings.SQLITE_PRAGMAS, database["OPTIONS"].get("transaction_mode")
+
+    def handle(self, *args, **options):
+        database = connections["default"].settings_dict
+        if connections["default"].vendor != "sqlite":
+            raise CommandError("This benchmark is for SQLite.")
+        directory = tempfile.mkdtemp()
+        test_settings = database.setdefault("TEST", {})
+        old_name, old_options = test_settings.get("NAME"), dict(database["OPTIONS"])
+        # A file, not the in-memory test database: locking is what is measured.
+        test_settings["NAME"] = os.path.join(directory, "concurrency.sqlite3")
+        try:
+            with scratch_database():
+                user_ids = seed_database(
+                    users=options["users"], barters=options["users"] * 2,
+                    messages=options["users"] * 10, seed=options["seed"],
+                )
+                for label, pragmas, transaction_mode in list(self.modes()):
+                    database["OPTIONS"].pop("transaction_mode", None)
+                    if transaction_mode:
+                        database["OPTIONS"]["transaction_mode"] = transaction_mode
+                    connections.close_all()
+                    with override_settings(SQLITE_PRAGMAS=pragmas):
+                        # Applies the pragmas, including switching the
+                        # journal mode, once before the threads start.
+                        connections["default"].ensure_connection()
+                        self.report(label, self.run(user_ids, options))
+                    connections.close_all()
+        finally:
+            database["OPTIONS"] = old_options
+            test_settings["NAME"] = old_name
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def run(self, user_ids, options):
+        barrier = threading.Barrier(options["threads"])
+        lock = threading.Lock()
+        results = {"latencies": [], "errors": 0}
+
+        def worker(number):
+            rng = random.Random(options["seed"] * 1000 + number)
+            latencies, errors = [], 0
+            try:
+                barrier.wait()
+                for _ in range(options["operations"]):
+                    start = time.perf_counter()
+                    try:
+                        if rng.random() < options["write_ratio"]:
+                            self.write(rng, user_ids)
+                        else:
+                            self.read(rng, user_ids)
+                    except OperationalError as e:
+                        if "locked" not in str(e):
+                            raise
+                        errors += 1
+                    latencies.append((time.perf_counter() - start) * 1000)
+            finally:
+                connections.close_all()
+                with lock:
+                    results["latencies"] += latencies
+                    results["errors"] += errors
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(options["threads"])]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        results["seconds"] = time.perf_counter() - start
+        return results
+
+    def read(self, rng, user_ids):
+        list(Skill.objects.select_related("user").order_by("-id")[:20])
+        Message.objects.filter(recipient_id=rng.choice(user_ids), is_read=False).count()
+
+    def write(self, rng, user_ids):
+        sender_id, recipient_id = rng.sample(user_ids, 2)
+        # Read, then write, like the conversation view posting a message.
+        with transaction.atomic():
+            sender = User.objects.get(pk=sender_id)
+            Message.objects.create(sender=sender, recipient_id=recipient_id, body="benchmark")
+
+    def report(self, label, results):
+        latencies = sorted(results["latencies"])
+        done = len(latencies) - results["errors"]
+        self.stdout.write(
+            f"{label:<16} {done / results['seconds']:8.0f} ops/s  "
+            f"p50 {percentile(latencies, 0.5):7.1f} ms  "
+            f"p95 {percentile(latencies, 0.95):7.1f} ms  "
+            f"max {latencies[-1]:7.1f} ms  "
+            f"locked errors {results['errors']}"
+        )
@@ -0,0 +1,98 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from skillzone.models import Barter, Skill
+from skillzone.seeding import scratch_database
+
+
+DJANGO_SESSION_MIDDLEWARE = "django.contrib.sessions.middleware.SessionMiddleware"
+SESSION_MIDDLEWARE = "skillzone.sessions.SessionMiddleware"
+COOKIE_MESSAGES = "django.contrib.messages.storage.cookie.CookieStorage"
+
+# (label, SESSION_ENGINE, MESSAGE_STORAGE, session middleware)
+MODES = [
+    (
+        "django defaults",
+        "django.contrib.sessions.backends.db",
+        "django.contrib.messages.storage.fallback.FallbackStorage",
+        DJANGO_SESSION_MIDDLEWARE,
+    ),
+    ("cached_db", "django.contrib.sessions.backends.cached_db", COOKIE_MESSAGES, SESSION_MIDDLEWARE),
+    ("signed_cookies", "django.contrib.sessions.backends.signed_cookies", COOKIE_MESSAGES, SESSION_MIDDLEWARE),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a logged-in browsing session (pages, a posted message, a barter "
+        "accepted with a flash message) under each session/message storage "
+        "mode and report database statements per request."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=20)
+
+    def handle(self, *args, **options):
+        for label, engine, storage, session_middleware in MODES:
+            middleware = [
+                session_middleware if name in (DJANGO_SESSION_MIDDLEWARE, SESSION_MIDDLEWARE) else name
+                for name in settings.MIDDLEWARE
+            ]
+            # Fresh data and caches for every mode.
+            caches["default"].clear()
+            caches["sessions"].clear()
+            with scratch_database(), override_settings(
+                SESSION_ENGINE=engine, MESSAGE_STORAGE=storage, MIDDLEWARE=middleware
+            ):
+                self.report(label, self.run(options["users"]))
+
+    def run(self, user_count):
+        users = [
+            User.objects.create_user(f"user{i}", f"user{i}@example.com", "pw")
+            for i in range(user_count)
+        ]
+        skills = Skill.objects.bulk_create(Skill(user=user, name=f"Skill {user.pk}") for user in users)
+        totals = {"requests": 0, "queries": 0, "session_reads": 0, "session_writes": 0}
+        for position, user in enumerate(users):
+            other = users[(position + 1) % len(users)]
+            barter = Barter.objects.create(
+                user_from=other, user_to=user,
+                skill_from=skills[(position + 1) % len(users)], skill_to=skills[position],
+                status=Barter.STATUS_ADMIN_APPROVED,
+            )
+            client = Client()
+            client.force_login(user)
+            for method, url, data in [
+                ("get", reverse("skillzone:home"), None),
+                ("get", reverse("skillzone:my_barters"), None),
+                ("get", reverse("skillzone:inbox"), None),
+                ("get", reverse("skillzone:notifications"), None),
+                ("post", reverse("skillzone:conversation", args=[other.pk]), {"body": "Hello"}),
+                ("get", reverse("skillzone:conversation", args=[other.pk]), None),
+                ("get", reverse("skillzone:update_barter_status", args=[barter.pk, "Accepted"]), None),
+                ("get", reverse("skillzone:my_barters"), None),
+                ("get", reverse("users-profile"), None),
+            ]:
+                with CaptureQueriesContext(connection) as ctx:
+                    getattr(client, method)(url, data)
+                session = [q["sql"] for q in ctx.captured_queries if "django_session" in q["sql"]]
+                writes = [sql for sql in session if not sql.lstrip().upper().startswith("SELECT")]
+                totals["requests"] += 1
+                totals["queries"] += len(ctx.captured_queries)
+                totals["session_reads"] += len(session) - len(writes)
+                totals["session_writes"] += len(writes)
+        return totals
+
+    def report(self, label, totals):
+        requests = totals["requests"]
+        self.stdout.write(
+            f"{label:<16} {totals['queries'] / requests:5.2f} statements/request  "
+            f"session reads {totals['session_reads'] / requests:4.2f}  "
+            f"session writes {totals['session_writes'] / requests:4.2f}"
+        )
@@ -0,0 +1,80 @@
+import statistics
+import time
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.management.base import BaseCommand
+from django.template import Context, Template
+from django.test import RequestFactory
+
+from skillzone import fragments
+from skillzone.models import Skill
+
+
+# The card loop of the home page, with and without the fragment cache.
+UNCACHED = Template(
+    "{% for skill in skills %}<div class=\"col-md-4 mb-3\">"
+    "{% include 'partials/skill_card.html' with layout='home' actions=actions %}"
+    "</div>{% endfor %}"
+)
+CACHED = Template(
+    "{% load skill_cards %}{% prefetch_skill_cards skills 'home' %}"
+    "{% for skill in skills %}<div class=\"col-md-4 mb-3\">"
+    "{% skill_card skill 'home' %}</div>{% endfor %}"
+)
+
+
+class Command(BaseCommand):
+    help = "Time rendering a page of skill cards with and without the fragment cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--cards", type=int, default=500)
+        parser.add_argument("--owners", type=int, default=100)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def build_skills(self, options):
+        # Unsaved rows: rendering needs no database, only ids.
+        owners = [
+            User(pk=pk, username=f"user{pk}") for pk in range(1, options["owners"] + 1)
+        ]
+        return [
+            Skill(
+                pk=pk,
+                user=owners[pk % len(owners)],
+                name=f"Skill {pk}",
+                description="Lessons for beginners and improvers, online or in person. " * 2,
+            )
+            for pk in range(1, options["cards"] + 1)
+        ]
+
+    def time(self, template, context, repeat, before=None):
+        timings = []
+        for _ in range(repeat):
+            if before:
+                before()
+            start = time.perf_counter()
+            template.render(Context(context))
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
+
+    def handle(self, *args, **options):
+        skills = self.build_skills(options)
+        request = RequestFactory().get("/")
+        request.user = AnonymousUser()
+        context = {"skills": skills, "request": request, "actions": False}
+        cache = fragments.fragment_cache()
+        repeat = options["repeat"]
+
+        uncached = self.time(UNCACHED, context, repeat)
+        cold = self.time(CACHED, context, repeat, before=cache.clear)
+        self.time(CACHED, context, 1)
+        fragments.reset_stats()
+        warm = self.time(CACHED, context, repeat)
+        counts = fragments.stats()
+
+        self.stdout.write(
+            f"cards={len(skills)} repeat={repeat} (median render time)\n"
+            f"uncached:    {uncached:8.2f} ms\n"
+            f"cold cache:  {cold:8.2f} ms\n"
+            f"warm cache:  {warm:8.2f} ms ({uncached / warm:.1f}x faster)\n"
+            f"warm hits={counts['hits']} misses={counts['misses']}"
+        )
@@ -0,0 +1,98 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from skillzone.benchmark import benchmark_views, compare
+from skillzone.seeding import scratch_database, seed_database
+
+
+class Command(BaseCommand):
+    help = (
+        "Request every view through the test client and report p50/p95 "
+        "latency, query count and response size per view as JSON. With "
+        "--baseline, fail if any view regressed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            help="Username to request the views as (default: the user with the most barters).",
+        )
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--warmup", type=int, default=2)
+        parser.add_argument("--output", help="Write the results to this JSON file.")
+        parser.add_argument("--baseline", help="Compare against a JSON file written by --output.")
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.5,
+            help="Allowed relative p95 increase before a view counts as slower.",
+        )
+        parser.add_argument(
+            "--min-ms",
+            type=float,
+            default=5.0,
+            help="Ignore p95 increases smaller than this many milliseconds.",
+        )
+        parser.add_argument(
+            "--scratch",
+            action="store_true",
+            help="Run against a freshly seeded scratch database instead of the configured one.",
+        )
+        parser.add_argument("--users", type=int, default=1000, help="Users to seed with --scratch.")
+        parser.add_argument("--barters", type=int, default=10000, help="Barters to seed with --scratch.")
+        parser.add_argument("--messages", type=int, default=20000, help="Messages to seed with --scratch.")
+
+    def handle(self, *args, **options):
+        if options["scratch"]:
+            with scratch_database():
+                user_ids = seed_database(
+                    users=options["users"],
+                    barters=options["barters"],
+                    messages=options["messages"],
+                )
+                results, skipped = self.run(User.objects.get(pk=user_ids[0]), options)
+        else:
+            results, skipped = self.run(self.get_user(options["user"]), options)
+
+        data = {"repeat": options["repeat"], "views": results}
+        output = json.dumps(data, indent=2, sort_keys=True)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(output + "\n")
+        else:
+            self.stdout.write(output)
+        for name in skipped:
+            self.stderr.write(f"skipped {name}")
+
+        if options["baseline"]:
+            with open(options["baseline"]) as f:
+                baseline = json.load(f)["views"]
+            regressions = compare(
+                baseline, results, options["tolerance"], options["min_ms"]
+            )
+            if regressions:
+                for line in regressions:
+                    self.stderr.write(line)
+                raise CommandError(f"{len(regressions)} regressions against the baseline.")
+            self.stderr.write(self.style.SUCCESS("No regressions against the baseline."))
+
+    def get_user(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f"No user named {username!r}.")
+        user = (
+            User.objects.annotate(n=Count("barters_sent"))
+            .order_by("-n", "pk")
+            .first()
+        )
+        if user is None:
+            raise CommandError("The database has no users; run seed_data or pass --scratch.")
+        return user
+
+    def run(self, user, options):
+        return benchmark_views(user, repeat=options["repeat"], warmup=options["warmup"])
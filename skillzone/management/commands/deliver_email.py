@@ -0,0 +1,41 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from skillzone.outbox import deliver_outbox
+
+
+class Command(BaseCommand):
+    help = (
+        "Send queued mail from the outbox in batches over one SMTP connection "
+        "per batch. Runs until the outbox is empty, or forever with --loop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=settings.OUTBOX_BATCH_SIZE)
+        parser.add_argument("--loop", action="store_true", help="Keep polling for new mail.")
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5.0,
+            help="Seconds between polls of an empty outbox with --loop (default: 5).",
+        )
+
+    def handle(self, *args, **options):
+        totals = {"sent": 0, "retried": 0, "dead": 0}
+        while True:
+            counts = deliver_outbox(options["batch_size"])
+            for key, value in counts.items():
+                totals[key] += value
+            if any(counts.values()):
+                self.stdout.write(
+                    f"sent {counts['sent']}, retrying {counts['retried']}, dead {counts['dead']}"
+                )
+                continue
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+        self.stdout.write(
+            f"Done: sent {totals['sent']}, retrying {totals['retried']}, dead {totals['dead']}."
+        )
@@ -0,0 +1,70 @@
+import datetime
+
+from django.core.exceptions import FieldError, ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from skillzone.exports import CHUNK_SIZE, EXPORTS, FORMATS, stream_export
+
+
+def parse_moment(value):
+    """``YYYY-MM-DD`` or an ISO datetime, in the current time zone when naive."""
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f"Invalid date {value!r}.")
+        moment = datetime.datetime.combine(day, datetime.time())
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream barters, feedback or messages to a CSV or NDJSON file "
+        "(or stdout) without loading the table into memory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("model", choices=EXPORTS)
+        parser.add_argument("--format", choices=FORMATS, default="csv")
+        parser.add_argument("--output", help="File to write (default: stdout).")
+        parser.add_argument("--since", help="Only rows dated on or after this date/time.")
+        parser.add_argument("--until", help="Only rows dated before this date/time.")
+        parser.add_argument(
+            "--filter",
+            action="append",
+            default=[],
+            metavar="LOOKUP=VALUE",
+            help="Extra queryset filter, e.g. status=Completed or user_from__username=ana. Repeatable.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        export = EXPORTS[options["model"]]
+        filters = {}
+        for item in options["filter"]:
+            lookup, sep, value = item.partition("=")
+            if not sep:
+                raise CommandError(f"Filters look like LOOKUP=VALUE, got {item!r}.")
+            filters[lookup] = value
+        try:
+            queryset = export.queryset(
+                since=options["since"] and parse_moment(options["since"]),
+                until=options["until"] and parse_moment(options["until"]),
+                filters=filters,
+            )
+        except (FieldError, ValidationError, ValueError) as e:
+            raise CommandError(f"Invalid filter: {e}")
+
+        chunks = stream_export(
+            export, queryset, options["format"], chunk_size=options["chunk_size"]
+        )
+        if options["output"]:
+            with open(options["output"], "w", newline="", encoding="utf-8") as f:
+                f.writelines(chunks)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending="")
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+
+from skillzone.cycles import MAX_DEGREE, discover
+
+
+class Command(BaseCommand):
+    help = "Find multi-party barter cycles (A teaches B, B teaches C, C teaches A)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="Only revisit users whose skills changed since the last run.",
+        )
+        parser.add_argument(
+            "--max-length",
+            type=int,
+            choices=(3, 4),
+            default=4,
+            help="Longest cycle to look for (default: 4).",
+        )
+        parser.add_argument(
+            "--time-budget",
+            type=float,
+            default=60.0,
+            help="Stop searching after this many seconds (default: 60).",
+        )
+        parser.add_argument(
+            "--max-degree",
+            type=int,
+            default=MAX_DEGREE,
+            help=f"Partners followed per user and direction (default: {MAX_DEGREE}).",
+        )
+
+    def handle(self, *args, **options):
+        run = discover(
+            incremental=options["incremental"],
+            max_length=options["max_length"],
+            time_budget=options["time_budget"],
+            max_degree=options["max_degree"],
+        )
+        mode = "incremental" if run.incremental else "full"
+        elapsed = (run.finished_at - run.started_at).total_seconds()
+        self.stdout.write(self.style.SUCCESS(
+            f"{mode} run: explored {run.explored_users} users, "
+            f"stored {run.cycles_found} new cycles in {elapsed:.1f}s"
+            + (" (time budget reached)" if run.timed_out else "")
+        ))
@@ -0,0 +1,47 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from skillzone.importing import FORMATS, import_users
+
+
+class Command(BaseCommand):
+    help = (
+        "Create users, profiles and skills in bulk from a CSV or JSON Lines "
+        "file. Running it again on the same file resumes an interrupted import."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument(
+            "--format",
+            choices=FORMATS,
+            help="Input format (default: from the file extension).",
+        )
+        parser.add_argument("--chunk-size", type=int, default=500)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Processes hashing plain-text passwords (1 to hash in this process).",
+        )
+
+    def handle(self, *args, **options):
+        def report(line, messages):
+            self.stderr.write(f"line {line}: {'; '.join(messages)}")
+
+        try:
+            checkpoint = import_users(
+                options["path"],
+                format=options["format"],
+                chunk_size=options["chunk_size"],
+                workers=options["workers"],
+                on_error=report,
+            )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"{checkpoint.file_name}: {checkpoint.users_created} users and "
+            f"{checkpoint.skills_created} skills created from "
+            f"{checkpoint.rows_done} rows ({checkpoint.rows_rejected} rejected)."
+        ))
@@ -0,0 +1,128 @@
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+# Run in a fresh interpreter, like a newly started worker. Prints timings
+# as JSON on stdout; -X importtime writes the import profile to stderr.
+SCRIPT = """
+import json, sys, time
+from wsgiref.util import setup_testing_defaults
+
+start = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter()
+from skill_barter_zone.wsgi import application
+loaded = time.perf_counter()
+
+def request(path):
+    environ = {"PATH_INFO": path, "REQUEST_METHOD": "GET"}
+    setup_testing_defaults(environ)
+    status = []
+    begin = time.perf_counter()
+    body = application(environ, lambda s, headers, exc_info=None: status.append(s))
+    next(iter(body), b"")
+    elapsed = time.perf_counter() - begin
+    body.close()
+    return elapsed * 1000, status[0]
+
+first, status = request(sys.argv[1])
+second, _ = request(sys.argv[1])
+print(json.dumps({
+    "setup_ms": (setup - start) * 1000,
+    "load_ms": (loaded - setup) * 1000,
+    "first_ms": first,
+    "second_ms": second,
+    "status": status,
+}))
+"""
+
+
+def parse_importtime(lines):
+    """Self time in ms of every imported module, from ``-X importtime`` output."""
+    modules = {}
+    for line in lines:
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line.removeprefix("import time:").split("|")
+        modules[name.strip()] = int(self_us) / 1000
+    return modules
+
+
+class Command(BaseCommand):
+    help = (
+        "Start fresh worker processes and report import and django.setup() time "
+        "per package, and time to first byte with and without warm-up."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default="/accounts/", help="URL to request (default: the login page).")
+        parser.add_argument("--top", type=int, default=15, help="Packages to list (default: 15).")
+        parser.add_argument("--runs", type=int, default=3, help="Processes per mode; the median is shown.")
+        parser.add_argument(
+            "--target-ms",
+            type=float,
+            default=50.0,
+            help="Target time to first byte of a warmed-up worker after fork (default: 50).",
+        )
+
+    def run(self, path, warm_up):
+        env = dict(
+            os.environ,
+            DJANGO_SETTINGS_MODULE=os.environ.get("DJANGO_SETTINGS_MODULE", "skill_barter_zone.settings"),
+            WARM_UP="1" if warm_up else "0",
+        )
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", SCRIPT, path],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode:
+            raise CommandError(result.stderr.strip().splitlines()[-1])
+        return json.loads(result.stdout.splitlines()[-1]), parse_importtime(result.stderr.splitlines())
+
+    def median_run(self, path, warm_up, runs):
+        results = sorted(
+            (self.run(path, warm_up) for _ in range(runs)),
+            key=lambda result: result[0]["setup_ms"] + result[0]["load_ms"] + result[0]["first_ms"],
+        )
+        return results[len(results) // 2]
+
+    def handle(self, *args, **options):
+        runs = max(1, options["runs"])
+        cold, modules = self.median_run(options["path"], False, runs)
+        warm, _ = self.median_run(options["path"], True, runs)
+
+        packages = defaultdict(float)
+        for name, ms in modules.items():
+            packages[name.split(".")[0]] += ms
+        self.stdout.write(f"imports: {sum(modules.values()):.1f} ms in {len(modules)} modules")
+        for name, ms in sorted(packages.items(), key=lambda item: -item[1])[:options["top"]]:
+            self.stdout.write(f"  {name:<28} {ms:8.1f} ms")
+
+        self.stdout.write(f"\nGET {options['path']} ({cold['status']}), median of {runs} processes")
+        self.stdout.write(f"{'':<22}{'no warm-up':>12}{'warm-up':>12}")
+        for label, key in (
+            ("django.setup()", "setup_ms"),
+            ("load application", "load_ms"),
+            ("first request", "first_ms"),
+            ("second request", "second_ms"),
+        ):
+            self.stdout.write(f"{label:<22}{cold[key]:>9.1f} ms{warm[key]:>9.1f} ms")
+
+        # Preforked workers inherit the loaded, warmed-up application, so
+        # their time to first byte is the first request alone.
+        ttfb = warm["first_ms"]
+        verdict = "met" if ttfb <= options["target_ms"] else "MISSED"
+        self.stdout.write(
+            f"\ntime to first byte after fork: {ttfb:.1f} ms "
+            f"(target {options['target_ms']:.0f} ms: {verdict})"
+        )
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from skillzone.sessions import purge_expired_sessions
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired sessions in chunks, each in its own short transaction. "
+        "Runs once, or forever with --loop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument("--loop", action="store_true", help="Keep running.")
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=60 * 60,
+            help="Seconds between runs with --loop (default: 3600).",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            deleted = purge_expired_sessions(options["chunk_size"])
+            self.stdout.write(f"Deleted {deleted} expired sessions.")
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from skillzone.matching import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the offer/want skill index used by the matches page."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of skills read per batch (default: 1000).",
+        )
+
+    def handle(self, *args, **options):
+        total = rebuild_index(chunk_size=options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} offer/want entries."))
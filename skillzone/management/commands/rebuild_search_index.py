@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from skillzone.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the skill search index from the Skill, User and ProfileModel tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of skills indexed per transaction (default: 1000).",
+        )
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        total = backend.rebuild(chunk_size=options["chunk_size"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Indexed {total} skills with {type(backend).__name__}."
+            )
+        )
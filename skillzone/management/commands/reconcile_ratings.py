@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+
+from skillzone.reputation import reconcile_profiles
+from users.models import ProfileModel
+
+
+class Command(BaseCommand):
+    help = (
+        "Backfill or repair the rating_count/rating_sum counters on every "
+        "profile from the Feedback table, one chunk of profiles at a time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Number of profiles checked per batch (default: 500).",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report the profiles that are out of date without fixing them.",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        checked = fixed = 0
+        last_id = 0
+
+        while True:
+            profiles = list(
+                ProfileModel.objects.filter(id__gt=last_id)
+                .only("id", "user_id", "rating_count", "rating_sum")
+                .order_by("id")[:chunk_size]
+            )
+            if not profiles:
+                break
+            last_id = profiles[-1].id
+            checked += len(profiles)
+
+            stale = reconcile_profiles(profiles)
+            fixed += len(stale)
+            if stale and not options["dry_run"]:
+                ProfileModel.objects.bulk_update(
+                    stale, ["rating_count", "rating_sum"]
+                )
+
+        verb = "Would fix" if options["dry_run"] else "Fixed"
+        self.stdout.write(
+            self.style.SUCCESS(f"Checked {checked} profiles. {verb} {fixed}.")
+        )
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+
+from skillzone.seeding import DEFAULT_PASSWORD, seed_database
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with synthetic users, skills, barters, feedback "
+        "and messages, skewed towards a few busy users and hot skills."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--skills-per-user", type=int, default=3)
+        parser.add_argument("--wanted-per-user", type=int, default=2)
+        parser.add_argument("--barters", type=int, default=10000)
+        parser.add_argument("--messages", type=int, default=20000)
+        parser.add_argument(
+            "--skew",
+            type=float,
+            default=1.0,
+            help="Zipf exponent of activity per user (0 for uniform).",
+        )
+        parser.add_argument(
+            "--skill-skew",
+            type=float,
+            default=1.0,
+            help="Zipf exponent of skill name popularity (0 for uniform).",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        user_ids = seed_database(
+            users=options["users"],
+            skills_per_user=options["skills_per_user"],
+            wanted_per_user=options["wanted_per_user"],
+            barters=options["barters"],
+            messages=options["messages"],
+            skew=options["skew"],
+            skill_skew=options["skill_skew"],
+            seed=options["seed"],
+            batch_size=options["batch_size"],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(user_ids)} users, {options['barters']} barters and "
+            f"{options['messages']} messages. Users log in with password "
+            f"{DEFAULT_PASSWORD!r}; the busiest is user #{user_ids[0]}."
+        ))
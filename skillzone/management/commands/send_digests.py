@@ -0,0 +1,33 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from skillzone.notifications import send_digests
+
+
+class Command(BaseCommand):
+    help = (
+        "Queue a digest email of unseen notifications for every user that has "
+        "not had one within NOTIFICATION_DIGEST_INTERVAL. Runs once, or "
+        "forever with --loop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=settings.NOTIFICATION_DIGEST_WORKERS)
+        parser.add_argument("--chunk-size", type=int, default=settings.NOTIFICATION_DIGEST_CHUNK_SIZE)
+        parser.add_argument("--loop", action="store_true", help="Keep running.")
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=60.0,
+            help="Seconds between runs with --loop (default: 60).",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            result = send_digests(options["workers"], options["chunk_size"])
+            self.stdout.write(f"{result['users']} users due, {result['queued']} digests queued.")
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
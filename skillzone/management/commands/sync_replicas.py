@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from skillzone.replicas import copy_to_replica
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database over every replica in "
+        "REPLICA_DATABASES, for running with replicas locally."
+    )
+
+    def handle(self, *args, **options):
+        if not settings.REPLICA_DATABASES:
+            raise CommandError("No replicas configured; set DATABASE_REPLICAS.")
+        for alias in settings.REPLICA_DATABASES:
+            try:
+                copy_to_replica(alias)
+            except ValueError as e:
+                raise CommandError(f"{alias}: {e}")
+            self.stdout.write(f"Copied the primary to {alias}.")
@@ -0,0 +1,188 @@
+"""
+Reciprocal barter matching.
+
+A mutual match for user U is another user V who offers at least one skill
+U wants *and* wants at least one skill U offers. Skills are compared by
+normalized name through ``SkillIndexEntry``, an inverted index from term
+to users kept per side (offer/want). The index is updated per user when
+their ``Skill`` or ``WantedSkill`` rows change (see ``skillzone.signals``),
+so finding matches is a handful of bounded index range reads, not a scan.
+"""
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from users.models import ProfileModel
+
+from .models import Skill, SkillIndexEntry, WantedSkill
+
+
+MAX_MATCHES = 50
+
+# Most users a single term can contribute as match candidates. Popular
+# terms ("python") would otherwise make every lookup read a large part of
+# the index.
+TERM_FANOUT = 200
+
+# Candidate user ids per scoring query (keeps SQL parameter lists short).
+PROBE_BATCH = 900
+
+SOURCES = {
+    SkillIndexEntry.KIND_OFFER: Skill,
+    SkillIndexEntry.KIND_WANT: WantedSkill,
+}
+
+
+def normalize_skill_name(name):
+    """Case-fold and collapse whitespace: ``" Web  Design"`` -> ``"web design"``."""
+    return " ".join((name or "").casefold().split())
+
+
+def reindex_user(user_id, kind):
+    """
+    Bring one user's ``kind`` side of the index in line with their rows.
+
+    Returns ``True`` when the index changed, in which case the user's
+    profile is stamped with ``skills_changed_at``.
+    """
+    if user_id is None:
+        return False
+    names = SOURCES[kind].objects.filter(user_id=user_id).values_list("name", flat=True)
+    wanted = {normalize_skill_name(name) for name in names} - {""}
+
+    entries = SkillIndexEntry.objects.filter(user_id=user_id, kind=kind)
+    with transaction.atomic():
+        current = set(entries.values_list("term", flat=True))
+        if current == wanted:
+            return False
+        if current - wanted:
+            entries.filter(term__in=current - wanted).delete()
+        SkillIndexEntry.objects.bulk_create(
+            [
+                SkillIndexEntry(user_id=user_id, kind=kind, term=term)
+                for term in wanted - current
+            ],
+            ignore_conflicts=True,
+        )
+        ProfileModel.objects.filter(user_id=user_id).update(
+            skills_changed_at=timezone.now()
+        )
+    return True
+
+
+def rebuild_index(chunk_size=1000):
+    """Rebuild the whole index from ``Skill`` and ``WantedSkill``."""
+    total = 0
+    with transaction.atomic():
+        SkillIndexEntry.objects.all().delete()
+    for kind, model in SOURCES.items():
+        last_id = 0
+        while True:
+            rows = list(
+                model.objects.filter(id__gt=last_id, user__isnull=False)
+                .order_by("id")
+                .values_list("id", "user_id", "name")[:chunk_size]
+            )
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            total += index_names(kind, [(user_id, name) for _, user_id, name in rows])
+    return total
+
+
+def index_names(kind, rows):
+    """
+    Add index entries for ``(user_id, skill name)`` pairs without touching
+    the users' other entries; for rows inserted in bulk, which send no
+    signals. Returns the number of entries written.
+    """
+    created = SkillIndexEntry.objects.bulk_create(
+        [
+            SkillIndexEntry(user_id=user_id, kind=kind, term=term)
+            for user_id, name in rows
+            if (term := normalize_skill_name(name))
+        ],
+        ignore_conflicts=True,
+    )
+    return len(created)
+
+
+def user_terms(user_id, kind):
+    return list(
+        SkillIndexEntry.objects.filter(user_id=user_id, kind=kind).values_list(
+            "term", flat=True
+        )
+    )
+
+
+def _term_candidates(kind, term, viewer_id):
+    """
+    Up to ``TERM_FANOUT`` users on the ``kind`` side of ``term``.
+
+    Reads a slice of the (kind, term, user_id) index starting just after
+    the viewer and wrapping around, so different viewers of a popular term
+    see different partners while each lookup stays a bounded range read.
+    """
+    entries = SkillIndexEntry.objects.filter(kind=kind, term=term).order_by("user_id")
+    users = list(
+        entries.filter(user_id__gt=viewer_id).values_list("user_id", flat=True)[:TERM_FANOUT]
+    )
+    if len(users) < TERM_FANOUT:
+        users += entries.filter(user_id__lt=viewer_id).values_list(
+            "user_id", flat=True
+        )[: TERM_FANOUT - len(users)]
+    return users
+
+
+def find_matches(user, limit=MAX_MATCHES):
+    """
+    Return mutual matches for ``user``, best first, as dicts::
+
+        {"user_id": 7, "score": 3, "teaches": ["guitar"], "learns": ["python", "sql"]}
+
+    ``teaches`` lists the terms the other user offers that ``user`` wants,
+    ``learns`` the terms ``user`` offers that the other user wants. The
+    score is the size of the overlap on both sides together.
+
+    Candidates are collected per term (at most ``TERM_FANOUT`` each, see
+    ``_term_candidates``) and then scored exactly from their own index
+    rows, so the work is bounded by the number of terms the user has, not
+    by how popular those terms are.
+    """
+    wants = user_terms(user.pk, SkillIndexEntry.KIND_WANT)
+    offers = user_terms(user.pk, SkillIndexEntry.KIND_OFFER)
+    if not wants or not offers:
+        return []
+
+    candidates = set()
+    for term in wants:
+        candidates.update(_term_candidates(SkillIndexEntry.KIND_OFFER, term, user.pk))
+    for term in offers:
+        candidates.update(_term_candidates(SkillIndexEntry.KIND_WANT, term, user.pk))
+
+    overlap = {}
+    candidates = sorted(candidates)
+    for start in range(0, len(candidates), PROBE_BATCH):
+        entries = SkillIndexEntry.objects.filter(
+            user_id__in=candidates[start:start + PROBE_BATCH]
+        ).filter(
+            Q(kind=SkillIndexEntry.KIND_OFFER, term__in=wants)
+            | Q(kind=SkillIndexEntry.KIND_WANT, term__in=offers)
+        )
+        for user_id, kind, term in entries.values_list("user_id", "kind", "term"):
+            side = "teaches" if kind == SkillIndexEntry.KIND_OFFER else "learns"
+            match = overlap.setdefault(
+                user_id, {"user_id": user_id, "teaches": [], "learns": []}
+            )
+            match[side].append(term)
+
+    matches = []
+    for match in overlap.values():
+        if match["teaches"] and match["learns"]:
+            match["teaches"].sort()
+            match["learns"].sort()
+            match["score"] = len(match["teaches"]) + len(match["learns"])
+            matches.append(match)
+    matches.sort(key=lambda m: (-m["score"], -len(m["teaches"]), m["user_id"]))
+    return matches[:limit]
@@ -0,0 +1,47 @@
+from django.db import migrations
+
+
+SEARCH_TABLE = "skillzone_skill_search"
+
+
+def create_search_index(apps, schema_editor):
+    """Create and fill the FTS5 skill index (SQLite only)."""
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+        "name, description, username, full_name, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    # bm25 weights per column: a hit in the skill name counts most, then
+    # the owner's names, then the description.
+    schema_editor.execute(
+        f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}, rank) "
+        "VALUES ('rank', 'bm25(10.0, 2.0, 5.0, 5.0)')"
+    )
+    schema_editor.execute(
+        f"INSERT INTO {SEARCH_TABLE} (rowid, name, description, username, full_name) "
+        "SELECT s.id, s.name, COALESCE(s.description, ''), "
+        "COALESCE(u.username, ''), COALESCE(p.full_name, '') "
+        "FROM skillzone_skill s "
+        "LEFT JOIN auth_user u ON u.id = s.user_id "
+        "LEFT JOIN users_profilemodel p ON p.user_id = s.user_id"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skillzone', '0006_barter_completed_by_from_barter_completed_by_to_and_more'),
+        ('users', '0004_alter_profilemodel_gender_alter_profilemodel_id'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def index_existing_skills(apps, schema_editor):
+    """Fill the offer side of the index from the skills already stored."""
+    Skill = apps.get_model('skillzone', 'Skill')
+    SkillIndexEntry = apps.get_model('skillzone', 'SkillIndexEntry')
+    rows = Skill.objects.filter(user__isnull=False).values_list('user_id', 'name')
+    batch = []
+    for user_id, name in rows.iterator(chunk_size=2000):
+        term = " ".join((name or "").casefold().split())
+        if term:
+            batch.append(SkillIndexEntry(kind='offer', term=term, user_id=user_id))
+        if len(batch) >= 2000:
+            SkillIndexEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    SkillIndexEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skillzone', '0007_skill_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WantedSkill',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=25)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='wanted_skills', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SkillIndexEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('offer', 'Offers'), ('want', 'Wants')], max_length=5)),
+                ('term', models.CharField(max_length=25)),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='skill_index_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'kind', 'term'], name='skillindex_user_kind_term')],
+                'unique_together': {('kind', 'term', 'user')},
+            },
+        ),
+        migrations.RunPython(index_existing_skills, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skillzone', '0008_wanted_skills_and_match_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BarterCycle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('signature', models.CharField(max_length=100, unique=True)),
+                ('length', models.PositiveSmallIntegerField()),
+                ('status', models.CharField(choices=[('Proposed', 'Proposed')], default='Proposed', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CycleDiscoveryRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField()),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('incremental', models.BooleanField(default=False)),
+                ('explored_users', models.PositiveIntegerField(default=0)),
+                ('cycles_found', models.PositiveIntegerField(default=0)),
+                ('timed_out', models.BooleanField(default=False)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BarterCycleLeg',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveSmallIntegerField()),
+                ('term', models.CharField(max_length=25)),
+                ('cycle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='legs', to='skillzone.bartercycle')),
+                ('learner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cycle_legs_learning', to=settings.AUTH_USER_MODEL)),
+                ('teacher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cycle_legs_teaching', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['cycle', 'position'],
+                'unique_together': {('cycle', 'position')},
+            },
+        ),
+    ]
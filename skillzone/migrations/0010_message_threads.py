@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def build_threads(apps, schema_editor):
+    """Create both participants' thread rows from the existing messages."""
+    Message = apps.get_model('skillzone', 'Message')
+    Thread = apps.get_model('skillzone', 'Thread')
+    threads = {}
+    rows = Message.objects.order_by('created_at', 'id').values_list(
+        'id', 'sender_id', 'recipient_id', 'created_at', 'is_read'
+    )
+    for message_id, sender_id, recipient_id, created_at, is_read in rows.iterator(chunk_size=2000):
+        for owner, other in ((sender_id, recipient_id), (recipient_id, sender_id)):
+            thread = threads.setdefault(
+                (owner, other),
+                Thread(owner_id=owner, other_id=other, unread_count=0),
+            )
+            thread.last_message_id = message_id
+            thread.last_activity = created_at
+        if not is_read:
+            threads[(recipient_id, sender_id)].unread_count += 1
+    Thread.objects.bulk_create(threads.values(), batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skillzone', '0009_barter_cycles'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Thread',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_activity', models.DateTimeField()),
+                ('unread_count', models.PositiveIntegerField(default=0)),
+                ('last_message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='skillzone.message')),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('owner', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='threads', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['owner', '-last_activity'], name='thread_owner_activity')],
+                'unique_together': {('owner', 'other')},
+            },
+        ),
+        migrations.RunPython(build_threads, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skillzone', '0010_message_threads'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='barter',
+            name='user_from',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='barters_sent', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='barter',
+            name='user_to',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='barters_received', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='message',
+            name='sender',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='sent_messages', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='wantedskill',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='wanted_skills', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='barter',
+            index=models.Index(fields=['user_from', 'date_requested'], name='barter_from_date'),
+        ),
+        migrations.AddIndex(
+            model_name='barter',
+            index=models.Index(fields=['user_to', 'date_requested'], name='barter_to_date'),
+        ),
+        migrations.AddIndex(
+            model_name='barter',
+            index=models.Index(fields=['user_from', 'status', 'date_requested'], name='barter_from_status_date'),
+        ),
+        migrations.AddIndex(
+            model_name='barter',
+            index=models.Index(fields=['user_to', 'status', 'date_requested'], name='barter_to_status_date'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['sender', 'recipient', 'created_at'], name='message_pair_created'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(condition=models.Q(('is_read', False)), fields=['sender', 'recipient'], name='message_pair_unread'),
+        ),
+        migrations.AddIndex(
+            model_name='wantedskill',
+            index=models.Index(fields=['user', 'name'], name='wantedskill_user_name'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skillzone', '0013_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BarterEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transition', models.CharField(max_length=20)),
+                ('from_status', models.CharField(blank=True, max_length=20)),
+                ('to_status', models.CharField(max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='barter_events', to=settings.AUTH_USER_MODEL)),
+                ('barter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='skillzone.barter')),
+            ],
+            options={
+                'ordering': ['barter', 'id'],
+            },
+        ),
+    ]
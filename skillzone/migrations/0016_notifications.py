@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skillzone', '0015_email_outbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('barter_request', 'New barter request'), ('barter_approved', 'Barter request approved'), ('barter_accepted', 'Barter accepted'), ('barter_rejected', 'Barter rejected'), ('barter_confirmed', 'Barter marked completed by the other side'), ('barter_completed', 'Barter completed'), ('message', 'New message')], max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('seen_at', models.DateTimeField(blank=True, null=True)),
+                ('digested_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('barter', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='skillzone.barter')),
+                ('message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='skillzone.message')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'id'], name='notification_user'), models.Index(condition=models.Q(('digested_at__isnull', True), ('seen_at__isnull', True)), fields=['user', 'id'], name='notification_pending')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:45
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skillzone', '0016_notifications'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='feedback',
+            name='updated_at',
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 
@@ -20,11 +20,76 @@ class Skill(models.Model):
     )
     name = models.CharField(max_length=25)
     description = models.TextField(blank=True, null=True)
+    # Indexed so the newest change is one index lookup (skillzone.freshness).
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self) -> str:
         return self.name
 
 
+class WantedSkill(models.Model):
+    """
+    A skill a user would like to learn.
+
+    The "wanted" side of a user, matched against the skills other users
+    offer on the matches page.
+    """
+
+    user = models.ForeignKey(
+        User,
+        related_name="wanted_skills",
+        on_delete=models.CASCADE,
+        db_index=False,  # covered by the (user, name) index
+    )
+    name = models.CharField(max_length=25)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "name"], name="wantedskill_user_name"),
+        ]
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class SkillIndexEntry(models.Model):
+    """
+    Inverted index from a normalized skill name to the users offering or
+    wanting it.
+
+    One row per (kind, term, user); maintained from ``Skill`` and
+    ``WantedSkill`` by ``skillzone.matching``.
+    """
+
+    KIND_OFFER = "offer"
+    KIND_WANT = "want"
+
+    KIND_CHOICES = [
+        (KIND_OFFER, "Offers"),
+        (KIND_WANT, "Wants"),
+    ]
+
+    kind = models.CharField(max_length=5, choices=KIND_CHOICES)
+    term = models.CharField(max_length=25)
+    user = models.ForeignKey(
+        User,
+        related_name="skill_index_entries",
+        on_delete=models.CASCADE,
+        db_index=False,  # covered by the (user, kind, term) index
+    )
+
+    class Meta:
+        # (kind, term) -> users for match lookups, (user, kind) -> terms to
+        # read one user's side.
+        unique_together = ("kind", "term", "user")
+        indexes = [
+            models.Index(fields=["user", "kind", "term"], name="skillindex_user_kind_term"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.user_id} {self.kind} {self.term}"
+
+
 class Barter(models.Model):
     # STATUS_PENDING = "Pending"
     # STATUS_ACCEPTED = "Accepted"
@@ -73,11 +138,13 @@ class Barter(models.Model):
         User,
         related_name="barters_sent",
         on_delete=models.CASCADE,
+        db_index=False,  # covered by the (user_from, ...) indexes
     )
     user_to = models.ForeignKey(
         User,
         related_name="barters_received",
         on_delete=models.CASCADE,
+        db_index=False,  # covered by the (user_to, ...) indexes
     )
     admin = models.ForeignKey(
         User,
@@ -90,10 +157,62 @@ class Barter(models.Model):
     completed_by_from = models.BooleanField(default=False)
     completed_by_to = models.BooleanField(default=False)  
 
+    class Meta:
+        # Each list reads one participant side in date order (scanned
+        # backwards for newest first): all of a user's barters (my_barters)
+        # or those in one status (completed_barters, navbar counters).
+        indexes = [
+            models.Index(fields=["user_from", "date_requested"], name="barter_from_date"),
+            models.Index(fields=["user_to", "date_requested"], name="barter_to_date"),
+            models.Index(
+                fields=["user_from", "status", "date_requested"],
+                name="barter_from_status_date",
+            ),
+            models.Index(
+                fields=["user_to", "status", "date_requested"],
+                name="barter_to_status_date",
+            ),
+        ]
+
     def __str__(self) -> str:
         return f"Barter #{self.pk} - {self.user_from} -> {self.user_to}"
 
 
+class BarterEvent(models.Model):
+    """
+    One status change of a barter, written in the same transaction as the
+    change itself (see ``skillzone.transitions``). Rows are never changed
+    or deleted, except together with their barter.
+    """
+
+    barter = models.ForeignKey(Barter, related_name="events", on_delete=models.CASCADE)
+    actor = models.ForeignKey(
+        User,
+        related_name="barter_events",
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+    )
+    transition = models.CharField(max_length=20)
+    from_status = models.CharField(max_length=20, blank=True)
+    to_status = models.CharField(max_length=20)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["barter", "id"]
+
+    def __str__(self) -> str:
+        return f"Barter #{self.barter_id}: {self.transition} ({self.from_status} -> {self.to_status})"
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError("Barter events are append-only.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Barter events are append-only.")
+
+
 class Feedback(models.Model):
     barter = models.ForeignKey(Barter, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -108,6 +227,21 @@ class Feedback(models.Model):
     def __str__(self) -> str:
         return f"Feedback #{self.pk} for Barter #{self.barter_id}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored rating so an update can adjust the
+        # reputation counters by the difference.
+        if "rating" in field_names:
+            instance._loaded_rating = instance.rating
+        return instance
+
+    def save(self, *args, **kwargs):
+        # The post_save handler updates the receiver's reputation counters;
+        # run both in one transaction so they can never drift apart.
+        with transaction.atomic(using=kwargs.get("using")):
+            super().save(*args, **kwargs)
+
 
 class Message(models.Model):
     """
@@ -118,6 +252,7 @@ class Message(models.Model):
         User,
         related_name="sent_messages",
         on_delete=models.CASCADE,
+        db_index=False,  # covered by the (sender, recipient, ...) indexes
     )
     recipient = models.ForeignKey(
         User,
@@ -128,5 +263,274 @@ class Message(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # One direction of a conversation in time order.
+            models.Index(
+                fields=["sender", "recipient", "created_at"],
+                name="message_pair_created",
+            ),
+            # Only unread rows, for marking a conversation read.
+            models.Index(
+                fields=["sender", "recipient"],
+                condition=models.Q(is_read=False),
+                name="message_pair_unread",
+            ),
+        ]
+
     def __str__(self) -> str:
         return f"Message from {self.sender} to {self.recipient} at {self.created_at}"
+
+
+class Thread(models.Model):
+    """
+    A conversation between two users, as seen by one of them.
+
+    Every pair of users who exchanged messages has two rows, (a, b) and
+    (b, a), each with its own unread counter, so a user's inbox is one
+    range read on the (owner, -last_activity) index. Maintained by
+    ``skillzone.threads`` when a message is created.
+    """
+
+    owner = models.ForeignKey(
+        User,
+        related_name="threads",
+        on_delete=models.CASCADE,
+        db_index=False,  # covered by the (owner, ...) indexes
+    )
+    other = models.ForeignKey(
+        User,
+        related_name="+",
+        on_delete=models.CASCADE,
+    )
+    last_message = models.ForeignKey(
+        Message,
+        related_name="+",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+    )
+    last_activity = models.DateTimeField()
+    unread_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("owner", "other")
+        indexes = [
+            models.Index(fields=["owner", "-last_activity"], name="thread_owner_activity"),
+        ]
+
+    def __str__(self) -> str:
+        return f"Thread of {self.owner} with {self.other}"
+
+
+class BarterCycle(models.Model):
+    """
+    A proposed multi-party exchange found by ``find_barter_cycles``.
+
+    Each leg's teacher offers a skill the leg's learner wants, and the
+    learner of the last leg is the teacher of the first, e.g. A teaches B,
+    B teaches C, C teaches A.
+    """
+
+    STATUS_PROPOSED = "Proposed"
+
+    STATUS_CHOICES = [
+        (STATUS_PROPOSED, "Proposed"),
+    ]
+
+    # Member ids in cycle order, rotated to start at the smallest id, so
+    # the same cycle found twice maps to the same row.
+    signature = models.CharField(max_length=100, unique=True)
+    length = models.PositiveSmallIntegerField()
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=STATUS_PROPOSED,
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return f"Cycle #{self.pk} ({self.signature})"
+
+
+class BarterCycleLeg(models.Model):
+    cycle = models.ForeignKey(
+        BarterCycle,
+        related_name="legs",
+        on_delete=models.CASCADE,
+    )
+    position = models.PositiveSmallIntegerField()
+    teacher = models.ForeignKey(
+        User,
+        related_name="cycle_legs_teaching",
+        on_delete=models.CASCADE,
+    )
+    learner = models.ForeignKey(
+        User,
+        related_name="cycle_legs_learning",
+        on_delete=models.CASCADE,
+    )
+    term = models.CharField(max_length=25)
+
+    class Meta:
+        unique_together = ("cycle", "position")
+        ordering = ["cycle", "position"]
+
+    def __str__(self) -> str:
+        return f"{self.teacher} teaches {self.learner} {self.term}"
+
+
+class CycleDiscoveryRun(models.Model):
+    """Bookkeeping for ``find_barter_cycles``; incremental runs start from the last one."""
+
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField(null=True, blank=True)
+    incremental = models.BooleanField(default=False)
+    explored_users = models.PositiveIntegerField(default=0)
+    cycles_found = models.PositiveIntegerField(default=0)
+    timed_out = models.BooleanField(default=False)
+
+    def __str__(self) -> str:
+        return f"Cycle run #{self.pk} at {self.started_at}"
+
+
+class ImportCheckpoint(models.Model):
+    """
+    Progress of ``import_users`` through one input file.
+
+    Updated in the same transaction as each imported chunk, so after a
+    failure the next run with the same file (identified by its digest)
+    carries on after the last committed row.
+    """
+
+    digest = models.CharField(max_length=64, unique=True)
+    file_name = models.CharField(max_length=255)
+    rows_done = models.PositiveIntegerField(default=0)
+    users_created = models.PositiveIntegerField(default=0)
+    skills_created = models.PositiveIntegerField(default=0)
+    rows_rejected = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self) -> str:
+        return f"Import of {self.file_name} ({self.rows_done} rows)"
+
+
+class OutgoingEmail(models.Model):
+    """
+    A message waiting in, or delivered from, the email outbox (see
+    ``skillzone.outbox``). The fully rendered MIME message is stored, so
+    delivery does not depend on the code that composed it.
+    """
+
+    STATUS_QUEUED = "queued"
+    STATUS_SENT = "sent"
+    STATUS_DEAD = "dead"
+
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_SENT, "Sent"),
+        (STATUS_DEAD, "Dead"),
+    ]
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    subject = models.CharField(max_length=255, blank=True)
+    from_email = models.CharField(max_length=255)
+    recipients = models.JSONField()
+    message = models.BinaryField()
+    attempts = models.PositiveIntegerField(default=0)
+    # Due time while queued; a worker moves it into the future while it
+    # holds the message, so a crashed worker's batch comes due again.
+    next_attempt_at = models.DateTimeField()
+    claim = models.UUIDField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="outbox_due"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.subject or '(no subject)'} to {', '.join(self.recipients)}"
+
+
+class Notification(models.Model):
+    """
+    Something that happened to a user's barters or messages, shown on the
+    notifications page and mailed in periodic digests (see
+    ``skillzone.notifications``).
+    """
+
+    KIND_BARTER_REQUEST = "barter_request"
+    KIND_BARTER_APPROVED = "barter_approved"
+    KIND_BARTER_ACCEPTED = "barter_accepted"
+    KIND_BARTER_REJECTED = "barter_rejected"
+    KIND_BARTER_CONFIRMED = "barter_confirmed"
+    KIND_BARTER_COMPLETED = "barter_completed"
+    KIND_MESSAGE = "message"
+
+    KIND_CHOICES = [
+        (KIND_BARTER_REQUEST, "New barter request"),
+        (KIND_BARTER_APPROVED, "Barter request approved"),
+        (KIND_BARTER_ACCEPTED, "Barter accepted"),
+        (KIND_BARTER_REJECTED, "Barter rejected"),
+        (KIND_BARTER_CONFIRMED, "Barter marked completed by the other side"),
+        (KIND_BARTER_COMPLETED, "Barter completed"),
+        (KIND_MESSAGE, "New message"),
+    ]
+
+    user = models.ForeignKey(
+        User,
+        related_name="notifications",
+        on_delete=models.CASCADE,
+        db_index=False,  # covered by the indexes below
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    actor = models.ForeignKey(
+        User,
+        related_name="+",
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+    )
+    barter = models.ForeignKey(Barter, on_delete=models.CASCADE, blank=True, null=True)
+    message = models.ForeignKey(Message, on_delete=models.CASCADE, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    seen_at = models.DateTimeField(blank=True, null=True)
+    digested_at = models.DateTimeField(blank=True, null=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # The notifications page, newest first.
+            models.Index(fields=["user", "id"], name="notification_user"),
+            # What the next digest has to include.
+            models.Index(
+                fields=["user", "id"],
+                name="notification_pending",
+                condition=models.Q(seen_at__isnull=True, digested_at__isnull=True),
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.get_kind_display()} for {self.user}"
+
+    def describe(self) -> str:
+        """One line for the notifications page and the digest email."""
+        actor = self.actor.username if self.actor_id else "Someone"
+        if self.kind == self.KIND_MESSAGE:
+            return f"{actor} sent you a message"
+        if self.kind == self.KIND_BARTER_REQUEST:
+            return f"{actor} sent you a barter request (#{self.barter_id})"
+        if self.kind == self.KIND_BARTER_APPROVED:
+            return f"Your barter request #{self.barter_id} was approved"
+        if self.kind == self.KIND_BARTER_CONFIRMED:
+            return f"{actor} marked barter #{self.barter_id} as completed"
+        verb = {
+            self.KIND_BARTER_ACCEPTED: "accepted",
+            self.KIND_BARTER_REJECTED: "rejected",
+            self.KIND_BARTER_COMPLETED: "completed",
+        }[self.kind]
+        return f"Barter #{self.barter_id} was {verb}"
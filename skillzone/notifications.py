@@ -0,0 +1,190 @@
+"""
+In-app notifications and periodic email digests.
+
+Barter events and messages add rows to ``Notification`` (the signals in
+``skillzone.signals`` call ``notify_barter_event``/``notify_message``);
+nothing is mailed when they happen. Users read them on the notifications
+page, a keyset-paginated list that marks what it shows as seen.
+
+``send_digests`` (run by the ``send_digests`` command) mails what users
+have not seen: one message per user, at most once per
+``NOTIFICATION_DIGEST_INTERVAL`` seconds, with messages grouped by sender.
+Users are split into chunks of ``NOTIFICATION_DIGEST_CHUNK_SIZE`` that a
+pool of threads works through, each chunk in one transaction: its pending
+rows are read (locked, skipping rows another run holds, where the database
+supports it), rendered, queued through ``EMAIL_BACKEND`` (the outbox) and
+marked digested together, so a digest is queued exactly once.
+"""
+
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connections, transaction
+from django.db.models import Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import Barter, Notification
+
+
+DIGEST_TEMPLATE = "skillzone/email/notification_digest.txt"
+
+
+def notify_barter_event(event):
+    """Notify the participants a ``BarterEvent`` concerns."""
+    barter = event.barter
+    if event.transition == "approve":
+        # Pending requests are only visible to the sender and the admins,
+        # so the receiver hears about a request once it is approved.
+        notifications = [
+            Notification(
+                user_id=barter.user_to_id, kind=Notification.KIND_BARTER_REQUEST,
+                actor_id=barter.user_from_id, barter=barter,
+            ),
+            Notification(
+                user_id=barter.user_from_id, kind=Notification.KIND_BARTER_APPROVED,
+                actor_id=event.actor_id, barter=barter,
+            ),
+        ]
+    elif event.transition in ("accept", "reject"):
+        kind = {
+            "accept": Notification.KIND_BARTER_ACCEPTED,
+            "reject": Notification.KIND_BARTER_REJECTED,
+        }[event.transition]
+        notifications = [
+            Notification(user_id=barter.user_from_id, kind=kind, actor_id=event.actor_id, barter=barter)
+        ]
+    elif event.transition.startswith("complete"):
+        # The other side is told; once both have confirmed, the barter is
+        # completed.
+        if event.to_status == Barter.STATUS_COMPLETED:
+            kind = Notification.KIND_BARTER_COMPLETED
+        else:
+            kind = Notification.KIND_BARTER_CONFIRMED
+        notifications = [
+            Notification(user_id=user_id, kind=kind, actor_id=event.actor_id, barter=barter)
+            for user_id in (barter.user_from_id, barter.user_to_id)
+            if user_id != event.actor_id
+        ]
+    else:
+        # "request": the barter is pending, see above.
+        return
+    Notification.objects.bulk_create(notifications)
+
+
+def notify_message(message):
+    Notification.objects.create(
+        user_id=message.recipient_id,
+        kind=Notification.KIND_MESSAGE,
+        actor_id=message.sender_id,
+        message=message,
+    )
+
+
+def mark_seen(notifications):
+    """Mark the unseen rows among ``notifications`` as seen."""
+    ids = [n.pk for n in notifications if n.seen_at is None]
+    if ids:
+        Notification.objects.filter(pk__in=ids, seen_at__isnull=True).update(seen_at=timezone.now())
+
+
+def pending_notifications():
+    """Notifications the next digest has to include."""
+    # A message read in its conversation needs no reminder.
+    return Notification.objects.filter(
+        Q(message__isnull=True) | Q(message__is_read=False),
+        seen_at__isnull=True,
+        digested_at__isnull=True,
+    )
+
+
+def users_due(now=None):
+    """Ids of users with pending notifications and no digest within the interval."""
+    now = now or timezone.now()
+    cutoff = now - timedelta(seconds=settings.NOTIFICATION_DIGEST_INTERVAL)
+    recent = Notification.objects.filter(digested_at__gt=cutoff).values("user_id")
+    return list(
+        pending_notifications()
+        .exclude(user_id__in=recent)
+        .order_by("user_id")
+        .values_list("user_id", flat=True)
+        .distinct()
+    )
+
+
+def build_digest(user, notifications):
+    """Render the digest of ``notifications`` (oldest first) for ``user``."""
+    senders = defaultdict(int)
+    barters = []
+    for notification in notifications:
+        if notification.kind == Notification.KIND_MESSAGE:
+            senders[notification.actor] += 1
+        else:
+            barters.append(notification)
+    body = render_to_string(DIGEST_TEMPLATE, {
+        "user": user,
+        "senders": sorted(senders.items(), key=lambda item: item[0].username),
+        "barters": barters,
+    })
+    count = len(notifications)
+    return EmailMessage(
+        subject=f"You have {count} new notification{'s' if count != 1 else ''} on Skill Barter Zone",
+        body=body,
+        to=[user.email],
+    )
+
+
+def queue_digests(user_ids, now=None):
+    """Queue the digests of ``user_ids``; returns how many were queued."""
+    now = now or timezone.now()
+    with transaction.atomic():
+        rows = list(
+            pending_notifications()
+            .filter(user_id__in=user_ids)
+            .select_for_update(skip_locked=True, of=("self",))
+            .select_related("user", "actor", "barter")
+            .order_by("user_id", "id")
+        )
+        by_user = defaultdict(list)
+        for notification in rows:
+            by_user[notification.user].append(notification)
+        digests = [
+            build_digest(user, notifications)
+            for user, notifications in by_user.items()
+            if user.email
+        ]
+        if digests:
+            get_connection().send_messages(digests)
+        # Users without an address are marked too, or they would be picked
+        # up again on every run.
+        Notification.objects.filter(pk__in=[n.pk for n in rows]).update(digested_at=now)
+    return len(digests)
+
+
+def _queue_in_thread(user_ids, now):
+    try:
+        return queue_digests(user_ids, now)
+    finally:
+        # Pool threads would keep their connections open otherwise.
+        connections.close_all()
+
+
+def send_digests(workers=None, chunk_size=None):
+    """
+    Queue a digest for every user that is due one. Returns the number of
+    users due and of digests queued.
+    """
+    workers = workers or settings.NOTIFICATION_DIGEST_WORKERS
+    chunk_size = chunk_size or settings.NOTIFICATION_DIGEST_CHUNK_SIZE
+    now = timezone.now()
+    user_ids = users_due(now)
+    chunks = [user_ids[i:i + chunk_size] for i in range(0, len(user_ids), chunk_size)]
+    if workers <= 1 or len(chunks) <= 1:
+        queued = sum(queue_digests(chunk, now) for chunk in chunks)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            queued = sum(pool.map(lambda chunk: _queue_in_thread(chunk, now), chunks))
+    return {"users": len(user_ids), "queued": queued}
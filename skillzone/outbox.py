@@ -0,0 +1,183 @@
+"""
+Email outbox.
+
+``OutboxEmailBackend`` is the ``EMAIL_BACKEND``: sending mail from a view
+(password resets, digests) only renders the message and inserts it into
+the ``OutgoingEmail`` table, inside the request's transaction, so a slow
+or unreachable SMTP server never holds up a worker and mail for a
+rolled-back request is never sent.
+
+The ``deliver_email`` command runs ``deliver_outbox``: it claims a batch
+of due messages with a conditional update (several workers can run side
+by side), sends them over one connection of ``OUTBOX_DELIVERY_BACKEND``
+(SMTP with the ``EMAIL_*`` settings), and records the outcome. Temporary
+failures are retried with exponential backoff; a message refused
+permanently (5xx), or still failing after ``OUTBOX_MAX_ATTEMPTS``, is
+marked dead and left for an admin to look at.
+
+With Django's SMTP backend the stored bytes go straight to
+``sendmail``, and the SMTP reply codes tell temporary failures from
+permanent ones. Any other backend (console, locmem, a vendor API) gets
+each message through ``send_messages`` as a ``StoredEmail``; whatever it
+raises is retried.
+"""
+
+import smtplib
+import uuid
+from datetime import timedelta
+from email import message_from_bytes
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.mail.message import sanitize_address
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+
+# How long a worker may hold a claimed batch before others may take it.
+CLAIM_SECONDS = 10 * 60
+
+# Longest wait between two attempts.
+MAX_RETRY_DELAY = 6 * 60 * 60
+
+
+class OutboxEmailBackend(BaseEmailBackend):
+    """Queue messages in the outbox instead of sending them."""
+
+    def send_messages(self, email_messages):
+        now = timezone.now()
+        rows = []
+        for message in email_messages:
+            recipients = message.recipients()
+            if not recipients:
+                continue
+            encoding = message.encoding or settings.DEFAULT_CHARSET
+            rows.append(OutgoingEmail(
+                subject=str(message.subject)[:255],
+                from_email=sanitize_address(message.from_email, encoding),
+                recipients=[sanitize_address(address, encoding) for address in recipients],
+                message=message.message().as_bytes(linesep="\r\n"),
+                next_attempt_at=now,
+            ))
+        OutgoingEmail.objects.bulk_create(rows)
+        return len(rows)
+
+
+class StoredEmail(EmailMessage):
+    """An outbox row, for backends that send ``EmailMessage`` objects."""
+
+    def __init__(self, email):
+        super().__init__(subject=email.subject, from_email=email.from_email, to=email.recipients)
+        self.raw = bytes(email.message)
+
+    def message(self):
+        # The message as it was rendered when queued.
+        return message_from_bytes(self.raw)
+
+
+def retry_delay(attempts):
+    """Seconds to wait after the ``attempts``-th failed attempt."""
+    return min(settings.OUTBOX_RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+
+def claim_batch(batch_size):
+    """Take up to ``batch_size`` due messages for this worker."""
+    now = timezone.now()
+    due = OutgoingEmail.objects.filter(status=OutgoingEmail.STATUS_QUEUED, next_attempt_at__lte=now)
+    ids = list(due.order_by("next_attempt_at").values_list("pk", flat=True)[:batch_size])
+    if not ids:
+        return []
+    token = uuid.uuid4()
+    # Only rows still due are taken, so two workers never share one.
+    due.filter(pk__in=ids).update(
+        claim=token, next_attempt_at=now + timedelta(seconds=CLAIM_SECONDS)
+    )
+    return list(OutgoingEmail.objects.filter(pk__in=ids, claim=token).order_by("pk"))
+
+
+def _failed(email, error, permanent=False):
+    attempts = email.attempts + 1
+    dead = permanent or attempts >= settings.OUTBOX_MAX_ATTEMPTS
+    OutgoingEmail.objects.filter(pk=email.pk, claim=email.claim).update(
+        status=OutgoingEmail.STATUS_DEAD if dead else OutgoingEmail.STATUS_QUEUED,
+        attempts=F("attempts") + 1,
+        next_attempt_at=timezone.now() + timedelta(seconds=retry_delay(attempts)),
+        last_error=str(error)[:1000],
+        claim=None,
+    )
+    return dead
+
+
+def _release(emails):
+    """Give back messages that were claimed but not attempted."""
+    for email in emails:
+        OutgoingEmail.objects.filter(pk=email.pk, claim=email.claim).update(
+            next_attempt_at=timezone.now(), claim=None
+        )
+
+
+def deliver_outbox(batch_size=None):
+    """
+    Deliver one batch over a single connection. Returns a dict counting the
+    messages ``sent``, ``retried`` and ``dead``.
+    """
+    counts = {"sent": 0, "retried": 0, "dead": 0}
+    batch = claim_batch(batch_size or settings.OUTBOX_BATCH_SIZE)
+    if not batch:
+        return counts
+
+    backend = get_connection(settings.OUTBOX_DELIVERY_BACKEND, fail_silently=False)
+    try:
+        backend.open()
+    except OSError as e:  # includes every SMTPException
+        for email in batch:
+            counts["dead" if _failed(email, e) else "retried"] += 1
+        return counts
+
+    smtp = isinstance(getattr(backend, "connection", None), smtplib.SMTP)
+    try:
+        for position, email in enumerate(batch):
+            try:
+                if smtp:
+                    refused = backend.connection.sendmail(
+                        email.from_email, email.recipients, bytes(email.message)
+                    )
+                else:
+                    backend.send_messages([StoredEmail(email)])
+                    refused = {}
+            except smtplib.SMTPRecipientsRefused as e:
+                permanent = all(code >= 500 for code, _ in e.recipients.values())
+                counts["dead" if _failed(email, e.recipients, permanent) else "retried"] += 1
+            except smtplib.SMTPResponseException as e:
+                counts["dead" if _failed(email, e, e.smtp_code >= 500) else "retried"] += 1
+                try:
+                    if smtp:
+                        backend.connection.rset()
+                except smtplib.SMTPException:
+                    pass
+            except OSError as e:
+                # SMTPServerDisconnected and socket errors: the connection is
+                # gone. Count this attempt and leave the rest for later.
+                counts["dead" if _failed(email, e) else "retried"] += 1
+                _release(batch[position + 1:])
+                break
+            except Exception as e:
+                # Another backend's own error: nothing tells whether it is
+                # permanent, so retry until OUTBOX_MAX_ATTEMPTS.
+                counts["dead" if _failed(email, e) else "retried"] += 1
+            else:
+                OutgoingEmail.objects.filter(pk=email.pk, claim=email.claim).update(
+                    status=OutgoingEmail.STATUS_SENT,
+                    attempts=F("attempts") + 1,
+                    sent_at=timezone.now(),
+                    # Accepted for some recipients only.
+                    last_error=str(refused) if refused else "",
+                    claim=None,
+                )
+                counts["sent"] += 1
+    finally:
+        backend.close()
+    return counts
@@ -0,0 +1,229 @@
+"""
+Keyset (cursor) pagination shared by the list views.
+
+Pages are addressed by an opaque cursor holding the ordering key of the
+row at the page boundary, e.g. ``(date_requested, id)``. Fetching a page is
+a ``WHERE (key) < (cursor) ORDER BY key LIMIT n + 1`` range read, so the
+cost does not grow with the page number: no ``COUNT(*)`` and no ``OFFSET``.
+The extra row tells us whether there is a following page.
+"""
+
+import base64
+import binascii
+import datetime
+import functools
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+
+DEFAULT_PAGE_SIZE = 20
+
+CURSOR_PARAM = "cursor"
+
+
+def get_page_size(per_page=None):
+    """Page size for a view: explicit value, then settings, then default."""
+    if per_page:
+        return per_page
+    return getattr(settings, "PAGINATE_BY", DEFAULT_PAGE_SIZE)
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """
+    JSON encoder for cursor keys.
+
+    ``DjangoJSONEncoder`` rounds datetimes to milliseconds, which would make
+    rows created within the same millisecond fall between two pages.
+    """
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(direction, key):
+    payload = json.dumps([direction, list(key)], cls=CursorEncoder)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Return ``(direction, key)`` for a cursor string, or ``(None, None)``
+    when it is missing or malformed (which just shows the first page).
+    """
+    if not cursor:
+        return None, None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        direction, key = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError, binascii.Error):
+        return None, None
+    if direction not in ("next", "prev") or not isinstance(key, list):
+        return None, None
+    return direction, key
+
+
+class KeysetPage:
+    """
+    One page of results plus the cursors of its neighbours.
+
+    Iterating the page yields the rows; ``next_url`` and ``previous_url``
+    are query strings (``?...``) that keep the other GET parameters of the
+    current request, ready to drop into an ``href``.
+    """
+
+    def __init__(self, request, object_list, keys, has_next, has_previous):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_url = None
+        self.previous_url = None
+        if not keys:
+            self.has_next = self.has_previous = False
+            return
+        if has_next:
+            self.next_url = self._url(request, encode_cursor("next", keys[-1]))
+        if has_previous:
+            self.previous_url = self._url(request, encode_cursor("prev", keys[0]))
+
+    @staticmethod
+    def _url(request, cursor):
+        params = request.GET.copy()
+        params[CURSOR_PARAM] = cursor
+        return "?" + params.urlencode()
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+
+def build_page(request, rows, keys, per_page, direction):
+    """
+    Turn ``per_page + 1`` fetched rows into a ``KeysetPage``.
+
+    ``rows`` and ``keys`` are parallel lists in fetch order. For a
+    ``"prev"`` fetch that order is reversed, so it is flipped back here.
+    """
+    has_more = len(rows) > per_page
+    rows, keys = rows[:per_page], keys[:per_page]
+    if direction == "prev":
+        rows.reverse()
+        keys.reverse()
+        return KeysetPage(request, rows, keys, has_next=True, has_previous=has_more)
+    return KeysetPage(
+        request, rows, keys, has_next=has_more, has_previous=direction == "next"
+    )
+
+
+def _parse_ordering(queryset, ordering):
+    fields = []
+    for name in ordering:
+        descending = name.startswith("-")
+        field = queryset.model._meta.get_field(name.lstrip("-"))
+        fields.append((field, descending))
+    return fields
+
+
+def _seek_filter(fields, values, forward):
+    """
+    Build ``(a, b, c) > (x, y, z)`` style row comparison as a Q object,
+    honouring the direction of each ordering field.
+    """
+    condition = Q()
+    for i, (field, descending) in enumerate(fields):
+        # "after" on a descending field means smaller values.
+        lookup = "lt" if descending == forward else "gt"
+        clause = Q(**{f"{field.attname}__{lookup}": values[i]})
+        for j in range(i):
+            clause &= Q(**{fields[j][0].attname: values[j]})
+        condition |= clause
+    return condition
+
+
+def _decode_values(request, fields):
+    direction, raw_key = decode_cursor(request.GET.get(CURSOR_PARAM))
+    if raw_key is None or len(raw_key) != len(fields):
+        return None, None
+    try:
+        return direction, [f.to_python(v) for (f, _), v in zip(fields, raw_key)]
+    except (ValidationError, TypeError, ValueError):
+        # to_python() lets TypeError through for values of the wrong type
+        # (a dict or a number where a datetime string belongs).
+        return None, None
+
+
+def _fetch(queryset, fields, ordering, direction, values, limit):
+    """Rows of one queryset after (or before) the cursor, in fetch order."""
+    if direction == "prev":
+        reverse = [o[1:] if o.startswith("-") else "-" + o for o in ordering]
+        queryset = queryset.filter(_seek_filter(fields, values, forward=False))
+        queryset = queryset.order_by(*reverse)
+    else:
+        if direction == "next":
+            queryset = queryset.filter(_seek_filter(fields, values, forward=True))
+        queryset = queryset.order_by(*ordering)
+    return list(queryset[:limit])
+
+
+def paginate_keyset(request, queryset, ordering, per_page=None):
+    """
+    Return a ``KeysetPage`` of ``queryset`` ordered by ``ordering``.
+
+    ``ordering`` must end with a unique field (normally ``"id"`` or
+    ``"-id"``) so that every row has a distinct position.
+    """
+    per_page = get_page_size(per_page)
+    fields = _parse_ordering(queryset, ordering)
+    direction, values = _decode_values(request, fields)
+
+    rows = _fetch(queryset, fields, ordering, direction, values, per_page + 1)
+    keys = [[getattr(row, f.attname) for f, _ in fields] for row in rows]
+    return build_page(request, rows, keys, per_page, direction)
+
+
+def paginate_keyset_union(request, querysets, ordering, per_page=None):
+    """
+    Like ``paginate_keyset`` for the union of several querysets of one model.
+
+    A filter such as ``Q(user_from=u) | Q(user_to=u)`` cannot be read in
+    order from any single index, so the database sorts every matching row
+    before applying the LIMIT. Passing each side as its own queryset lets
+    each one be a short index range read; the pages are merged here.
+    """
+    per_page = get_page_size(per_page)
+    fields = _parse_ordering(querysets[0], ordering)
+    direction, values = _decode_values(request, fields)
+
+    merged = {}
+    for queryset in querysets:
+        for row in _fetch(queryset, fields, ordering, direction, values, per_page + 1):
+            merged[row.pk] = row
+
+    def compare(a, b):
+        # Fetch order: ``ordering``, or its reverse for a "prev" page.
+        for field, descending in fields:
+            x, y = getattr(a, field.attname), getattr(b, field.attname)
+            if x != y:
+                first = (x < y) != descending
+                if direction == "prev":
+                    first = not first
+                return -1 if first else 1
+        return 0
+
+    rows = sorted(merged.values(), key=functools.cmp_to_key(compare))[: per_page + 1]
+    keys = [[getattr(row, f.attname) for f, _ in fields] for row in rows]
+    return build_page(request, rows, keys, per_page, direction)
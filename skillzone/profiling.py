@@ -0,0 +1,187 @@
+"""
+Sampled per-request profiling.
+
+``ProfilingMiddleware`` profiles a random ``PROFILING_SAMPLE_RATE`` share
+of requests. For those it records
+
+* every SQL statement, through ``connection.execute_wrapper`` on each
+  database alias: count, time, and the statement's shape (its SQL with
+  ``IN (%s, %s, ...)`` lists collapsed), so that an N+1 loop shows up as
+  one shape run many times;
+* the time spent rendering templates (outermost ``Template.render`` calls
+  only, so includes are not counted twice);
+* the total time of the view and the middleware below this one.
+
+The numbers go back in a ``Server-Timing`` header, which browser
+developer tools display next to the request, labelled with the URL name
+(``skillzone:my_barters``). Sampled requests slower than
+``PROFILING_SLOW_MS`` are also written as one JSON line, with their most
+repeated SQL shapes, to the ``skillzone.profiling`` logger (a rotating
+file, see ``LOGGING``).
+
+A request that is not sampled costs one random number, so the middleware
+can stay on in production; ``PROFILING_SAMPLE_RATE = 0`` removes it.
+"""
+
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Template
+
+
+logger = logging.getLogger("skillzone.profiling")
+
+# Repeated SQL shapes written with a slow request.
+TOP_SHAPES = 5
+
+_IN_LIST = re.compile(r"\bIN \(\s*%s(?:\s*,\s*%s)*\s*\)")
+
+# The profile of the request being served, if it was sampled.
+_profile = ContextVar("skillzone_profile", default=None)
+
+
+def sql_shape(sql):
+    """``sql`` with ``IN`` lists of any length written as ``IN (...)``."""
+    return _IN_LIST.sub("IN (...)", sql)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.total_ms = 0.0
+        self.queries = 0
+        self.sql_ms = 0.0
+        self.shapes = Counter()
+        self.shape_ms = defaultdict(float)
+        self.template_ms = 0.0
+        self.template_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        # The execute_wrapper.
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            shape = sql_shape(sql)
+            self.queries += 1
+            self.sql_ms += elapsed
+            self.shapes[shape] += 1
+            self.shape_ms[shape] += elapsed
+
+    def finish(self):
+        self.total_ms = (time.perf_counter() - self.start) * 1000
+
+    def server_timing(self, view_name):
+        return ", ".join([
+            f'db;dur={self.sql_ms:.1f};desc="{self.queries} queries"',
+            f"tpl;dur={self.template_ms:.1f}",
+            f'view;dur={self.total_ms:.1f};desc="{view_name}"',
+        ])
+
+    def record(self, request, response, view_name):
+        repeated = [
+            {"sql": shape, "count": count, "ms": round(self.shape_ms[shape], 2)}
+            for shape, count in self.shapes.most_common(TOP_SHAPES)
+            if count > 1
+        ]
+        return {
+            "view": view_name,
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "total_ms": round(self.total_ms, 2),
+            "sql_ms": round(self.sql_ms, 2),
+            "queries": self.queries,
+            "template_ms": round(self.template_ms, 2),
+            "repeated_sql": repeated,
+        }
+
+
+_render = Template.render
+
+
+def _profiled_render(self, context):
+    profile = _profile.get()
+    if profile is None:
+        return _render(self, context)
+    profile.template_depth += 1
+    start = time.perf_counter()
+    try:
+        return _render(self, context)
+    finally:
+        profile.template_depth -= 1
+        if not profile.template_depth:
+            profile.template_ms += (time.perf_counter() - start) * 1000
+
+
+class ProfilingMiddleware:
+    """
+    Profile sampled requests (see the module docstring). Put it first, so
+    that the time of every other middleware is included.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_SAMPLE_RATE:
+            raise MiddlewareNotUsed
+        Template.render = _profiled_render
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def sampled(self, request):
+        return random.random() < settings.PROFILING_SAMPLE_RATE
+
+    def begin(self):
+        profile = RequestProfile()
+        stack = ExitStack()
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(profile))
+        return profile, stack, _profile.set(profile)
+
+    def finish(self, request, response, profile):
+        profile.finish()
+        match = request.resolver_match
+        view_name = match.view_name if match else "unresolved"
+        if settings.PROFILING_SERVER_TIMING:
+            response["Server-Timing"] = profile.server_timing(view_name)
+        if profile.total_ms >= settings.PROFILING_SLOW_MS:
+            logger.warning(json.dumps(profile.record(request, response, view_name)))
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled(request):
+            return self.get_response(request)
+        profile, stack, token = self.begin()
+        try:
+            with stack:
+                response = self.get_response(request)
+        finally:
+            _profile.reset(token)
+        return self.finish(request, response, profile)
+
+    async def __acall__(self, request):
+        if not self.sampled(request):
+            return await self.get_response(request)
+        profile, stack, token = self.begin()
+        try:
+            with stack:
+                response = await self.get_response(request)
+        finally:
+            _profile.reset(token)
+        return self.finish(request, response, profile)
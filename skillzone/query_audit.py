@@ -0,0 +1,194 @@
+"""
+Query plan audit for the URLconf views.
+
+``audit_views`` requests every (non-admin) URL as a seeded user, captures
+the SQL each view runs, and asks the database for the plan of every
+SELECT. A plan is reported when it:
+
+* scans a whole table or index without a ``LIMIT`` (a range read on an
+  index, or a scan that stops after a page of rows, is fine), or
+* sorts or groups through a temporary B-tree (``USE TEMP B-TREE``), i.e.
+  no index delivers the rows in the requested order. Full-text queries are
+  exempt: ranking by relevance always sorts the matches.
+
+SQLite is supported; on PostgreSQL ``Seq Scan`` and ``Sort`` nodes are
+reported instead.
+"""
+
+import re
+from urllib.parse import urlsplit
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import NoReverseMatch, URLPattern, URLResolver, get_resolver, reverse
+
+from .models import Barter, Message, Skill, WantedSkill
+from .pagination import KeysetPage
+
+
+# URLs that are not views of this project (or need a token we cannot make).
+SKIPPED_NAMESPACES = ("admin",)
+
+# Extra query strings requested besides the bare URL.
+EXTRA_QUERY_STRINGS = {
+    "skillzone:home": ["q=python", "q=py"],
+}
+
+_LIMIT_RE = re.compile(r"\bLIMIT\b", re.IGNORECASE)
+
+
+class PlanProblem:
+    def __init__(self, url, sql, plan, reasons):
+        self.url = url
+        self.sql = sql
+        self.plan = plan
+        self.reasons = reasons
+
+    def __str__(self):
+        plan = "\n".join(f"    {line}" for line in self.plan)
+        return f"{self.url}: {', '.join(self.reasons)}\n  {self.sql}\n{plan}"
+
+
+def explain(sql):
+    """Return the plan of ``sql`` as a list of lines."""
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute("EXPLAIN QUERY PLAN " + sql)
+            return [row[-1] for row in cursor.fetchall()]
+        cursor.execute("EXPLAIN " + sql)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def plan_problems(sql, plan):
+    """Reasons why ``plan`` is not acceptable (an empty list if it is)."""
+    reasons = []
+    limited = bool(_LIMIT_RE.search(sql))
+    ranked = any("VIRTUAL TABLE" in line for line in plan)
+    for line in plan:
+        detail = line.strip()
+        if connection.vendor == "sqlite":
+            if "USE TEMP B-TREE" in detail:
+                if not ranked:
+                    reasons.append(detail.lower())
+            elif detail.startswith("SCAN ") and "VIRTUAL TABLE" not in detail:
+                if not limited:
+                    reasons.append(f"full {detail.lower()}")
+        else:
+            if "Seq Scan" in detail and not limited:
+                reasons.append(detail.lstrip("-> ").split("  ")[0])
+            elif re.match(r"(->\s*)?Sort\b", detail):
+                reasons.append("sort")
+    return reasons
+
+
+def _iter_patterns(patterns, prefix=""):
+    for entry in patterns:
+        if isinstance(entry, URLResolver):
+            namespace = entry.namespace
+            if namespace in SKIPPED_NAMESPACES:
+                continue
+            nested = f"{prefix}{namespace}:" if namespace else prefix
+            yield from _iter_patterns(entry.url_patterns, nested)
+        elif isinstance(entry, URLPattern) and entry.name:
+            yield prefix + entry.name, list(entry.pattern.converters)
+
+
+def sample_kwargs(user):
+    """
+    Values for URL parameters, taken from ``user``'s own data so that the
+    views render real pages rather than 404s.
+    """
+    partner = (
+        Message.objects.filter(recipient=user).values_list("sender_id", flat=True).first()
+        or User.objects.exclude(pk=user.pk).values_list("pk", flat=True).first()
+    )
+    other_skill = Skill.objects.filter(user_id=partner).first()
+    barter = Barter.objects.filter(
+        user_from=user, status=Barter.STATUS_COMPLETED
+    ).first() or Barter.objects.filter(user_from=user).first()
+    wanted = WantedSkill.objects.filter(user=user).first()
+    values = {
+        "user_id": partner,
+        "user_to_id": partner,
+        "skill_id": other_skill.pk if other_skill else None,
+        "barter_id": barter.pk if barter else None,
+        "wanted_id": wanted.pk if wanted else None,
+        "new_status": Barter.STATUS_COMPLETED,
+    }
+    return {key: value for key, value in values.items() if value is not None}
+
+
+def view_urls(user):
+    """
+    ``(urls, skipped)``: ``(name, url)`` for every view we can fill the
+    parameters of from ``user``'s data (plus ``EXTRA_QUERY_STRINGS``), and
+    the names of the others.
+    """
+    values = sample_kwargs(user)
+    skipped = []
+    urls = []
+    for name, params in _iter_patterns(get_resolver().url_patterns):
+        if any(param not in values for param in params):
+            skipped.append(name)
+            continue
+        try:
+            url = reverse(name, kwargs={p: values[p] for p in params})
+        except NoReverseMatch:
+            skipped.append(name)
+            continue
+        urls.append((name, url))
+        urls.extend((name, f"{url}?{qs}") for qs in EXTRA_QUERY_STRINGS.get(name, ()))
+    return urls, skipped
+
+
+def _next_pages(response):
+    """URLs of the following pages of any keyset-paginated list rendered."""
+    for context in response.context or ():
+        for value in context.flatten().values():
+            if isinstance(value, KeysetPage) and value.next_url:
+                yield urlsplit(response.request["PATH_INFO"]).path + value.next_url
+
+
+def audit_views(user, follow_pages=True):
+    """
+    Request every view as ``user`` and return ``(report, problems, skipped)``.
+
+    ``report`` maps each URL to its status code and the ``(sql, plan)`` of
+    every SELECT it ran, ``problems`` lists a ``PlanProblem`` for every
+    distinct bad plan and ``skipped`` names the URLs whose parameters we
+    cannot fill.
+    """
+    client = Client()
+    client.force_login(user)
+    urls, skipped = view_urls(user)
+    report = {}
+    problems = []
+    plans = {}
+
+    queue = [url for _, url in urls]
+    visited = set()
+    while queue:
+        url = queue.pop(0)
+        if url in visited:
+            continue
+        visited.add(url)
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(url)
+        if follow_pages and response.status_code == 200 and "cursor=" not in url:
+            queue.extend(_next_pages(response))
+
+        selects = [
+            q["sql"] for q in ctx.captured_queries
+            if q["sql"].lstrip().upper().startswith("SELECT")
+        ]
+        for sql in selects:
+            if sql in plans:
+                continue
+            plans[sql] = explain(sql)
+            reasons = plan_problems(sql, plans[sql])
+            if reasons:
+                problems.append(PlanProblem(url, sql, plans[sql], reasons))
+        report[url] = (response.status_code, [(sql, plans[sql]) for sql in selects])
+    return report, problems, skipped
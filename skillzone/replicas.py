@@ -0,0 +1,136 @@
+"""
+Read replicas with read-your-writes.
+
+``ReplicaRouter`` sends every write to the primary (``default``) and, while
+a request is being served, reads to a randomly chosen alias of
+``REPLICA_DATABASES``. Replicas lag behind the primary, so a user who just
+sent a message must not read from one for a while:
+
+* ``PrimaryPinningMiddleware`` notes every write the router sees during a
+  request and then sets a short-lived cookie; requests carrying it read
+  from the primary for ``REPLICA_PIN_SECONDS``.
+* Unsafe methods (POST and so on) and anything inside ``atomic()`` read
+  from the primary too.
+* Code outside a request (commands, signals run from them, background
+  threads) always uses the primary.
+
+Replicas are database aliases like any other. With SQLite they can be
+plain file copies of the primary: ``copy_to_replica`` (run by the
+``sync_replicas`` command) refreshes one, and the time between two runs
+is the replication lag. Nothing changes while ``REPLICA_DATABASES`` is
+empty.
+"""
+
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+PIN_COOKIE = "pin_primary"
+
+UNSAFE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+
+class _RequestState:
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.wrote = False
+
+
+# Set by the middleware for the duration of a request. A mutable object,
+# so that writes made in a thread running a sync view are seen too.
+_state = ContextVar("skillzone_replica_state", default=None)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        replicas = settings.REPLICA_DATABASES
+        if not replicas or state is None or state.pinned or state.wrote:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every alias holds the same data.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Replicas get their schema from the primary.
+        if db in settings.REPLICA_DATABASES:
+            return False
+        return None
+
+
+class PrimaryPinningMiddleware:
+    """
+    Track writes and pin the client to the primary afterwards (see the
+    module docstring). Put it before ``SessionMiddleware``, so that session
+    reads are routed too. Not used without replicas.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REPLICA_DATABASES:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def begin(self, request):
+        pinned = request.method in UNSAFE_METHODS or PIN_COOKIE in request.COOKIES
+        return _RequestState(pinned)
+
+    def finish(self, state, response):
+        if state.wrote:
+            response.set_cookie(
+                PIN_COOKIE,
+                "1",
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self.begin(request)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(state, response)
+
+    async def __acall__(self, request):
+        state = self.begin(request)
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(state, response)
+
+
+def copy_to_replica(alias):
+    """Overwrite the SQLite replica ``alias`` with a snapshot of the primary."""
+    primary, replica = connections[DEFAULT_DB_ALIAS], connections[alias]
+    if primary.vendor != "sqlite" or replica.vendor != "sqlite":
+        raise ValueError("Only SQLite replicas can be copied.")
+    primary.ensure_connection()
+    replica.ensure_connection()
+    primary.connection.backup(replica.connection)
@@ -0,0 +1,52 @@
+"""
+Denormalised reputation counters.
+
+``ProfileModel.rating_count`` and ``ProfileModel.rating_sum`` hold the
+number and total of the feedback ratings left on barters the user
+received, so profile pages can show the average without aggregating the
+whole feedback table. The counters are adjusted in place with ``F()``
+expressions by the feedback signals in ``skillzone.signals``.
+"""
+
+from django.db.models import Count, F, Subquery, Sum
+
+from users.models import ProfileModel
+from .models import Barter, Feedback
+
+
+def adjust_reputation(barter_id, count_delta, sum_delta):
+    """Add the deltas to the profile of the user who received ``barter_id``."""
+    if not count_delta and not sum_delta:
+        return
+    receiver = Barter.objects.filter(pk=barter_id).values("user_to_id")[:1]
+    ProfileModel.objects.filter(user_id=Subquery(receiver)).update(
+        rating_count=F("rating_count") + count_delta,
+        rating_sum=F("rating_sum") + sum_delta,
+    )
+
+
+def reconcile_profiles(profiles):
+    """
+    Recompute the counters of ``profiles`` from the feedback table.
+
+    Returns the profiles whose stored values were wrong, already corrected
+    in memory; the caller decides whether to save them.
+    """
+    by_user = {p.user_id: p for p in profiles}
+    totals = {
+        row["barter__user_to_id"]: (row["count"], row["total"])
+        for row in Feedback.objects.filter(barter__user_to_id__in=by_user)
+        .values("barter__user_to_id")
+        .annotate(count=Count("id"), total=Sum("rating"))
+        .order_by()
+    }
+
+    stale = []
+    for user_id, profile in by_user.items():
+        count, total = totals.get(user_id, (0, 0))
+        total = total or 0
+        if profile.rating_count != count or profile.rating_sum != total:
+            profile.rating_count = count
+            profile.rating_sum = total
+            stale.append(profile)
+    return stale
@@ -0,0 +1,270 @@
+"""
+Full-text search over skills.
+
+The home dashboard used to OR four ``icontains`` filters across the skill,
+user and profile tables, which degrades into LIKE '%q%' table scans. Search
+now goes through a backend that keeps a dedicated index of every skill
+(name, description, owner username and owner full name) and returns skill
+ids ordered by relevance.
+
+``SQLiteFTSBackend`` stores the index in an FTS5 virtual table and ranks
+with bm25. ``ORMSearchBackend`` is the portable fallback used on other
+databases. A different backend can be plugged in with the
+``SKILL_SEARCH_BACKEND`` setting (dotted path to a class).
+"""
+
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.dispatch import receiver
+from django.test.signals import setting_changed
+from django.utils.module_loading import import_string
+
+from .models import Skill
+from .pagination import CURSOR_PARAM, build_page, decode_cursor, get_page_size
+
+
+SEARCH_TABLE = "skillzone_skill_search"
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(query):
+    """Split a raw search string into lower-cased word tokens."""
+    return [token.lower() for token in _TOKEN_RE.findall(query or "")]
+
+
+class BaseSearchBackend:
+    """
+    Interface every search backend implements.
+
+    ``search`` returns ``(skill_id, sort_key)`` pairs, best match first.
+    ``sort_key`` is a JSON-serialisable list that positions the hit in the
+    ranking; passing it back as ``after`` (or ``before``) returns the hits
+    that follow (or precede) it, which is what keyset pagination needs.
+    ``before`` results come back in reverse ranking order.
+
+    The indexing hooks are called by ``skillzone.signals`` whenever a
+    ``Skill``, ``User`` or ``ProfileModel`` row changes.
+    """
+
+    def search(self, query, limit, after=None, before=None):
+        raise NotImplementedError
+
+    def index_skills(self, skill_ids):
+        pass
+
+    def remove_skills(self, skill_ids):
+        pass
+
+    def index_user(self, user_id):
+        pass
+
+    def rebuild(self, chunk_size=1000):
+        return 0
+
+
+class ORMSearchBackend(BaseSearchBackend):
+    """
+    Portable fallback that filters with ``icontains``.
+
+    There is no separate index to maintain; results that match the skill
+    name are ranked before the rest.
+    """
+
+    def search(self, query, limit, after=None, before=None):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        condition = Q()
+        for token in tokens:
+            condition &= (
+                Q(name__icontains=token)
+                | Q(description__icontains=token)
+                | Q(user__username__icontains=token)
+                | Q(user__profilemodel__full_name__icontains=token)
+            )
+
+        qs = Skill.objects.filter(condition).annotate(
+            name_hit=Case(
+                When(name__icontains=tokens[0], then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField(),
+            )
+        )
+        if after is not None:
+            hit, pk = after
+            qs = qs.filter(Q(name_hit__gt=hit) | Q(name_hit=hit, id__gt=pk))
+            qs = qs.order_by("name_hit", "id")
+        elif before is not None:
+            hit, pk = before
+            qs = qs.filter(Q(name_hit__lt=hit) | Q(name_hit=hit, id__lt=pk))
+            qs = qs.order_by("-name_hit", "-id")
+        else:
+            qs = qs.order_by("name_hit", "id")
+        return [(pk, [hit, pk]) for pk, hit in qs.values_list("id", "name_hit")[:limit]]
+
+    def rebuild(self, chunk_size=1000):
+        return Skill.objects.count()
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """
+    FTS5 index kept in ``skillzone_skill_search``.
+
+    The rowid of each index row is the skill id, so updates and deletes are
+    primary-key lookups. The table and its default bm25 column weights are
+    created by migration ``0007_skill_search_index``.
+    """
+
+    # One INSERT ... SELECT fills the index for a contiguous id range.
+    _FILL_SQL = (
+        f"INSERT INTO {SEARCH_TABLE} (rowid, name, description, username, full_name) "
+        "SELECT s.id, s.name, COALESCE(s.description, ''), "
+        "COALESCE(u.username, ''), COALESCE(p.full_name, '') "
+        "FROM skillzone_skill s "
+        "LEFT JOIN auth_user u ON u.id = s.user_id "
+        "LEFT JOIN users_profilemodel p ON p.user_id = s.user_id "
+    )
+
+    def _match_expression(self, query):
+        # Every token must match; the trailing * makes the last characters
+        # typed behave as a prefix so search-as-you-type works.
+        return " ".join('"%s"*' % token for token in tokenize(query))
+
+    def search(self, query, limit, after=None, before=None):
+        expression = self._match_expression(query)
+        if not expression:
+            return []
+        sql = f"SELECT rowid, rank FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s "
+        params = [expression]
+        if after is not None:
+            sql += "AND (rank > %s OR (rank = %s AND rowid > %s)) ORDER BY rank, rowid "
+            params += [after[0], after[0], after[1]]
+        elif before is not None:
+            sql += "AND (rank < %s OR (rank = %s AND rowid < %s)) ORDER BY rank DESC, rowid DESC "
+            params += [before[0], before[0], before[1]]
+        else:
+            sql += "ORDER BY rank, rowid "
+        with connection.cursor() as cursor:
+            cursor.execute(sql + "LIMIT %s", params + [limit])
+            return [(pk, [rank, pk]) for pk, rank in cursor.fetchall()]
+
+    def index_skills(self, skill_ids):
+        skill_ids = list(skill_ids)
+        if not skill_ids:
+            return
+        placeholders = ", ".join(["%s"] * len(skill_ids))
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})",
+                skill_ids,
+            )
+            cursor.execute(
+                self._FILL_SQL + f"WHERE s.id IN ({placeholders})",
+                skill_ids,
+            )
+
+    def remove_skills(self, skill_ids):
+        skill_ids = list(skill_ids)
+        if not skill_ids:
+            return
+        placeholders = ", ".join(["%s"] * len(skill_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})",
+                skill_ids,
+            )
+
+    def index_user(self, user_id):
+        # Username and full name are copied into every skill row of the
+        # user, so re-index just those skills (found through the FK index).
+        self.index_skills(
+            Skill.objects.filter(user_id=user_id).values_list("id", flat=True)
+        )
+
+    def rebuild(self, chunk_size=1000):
+        """Drop the index contents and refill it in id-ordered chunks."""
+        total = 0
+        last_id = 0
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+            while True:
+                with transaction.atomic():
+                    ids = list(
+                        Skill.objects.filter(id__gt=last_id)
+                        .order_by("id")
+                        .values_list("id", flat=True)[:chunk_size]
+                    )
+                    if not ids:
+                        break
+                    cursor.execute(
+                        self._FILL_SQL + "WHERE s.id BETWEEN %s AND %s",
+                        [ids[0], ids[-1]],
+                    )
+                total += len(ids)
+                last_id = ids[-1]
+            cursor.execute(
+                f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')"
+            )
+        return total
+
+
+_backend = None
+
+
+def get_search_backend():
+    """
+    Return the configured search backend instance.
+
+    ``SKILL_SEARCH_BACKEND`` wins when set; otherwise SQLite databases use
+    the FTS5 index and everything else falls back to the ORM backend.
+    """
+    global _backend
+    if _backend is None:
+        path = getattr(settings, "SKILL_SEARCH_BACKEND", None)
+        if path:
+            _backend = import_string(path)()
+        elif connection.vendor == "sqlite":
+            _backend = SQLiteFTSBackend()
+        else:
+            _backend = ORMSearchBackend()
+    return _backend
+
+
+def search_page(request, query, per_page=None):
+    """
+    Return a ``KeysetPage`` of ``Skill`` objects matching ``query``, in
+    ranking order, using the pagination cursor found in ``request``.
+    """
+    per_page = get_page_size(per_page)
+    direction, key = decode_cursor(request.GET.get(CURSOR_PARAM))
+    if key is not None and (
+        len(key) != 2 or not all(isinstance(v, (int, float)) for v in key)
+    ):
+        direction, key = None, None
+    backend = get_search_backend()
+    if direction == "prev":
+        hits = backend.search(query, per_page + 1, before=key)
+    else:
+        hits = backend.search(query, per_page + 1, after=key)
+
+    found = Skill.objects.select_related("user").in_bulk([pk for pk, _ in hits])
+    hits = [(pk, sort_key) for pk, sort_key in hits if pk in found]
+    return build_page(
+        request,
+        [found[pk] for pk, _ in hits],
+        [sort_key for _, sort_key in hits],
+        per_page,
+        direction,
+    )
+
+
+@receiver(setting_changed)
+def _reset_backend(setting, **kwargs):
+    global _backend
+    if setting == "SKILL_SEARCH_BACKEND":
+        _backend = None
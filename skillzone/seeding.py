@@ -0,0 +1,242 @@
+"""
+Synthetic data for query audits and benchmarks.
+
+``seed_database`` bulk-inserts users, skills, barters, feedback and
+messages in chunks, then rebuilds the derived tables (search index, match index,
+threads, reputation counters) that signals would normally maintain.
+``scratch_database`` runs code against a throwaway test database so the
+real one is never touched.
+"""
+
+import itertools
+import random
+from contextlib import contextmanager
+from io import StringIO
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import transaction
+from django.test.utils import (
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+
+from users.models import ProfileModel
+from .matching import rebuild_index
+from .models import Barter, Feedback, Message, Skill, WantedSkill
+from .search import get_search_backend
+from .threads import rebuild_threads
+
+
+SKILL_NAMES = [
+    "Python", "Django", "JavaScript", "React", "SQL", "Excel", "Guitar",
+    "Piano", "Drums", "Singing", "Spanish", "French", "German", "Japanese",
+    "Hindi", "Cooking", "Baking", "Photography", "Video Editing", "Drawing",
+    "Painting", "Yoga", "Running", "Chess", "Public Speaking", "Writing",
+    "Knitting", "Gardening", "Woodworking", "Carpentry", "Plumbing",
+    "Car Repair", "Accounting", "Marketing", "SEO", "Graphic Design",
+    "UI Design", "3D Modelling", "Statistics", "Calculus", "Physics",
+    "Chemistry", "Biology", "History", "Swimming", "Tennis", "Football",
+    "Dancing", "Salsa", "Meditation", "First Aid", "Sewing", "Pottery",
+    "Calligraphy", "Origami", "Magic Tricks", "Poker", "Bread Making",
+]
+
+FIRST_NAMES = ["Asha", "Ben", "Chen", "Dina", "Eli", "Farah", "Gita", "Hugo",
+               "Ines", "Jon", "Kiran", "Lena", "Mo", "Nia", "Omar", "Priya"]
+LAST_NAMES = ["Rao", "Smith", "Lee", "Khan", "Garcia", "Ivanova", "Sato",
+              "Okafor", "Muller", "Silva", "Patel", "Nguyen"]
+
+DEFAULT_PASSWORD = "seed-password"
+
+
+def zipf_weights(count, exponent):
+    """Cumulative weights where rank ``r`` is ``1 / r ** exponent`` as likely."""
+    return list(itertools.accumulate(1 / (rank + 1) ** exponent for rank in range(count)))
+
+
+class Seeder:
+    """
+    Builds a data set of the requested size with realistic skew.
+
+    Activity follows a Zipf distribution with exponent ``skew`` over the
+    users (0 is uniform): the first user is the busiest "power user", so
+    views rendered for them see the largest lists. Skill names follow the
+    same kind of distribution with ``skill_skew``, giving a few hot skills
+    that many people offer or want.
+    """
+
+    def __init__(self, users=200, skills_per_user=3, wanted_per_user=2,
+                 barters=2000, messages=5000, skew=1.0, skill_skew=1.0,
+                 seed=0, batch_size=1000):
+        self.counts = {
+            "users": users,
+            "barters": barters,
+            "messages": messages,
+        }
+        self.skills_per_user = skills_per_user
+        self.wanted_per_user = wanted_per_user
+        self.skew = skew
+        self.skill_weights = zipf_weights(len(SKILL_NAMES), skill_skew)
+        self.batch_size = batch_size
+        self.rng = random.Random(seed)
+        self.user_weights = None
+
+    def pick_user(self, user_ids):
+        if self.user_weights is None:
+            self.user_weights = zipf_weights(len(user_ids), self.skew)
+        return self.rng.choices(user_ids, cum_weights=self.user_weights)[0]
+
+    def pick_pair(self, user_ids):
+        first = self.pick_user(user_ids)
+        second = self.rng.choice(user_ids)
+        while second == first:
+            second = self.rng.choice(user_ids)
+        return (first, second) if self.rng.random() < 0.5 else (second, first)
+
+    def pick_skill_names(self, count):
+        count = min(count, len(SKILL_NAMES))
+        names = set()
+        while len(names) < count:
+            names.add(self.rng.choices(SKILL_NAMES, cum_weights=self.skill_weights)[0])
+        return sorted(names)
+
+    def insert(self, model, objects):
+        """``bulk_create`` ``objects`` (any iterable) one chunk at a time."""
+        created = []
+        iterator = iter(objects)
+        while True:
+            chunk = list(itertools.islice(iterator, self.batch_size))
+            if not chunk:
+                return created
+            with transaction.atomic():
+                created.extend(model.objects.bulk_create(chunk))
+
+    def create_users(self):
+        password = make_password(DEFAULT_PASSWORD)
+        start = User.objects.count()
+        users = self.insert(User, (
+            User(username=f"seed{start + i:06d}", password=password)
+            for i in range(self.counts["users"])
+        ))
+        self.insert(ProfileModel, (
+            ProfileModel(
+                user=user,
+                full_name=f"{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}",
+            )
+            for user in users
+        ))
+        return [user.pk for user in users]
+
+    def create_skills(self, user_ids):
+        skills = self.insert(Skill, (
+            Skill(user_id=user_id, name=name, description=f"I can teach {name}.")
+            for user_id in user_ids
+            for name in self.pick_skill_names(self.skills_per_user)
+        ))
+        self.insert(WantedSkill, (
+            WantedSkill(user_id=user_id, name=name)
+            for user_id in user_ids
+            for name in self.pick_skill_names(self.wanted_per_user)
+        ))
+        by_user = {}
+        for skill in skills:
+            by_user.setdefault(skill.user_id, []).append(skill.pk)
+        return by_user
+
+    def _barters(self, user_ids, skills):
+        statuses = [choice[0] for choice in Barter.STATUS_CHOICES]
+        for _ in range(self.counts["barters"]):
+            user_from, user_to = self.pick_pair(user_ids)
+            status = self.rng.choice(statuses)
+            done = status == Barter.STATUS_COMPLETED
+            yield Barter(
+                user_from_id=user_from,
+                user_to_id=user_to,
+                skill_from_id=self.rng.choice(skills[user_from]),
+                skill_to_id=self.rng.choice(skills[user_to]),
+                status=status,
+                completed_by_from=done or self.rng.random() < 0.3,
+                completed_by_to=done,
+            )
+
+    def create_barters(self, user_ids, skills):
+        # Only completed barters are kept around, for their feedback.
+        completed = [
+            barter
+            for barter in self.insert(Barter, self._barters(user_ids, skills))
+            if barter.status == Barter.STATUS_COMPLETED
+        ]
+        self.insert(Feedback, (
+            Feedback(
+                barter=barter,
+                user_id=user_id,
+                rating=self.rng.randint(1, 10) / 2,
+                comment="Seeded feedback",
+            )
+            for barter in completed
+            for user_id in (barter.user_from_id, barter.user_to_id)
+            if self.rng.random() < 0.7
+        ))
+
+    def _messages(self, user_ids):
+        # A user talks to a handful of partners, not to everyone.
+        partners = {}
+        for i in range(self.counts["messages"]):
+            sender, recipient = self.pick_pair(user_ids)
+            known = partners.setdefault(sender, [])
+            if len(known) >= 8:
+                recipient = self.rng.choice(known)
+            elif recipient not in known:
+                known.append(recipient)
+            yield Message(
+                sender_id=sender,
+                recipient_id=recipient,
+                body=f"Seeded message {i}",
+                is_read=self.rng.random() < 0.8,
+            )
+
+    def create_messages(self, user_ids):
+        iterator = self._messages(user_ids)
+        while True:
+            chunk = list(itertools.islice(iterator, self.batch_size))
+            if not chunk:
+                break
+            with transaction.atomic():
+                Message.objects.bulk_create(chunk)
+
+    def rebuild_derived(self):
+        get_search_backend().rebuild()
+        rebuild_index()
+        rebuild_threads()
+        call_command("reconcile_ratings", stdout=StringIO())
+
+    def run(self):
+        user_ids = self.create_users()
+        skills = self.create_skills(user_ids)
+        self.create_barters(user_ids, skills)
+        self.create_messages(user_ids)
+        self.rebuild_derived()
+        return user_ids
+
+
+def seed_database(**options):
+    """Seed the current database; returns the new user ids, busiest first."""
+    return Seeder(**options).run()
+
+
+@contextmanager
+def scratch_database(verbosity=0):
+    """
+    Run the body against freshly migrated test databases (in memory for
+    SQLite), with the test environment set up, and drop them afterwards.
+    """
+    setup_test_environment()
+    old_config = setup_databases(verbosity, interactive=False)
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity)
+        teardown_test_environment()
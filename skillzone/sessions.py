@@ -0,0 +1,123 @@
+"""
+Cheaper sessions.
+
+With Django's database sessions every authenticated request starts with a
+``django_session`` SELECT, and every change (or a value set to what it
+already was) costs an UPDATE. ``SESSION_PROFILE`` in the settings picks
+the engine: ``db`` (the default) keeps Django's, ``cached_db`` reads
+sessions from the ``sessions`` cache and writes through to the database,
+and ``signed_cookies`` keeps them in the client's cookie. Outside ``db``,
+flash messages go to a cookie instead of the session.
+
+``cached_db`` is only safe with a cache every worker shares: a session
+flushed in one process would otherwise still be served from another's
+memory. ``check_session_cache`` (system check ``skillzone.W001``) warns
+when the cache is per process.
+
+``SessionMiddleware`` replaces Django's: a session marked modified whose
+contents are byte for byte what was loaded is not saved again.
+
+Expired rows are only removed by ``purge_expired_sessions`` (run by the
+``purge_sessions`` command), in chunks, so that no single DELETE holds the
+write lock for long.
+"""
+
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.sessions.middleware import SessionMiddleware as BaseSessionMiddleware
+from django.core import checks
+from django.db import transaction
+from django.utils import timezone
+
+
+class UnchangedSessionMixin:
+    """Remember what was loaded, to tell whether a save would change anything."""
+
+    _loaded = None
+
+    def _snapshot(self, data):
+        return self.session_key, self.serializer().dumps(data)
+
+    def load(self):
+        data = super().load()
+        self._loaded = self._snapshot(data)
+        return data
+
+    async def aload(self):
+        data = await super().aload()
+        self._loaded = self._snapshot(data)
+        return data
+
+    def unchanged(self):
+        if self._loaded is None or not hasattr(self, "_session_cache"):
+            return False
+        return self._snapshot(self._session_cache) == self._loaded
+
+
+class SessionMiddleware(BaseSessionMiddleware):
+    """Django's session middleware, minus saves that would change nothing."""
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.SessionStore = type(
+            "SessionStore", (UnchangedSessionMixin, self.SessionStore), {}
+        )
+
+    def process_response(self, request, response):
+        session = getattr(request, "session", None)
+        if (
+            session is not None
+            and session.modified
+            and not settings.SESSION_SAVE_EVERY_REQUEST
+            and session.unchanged()
+        ):
+            session.modified = False
+        return super().process_response(request, response)
+
+
+# Cache backends that keep their entries in the worker's own memory.
+PER_PROCESS_CACHES = {"django.core.cache.backends.locmem.LocMemCache"}
+
+
+def check_session_cache(app_configs, **kwargs):
+    if settings.SESSION_ENGINE != "django.contrib.sessions.backends.cached_db":
+        return []
+    backend = settings.CACHES.get(settings.SESSION_CACHE_ALIAS, {}).get("BACKEND")
+    if backend not in PER_PROCESS_CACHES:
+        return []
+    return [
+        checks.Warning(
+            f"Sessions are cached in {backend}, which is not shared between processes.",
+            hint=(
+                f"With several workers, a session logged out in one keeps being served "
+                f"by the others. Point CACHES[{settings.SESSION_CACHE_ALIAS!r}] at a "
+                f"shared backend or set SESSION_PROFILE=db."
+            ),
+            id="skillzone.W001",
+        )
+    ]
+
+
+def session_model():
+    """The model of a database-backed ``SESSION_ENGINE``, else ``None``."""
+    store = import_module(settings.SESSION_ENGINE).SessionStore
+    get_model_class = getattr(store, "get_model_class", None)
+    return get_model_class() if get_model_class else None
+
+
+def purge_expired_sessions(chunk_size=1000):
+    """Delete expired sessions ``chunk_size`` at a time; returns how many."""
+    model = session_model()
+    if model is None:
+        # Cookie or cache sessions expire by themselves.
+        return 0
+    now = timezone.now()
+    expired = model.objects.filter(expire_date__lt=now)
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            keys = list(expired.values_list("pk", flat=True)[:chunk_size])
+            if not keys:
+                return deleted
+            deleted += model.objects.filter(pk__in=keys, expire_date__lt=now).delete()[0]
@@ -0,0 +1,146 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from users.models import ProfileModel
+from .chat import publish_message
+from .matching import reindex_user
+from .counters import invalidate_nav_counts
+from .database import configure_connection
+from .fragments import SKILL, USER, bump_versions
+from .models import Barter, BarterEvent, Feedback, Message, Skill, SkillIndexEntry, WantedSkill
+from .notifications import notify_barter_event, notify_message
+from .reputation import adjust_reputation, reconcile_profiles
+from .search import get_search_backend
+from .threads import record_message
+
+
+# Keep the skill search index in step with the rows it copies from.
+
+@receiver(post_save, sender=Skill)
+def index_skill(sender, instance, *args, **kwargs):
+    get_search_backend().index_skills([instance.pk])
+
+
+@receiver(post_delete, sender=Skill)
+def unindex_skill(sender, instance, *args, **kwargs):
+    get_search_backend().remove_skills([instance.pk])
+
+
+@receiver(post_save, sender=User)
+def index_user_skills(sender, instance, created, *args, **kwargs):
+    # A brand new user cannot own any skills yet.
+    if not created:
+        get_search_backend().index_user(instance.pk)
+
+
+@receiver(post_save, sender=ProfileModel)
+@receiver(post_delete, sender=ProfileModel)
+def index_profile_skills(sender, instance, *args, **kwargs):
+    get_search_backend().index_user(instance.user_id)
+
+
+# Reputation counters on ProfileModel (see skillzone.reputation).
+
+@receiver(post_save, sender=Feedback)
+def count_feedback_rating(sender, instance, created, *args, **kwargs):
+    if created:
+        adjust_reputation(instance.barter_id, 1, instance.rating)
+    elif hasattr(instance, "_loaded_rating"):
+        adjust_reputation(
+            instance.barter_id, 0, instance.rating - instance._loaded_rating
+        )
+    else:
+        # Saved from an instance that was never loaded, so the previous
+        # rating is unknown: recount this receiver from scratch.
+        profile = ProfileModel.objects.filter(
+            user__barters_received=instance.barter_id
+        ).first()
+        for stale in reconcile_profiles([profile] if profile else []):
+            ProfileModel.objects.filter(pk=stale.pk).update(
+                rating_count=stale.rating_count, rating_sum=stale.rating_sum
+            )
+    instance._loaded_rating = instance.rating
+
+
+@receiver(post_delete, sender=Feedback)
+def uncount_feedback_rating(sender, instance, *args, **kwargs):
+    rating = getattr(instance, "_loaded_rating", instance.rating)
+    adjust_reputation(instance.barter_id, -1, -rating)
+
+
+# Offer/want inverted index used by the matches page (see skillzone.matching).
+
+@receiver(post_save, sender=Skill)
+@receiver(post_delete, sender=Skill)
+def index_offered_skill(sender, instance, *args, **kwargs):
+    reindex_user(instance.user_id, SkillIndexEntry.KIND_OFFER)
+
+
+@receiver(post_save, sender=WantedSkill)
+@receiver(post_delete, sender=WantedSkill)
+def index_wanted_skill(sender, instance, *args, **kwargs):
+    reindex_user(instance.user_id, SkillIndexEntry.KIND_WANT)
+
+
+# Inbox thread summaries (see skillzone.threads) and live delivery to open
+# chat sockets (see skillzone.chat).
+
+@receiver(post_save, sender=Message)
+def update_threads(sender, instance, created, *args, **kwargs):
+    if created:
+        record_message(instance)
+        transaction.on_commit(lambda: publish_message(instance))
+
+
+# Cached navbar counters (see skillzone.counters).
+
+@receiver(post_save, sender=Message)
+@receiver(post_delete, sender=Message)
+def invalidate_message_counts(sender, instance, *args, **kwargs):
+    invalidate_nav_counts(instance.recipient_id)
+
+
+@receiver(post_save, sender=Barter)
+@receiver(post_delete, sender=Barter)
+def invalidate_barter_counts(sender, instance, *args, **kwargs):
+    invalidate_nav_counts(instance.user_from_id, instance.user_to_id)
+
+
+# Cached skill cards (see skillzone.fragments).
+
+@receiver(post_save, sender=Skill)
+@receiver(post_delete, sender=Skill)
+def bump_skill_version(sender, instance, *args, **kwargs):
+    bump_versions(SKILL, instance.pk)
+
+
+@receiver(post_save, sender=User)
+def bump_user_version(sender, instance, *args, **kwargs):
+    bump_versions(USER, instance.pk)
+
+
+@receiver(post_save, sender=ProfileModel)
+def bump_profile_version(sender, instance, *args, **kwargs):
+    bump_versions(USER, instance.user_id)
+
+
+# In-app notifications, mailed in digests (see skillzone.notifications).
+
+@receiver(post_save, sender=BarterEvent)
+def notify_barter_participants(sender, instance, created, *args, **kwargs):
+    if created:
+        notify_barter_event(instance)
+
+
+@receiver(post_save, sender=Message)
+def notify_message_recipient(sender, instance, created, *args, **kwargs):
+    if created:
+        notify_message(instance)
+
+
+# SQLite pragmas on every new connection (see skillzone.database).
+
+connection_created.connect(configure_connection, dispatch_uid="skillzone.configure_connection")
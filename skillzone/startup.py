@@ -0,0 +1,81 @@
+"""
+Worker warm-up.
+
+A fresh worker process has imported the settings and apps, but Django
+still parses each template on the first request that uses it and builds
+the URL resolver on the first ``reverse()``. ``warm_up`` does both ahead
+of time: it compiles every project template into the cached template
+loader and populates the resolver, including the view modules it imports.
+
+``wsgi.py`` and ``asgi.py`` call it when ``WARM_UP`` is on, before the
+server accepts requests. With a pre-forking server that loads the
+application in the master (``gunicorn --preload``) the work is done once
+and the forked workers share it. ``profile_startup`` measures the
+difference in time to first byte.
+"""
+
+import os
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.template import TemplateSyntaxError, engines
+from django.urls import get_resolver
+
+
+def project_template_dirs(engine):
+    """Template directories of the project (``templates/`` and its apps)."""
+    base = Path(settings.BASE_DIR).resolve()
+    for directory in engine.template_dirs:
+        directory = Path(directory).resolve()
+        if directory.is_relative_to(base):
+            yield directory
+
+
+def compile_templates():
+    """
+    Load every project template through the engine, which keeps it in the
+    cached loader. Returns ``(compiled, errors)``, errors as
+    ``(name, message)`` pairs.
+    """
+    compiled, errors = 0, []
+    for engine in engines.all():
+        if not hasattr(engine, "engine"):
+            continue  # only the Django template language is precompiled
+        for directory in project_template_dirs(engine):
+            for root, _, files in os.walk(directory):
+                for filename in sorted(files):
+                    if not filename.endswith((".html", ".txt")):
+                        continue
+                    name = Path(root, filename).relative_to(directory).as_posix()
+                    try:
+                        engine.get_template(name)
+                    except TemplateSyntaxError as e:
+                        errors.append((name, str(e)))
+                    else:
+                        compiled += 1
+    return compiled, errors
+
+
+def resolve_urls():
+    """Build the URL resolver's lookup tables; returns the number of names."""
+    resolver = get_resolver()
+    return len(resolver.reverse_dict) + sum(
+        len(resolver.namespace_dict[namespace][1].reverse_dict)
+        for namespace in resolver.namespace_dict
+    )
+
+
+def warm_up():
+    """Precompile templates and resolve URLs; returns what was done."""
+    start = time.perf_counter()
+    compiled, errors = compile_templates()
+    templates_done = time.perf_counter()
+    url_names = resolve_urls()
+    return {
+        "templates": compiled,
+        "template_errors": errors,
+        "templates_ms": (templates_done - start) * 1000,
+        "urls": url_names,
+        "urls_ms": (time.perf_counter() - templates_done) * 1000,
+    }
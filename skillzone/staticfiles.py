@@ -0,0 +1,225 @@
+"""
+Versioned, precompressed static files served from the application.
+
+``collectstatic`` with ``CompressedManifestStaticFilesStorage`` (the
+``staticfiles`` storage in settings) copies every file under a
+content-hashed name (``style.3f2a1c9e4b7d.css``), rewrites references to
+them, and writes ``.gz`` (and, with the optional ``brotli`` package,
+``.br``) siblings of everything compressible. Templates get the hashed
+names through ``{% static %}``.
+
+``StaticFilesMiddleware`` serves ``STATIC_ROOT`` without a separate web
+server. At startup it indexes every file (size, ETag, available
+encodings, and the content itself for small files), so a request is a
+dict lookup. Hashed names never change content and are sent with
+``Cache-Control: immutable`` for a year; other names get a short max-age
+and revalidate with ``ETag``. The encoding is negotiated with
+``Accept-Encoding``.
+
+Before ``collectstatic`` has run (development, tests) the storage falls
+back to plain names and the middleware removes itself.
+"""
+
+import gzip
+import json
+import mimetypes
+import os
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, StaticFilesStorage
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date
+
+try:
+    import brotli
+except ImportError:  # optional; gzip alone is fine
+    brotli = None
+
+
+COMPRESSIBLE_EXTENSIONS = {
+    ".css", ".js", ".mjs", ".map", ".json", ".svg", ".txt", ".html", ".xml",
+    ".ico", ".ttf", ".otf", ".eot",
+}
+
+# Siblings that do not save at least this fraction are not written.
+MIN_SAVING = 0.05
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+DEFAULT_CACHE_CONTROL = "public, max-age=60"
+
+# Files up to this size are kept in memory by the middleware.
+MAX_IN_MEMORY = 512 * 1024
+
+# Preferred first when the client accepts several.
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+
+def _compressors():
+    yield ".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0)
+    if brotli is not None:
+        yield ".br", lambda data: brotli.compress(data, quality=11)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """``ManifestStaticFilesStorage`` that also writes compressed siblings."""
+
+    def url(self, name, force=False):
+        if not self.hashed_files:
+            # No manifest: collectstatic has not run (development, tests).
+            return StaticFilesStorage.url(self, name)
+        return super().url(name, force)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if not dry_run:
+            for name in sorted(set(paths) | set(self.hashed_files.values())):
+                self.compress(name)
+
+    def compress(self, name):
+        if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+            return
+        path = self.path(name)
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as f:
+            data = f.read()
+        mtime = os.path.getmtime(path)
+        for suffix, compress in _compressors():
+            target = path + suffix
+            if os.path.exists(target) and os.path.getmtime(target) >= mtime:
+                continue
+            compressed = compress(data)
+            if len(compressed) <= len(data) * (1 - MIN_SAVING):
+                with open(target, "wb") as f:
+                    f.write(compressed)
+            elif os.path.exists(target):
+                os.remove(target)
+
+
+class StaticFile:
+    """One file of the index, in every encoding it is available in."""
+
+    def __init__(self, path, immutable):
+        self.content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if self.content_type.startswith("text/") or self.content_type in (
+            "application/javascript", "application/json", "image/svg+xml",
+        ):
+            self.content_type += "; charset=utf-8"
+        stat = os.stat(path)
+        self.last_modified = http_date(stat.st_mtime)
+        self.etag = f'"{stat.st_size:x}-{int(stat.st_mtime):x}"'
+        self.cache_control = IMMUTABLE_CACHE_CONTROL if immutable else DEFAULT_CACHE_CONTROL
+        # encoding (None for identity) -> (path, size, content or None)
+        self.variants = {None: self._variant(path, stat.st_size)}
+        for encoding, suffix in ENCODINGS:
+            if os.path.exists(path + suffix):
+                self.variants[encoding] = self._variant(
+                    path + suffix, os.path.getsize(path + suffix)
+                )
+
+    @staticmethod
+    def _variant(path, size):
+        content = None
+        if size <= MAX_IN_MEMORY:
+            with open(path, "rb") as f:
+                content = f.read()
+        return path, size, content
+
+    def choose_encoding(self, accept_encoding):
+        accepted = set()
+        for item in accept_encoding.split(","):
+            coding, _, params = item.strip().partition(";")
+            quality = params.strip().removeprefix("q=")
+            try:
+                if params and float(quality) == 0:
+                    continue
+            except ValueError:
+                continue
+            accepted.add(coding.strip().lower())
+        for encoding, _ in ENCODINGS:
+            if encoding in self.variants and (encoding in accepted or "*" in accepted):
+                return encoding
+        return None
+
+    def response(self, request):
+        encoding = self.choose_encoding(request.headers.get("Accept-Encoding", ""))
+        etag = self.etag if encoding is None else f'{self.etag[:-1]}-{encoding}"'
+        if etag in request.headers.get("If-None-Match", ""):
+            response = HttpResponseNotModified()
+        else:
+            path, size, content = self.variants[encoding]
+            if request.method == "HEAD":
+                response = HttpResponse(content_type=self.content_type)
+            elif content is not None:
+                response = HttpResponse(content, content_type=self.content_type)
+            else:
+                response = FileResponse(open(path, "rb"), content_type=self.content_type)
+            response["Content-Length"] = size
+            response["Last-Modified"] = self.last_modified
+            if encoding:
+                response["Content-Encoding"] = encoding
+        response["ETag"] = etag
+        response["Cache-Control"] = self.cache_control
+        if len(self.variants) > 1:
+            response["Vary"] = "Accept-Encoding"
+        return response
+
+
+def build_index(root, url_prefix, manifest_name="staticfiles.json"):
+    """Map each URL path under ``url_prefix`` to a ``StaticFile``."""
+    hashed = set()
+    try:
+        with open(os.path.join(root, manifest_name)) as f:
+            hashed = set(json.load(f).get("paths", {}).values())
+    except (OSError, ValueError):
+        pass
+
+    index = {}
+    siblings = tuple(suffix for _, suffix in ENCODINGS)
+    for directory, _, files in os.walk(root):
+        for filename in files:
+            if filename.endswith(siblings) or filename == manifest_name:
+                continue
+            path = os.path.join(directory, filename)
+            name = os.path.relpath(path, root).replace(os.sep, "/")
+            index[url_prefix + name] = StaticFile(path, name in hashed)
+    return index
+
+
+class StaticFilesMiddleware:
+    """
+    Serve ``STATIC_ROOT`` from memory (see the module docstring). Put it
+    right after ``SecurityMiddleware``. Not used with ``DEBUG``, where
+    ``runserver`` serves the app directories directly.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        prefix = settings.STATIC_URL or ""
+        if settings.DEBUG or not settings.STATIC_ROOT or not prefix.startswith("/"):
+            raise MiddlewareNotUsed
+        self.index = build_index(str(settings.STATIC_ROOT), prefix)
+        if not self.index:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def serve(self, request):
+        if request.method in ("GET", "HEAD"):
+            static_file = self.index.get(request.path)
+            if static_file is not None:
+                return static_file.response(request)
+        return None
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.serve(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        return self.serve(request) or await self.get_response(request)
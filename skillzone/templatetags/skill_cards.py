@@ -0,0 +1,63 @@
+"""
+Cached skill cards (see ``skillzone.fragments``).
+
+``{% prefetch_skill_cards skills "home" %}`` before a loop looks up the
+versions and cached HTML of every card in two cache round trips;
+``{% skill_card skill "home" %}`` inside the loop then renders only the
+cards that were missing, from rows of the primary database, and stores
+them. Without the prefetch each card does its own lookups.
+"""
+
+from django import template
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+from skillzone.fragments import card_keys, get_cards, primary_skills, show_actions, store_card
+
+register = template.Library()
+
+TEMPLATE = "partials/skill_card.html"
+
+# Context variable holding {layout: {skill id: (key, html or None, primary
+# row or None)}}.
+PREFETCHED = "_skill_cards"
+
+
+def _viewer(context):
+    request = context.get("request")
+    return getattr(request, "user", None)
+
+
+@register.simple_tag(takes_context=True)
+def prefetch_skill_cards(context, skills, layout):
+    skills = list(skills)
+    keys = card_keys(skills, layout, _viewer(context))
+    cards = get_cards(list(keys.values()))
+    rows = primary_skills(skill for skill in skills if keys[skill.pk] not in cards)
+    prefetched = dict(context.get(PREFETCHED, {}))
+    prefetched[layout] = {
+        pk: (key, cards.get(key), rows.get(pk)) for pk, key in keys.items()
+    }
+    context[PREFETCHED] = prefetched
+    return ""
+
+
+@register.simple_tag(takes_context=True)
+def skill_card(context, skill, layout):
+    viewer = _viewer(context)
+    found = context.get(PREFETCHED, {}).get(layout, {}).get(skill.pk)
+    if found is None:
+        key = card_keys([skill], layout, viewer)[skill.pk]
+        html = get_cards([key]).get(key)
+        found = key, html, None if html else primary_skills([skill]).get(skill.pk)
+    key, html, row = found
+    if html is None:
+        html = get_template(TEMPLATE).render({
+            "skill": row or skill,
+            "layout": layout,
+            "actions": show_actions(skill, viewer),
+        })
+        # A skill deleted on the primary is shown as read, but not cached.
+        if row is not None:
+            store_card(key, html)
+    return mark_safe(html)
@@ -0,0 +1,1680 @@
+import csv
+import gzip
+import json
+import os
+import shutil
+import socketserver
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from importlib import import_module
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.testing import ApplicationCommunicator
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core import mail
+from django.core.cache import cache, caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections
+from django.http import HttpResponse
+from django.template import engines
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from users.models import ProfileModel
+from .benchmark import benchmark_views, compare
+from .channel_layers import get_channel_layer
+from .chat import chat_application
+from .counters import get_nav_counts
+from .cycles import discover
+from .exports import EXPORTS, astream_export
+from . import fragments
+from .importing import import_users
+from .query_audit import audit_views
+from .replicas import PIN_COOKIE, copy_to_replica
+from .pagination import CURSOR_PARAM, encode_cursor, paginate_keyset, paginate_keyset_union
+from .search import ORMSearchBackend, SEARCH_TABLE, get_search_backend, search_page
+from .seeding import seed_database
+from .sessions import SessionMiddleware, check_session_cache, purge_expired_sessions
+from .transitions import TransitionNotAllowed, apply_transition
+from .startup import warm_up
+from . import staticfiles
+from .staticfiles import StaticFilesMiddleware
+from .matching import find_matches
+from .notifications import send_digests
+from .profiling import ProfilingMiddleware
+from .outbox import deliver_outbox
+from .models import (
+    Barter,
+    BarterCycle,
+    BarterEvent,
+    Feedback,
+    ImportCheckpoint,
+    OutgoingEmail,
+    Message,
+    Notification,
+    Skill,
+    SkillIndexEntry,
+    Thread,
+    WantedSkill,
+)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user("alice", password="pw")
+        cls.bob = User.objects.create_user("bob", password="pw")
+        cls.guitar = Skill.objects.create(user=cls.alice, name="Guitar", description="Jazz chords")
+        cls.lessons = Skill.objects.create(
+            user=cls.bob,
+            name="Music lessons",
+            description="Piano, singing, a little guitar and lots of theory for beginners",
+        )
+        cls.drums = Skill.objects.create(user=cls.bob, name="Drums", description="Rock")
+
+    def setUp(self):
+        cache.clear()
+        fragments.fragment_cache().clear()
+
+    def search(self, query, limit=20):
+        return [pk for pk, _ in get_search_backend().search(query, limit)]
+
+    def test_name_hits_rank_first(self):
+        self.assertEqual(self.search("guitar"), [self.guitar.pk, self.lessons.pk])
+
+    def test_prefix_and_every_token_must_match(self):
+        self.assertEqual(self.search("gui"), [self.guitar.pk, self.lessons.pk])
+        self.assertEqual(self.search("guitar jaz"), [self.guitar.pk])
+        self.assertEqual(self.search("guitar rock"), [])
+        self.assertEqual(self.search("  !! "), [])
+
+    def test_owner_names_are_searchable(self):
+        self.assertEqual(self.search("alice"), [self.guitar.pk])
+        profile = self.bob.profilemodel
+        profile.full_name = "Robert Smith"
+        profile.save()
+        self.assertEqual(sorted(self.search("smith")), sorted([self.lessons.pk, self.drums.pk]))
+
+        # A profile deleted on its own (from the admin) takes its name along.
+        profile.delete()
+        self.assertEqual(self.search("smith"), [])
+        self.assertEqual(sorted(self.search("bob")), sorted([self.lessons.pk, self.drums.pk]))
+
+    def test_edits_and_deletes_are_indexed(self):
+        self.drums.name = "Bass"
+        self.drums.save()
+        self.assertEqual(self.search("drums"), [])
+        self.assertEqual(self.search("bass"), [self.drums.pk])
+
+        self.alice.username = "alicia"
+        self.alice.save()
+        self.assertEqual(self.search("alice"), [])
+        self.assertEqual(self.search("alicia"), [self.guitar.pk])
+
+        self.guitar.delete()
+        self.assertEqual(self.search("guitar"), [self.lessons.pk])
+
+    def test_rebuild_restores_the_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        self.assertEqual(self.search("guitar"), [])
+
+        out = StringIO()
+        call_command("rebuild_search_index", chunk_size=2, stdout=out)
+
+        self.assertIn("Indexed 3 skills", out.getvalue())
+        self.assertEqual(self.search("guitar"), [self.guitar.pk, self.lessons.pk])
+
+    @override_settings(SKILL_SEARCH_BACKEND="skillzone.search.ORMSearchBackend")
+    def test_orm_fallback(self):
+        self.assertIsInstance(get_search_backend(), ORMSearchBackend)
+        self.assertEqual(self.search("guitar"), [self.guitar.pk, self.lessons.pk])
+        self.assertEqual(self.search("bob rock"), [self.drums.pk])
+        self.assertEqual(self.search("zzz"), [])
+
+    def test_home_search(self):
+        response = self.client.get(reverse("skillzone:home"), {"q": "gui"})
+
+        self.assertContains(response, "Guitar")
+        self.assertContains(response, "Music lessons")
+        self.assertNotContains(response, "Drums")
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user("alice", password="pw")
+        cls.bob = User.objects.create_user("bob", password="pw")
+        cls.carol = User.objects.create_user("carol", password="pw")
+        skill = Skill.objects.create(user=cls.alice, name="Guitar")
+        Barter.objects.bulk_create(
+            Barter(
+                user_from=cls.alice if i % 2 else cls.bob,
+                user_to=cls.bob if i % 2 else cls.alice,
+                skill_from=skill,
+                skill_to=skill,
+                status=Barter.STATUS_ACCEPTED,
+            )
+            for i in range(7)
+        )
+        # Ties on the first ordering field, so only the id tells rows apart.
+        tie = timezone.now()
+        Barter.objects.update(date_requested=tie)
+        Barter.objects.filter(pk=Barter.objects.order_by("pk").first().pk).update(
+            date_requested=tie - timedelta(days=1)
+        )
+
+    def request(self, cursor=None, **params):
+        if cursor is not None:
+            params[CURSOR_PARAM] = cursor
+        return RequestFactory().get("/", params)
+
+    def union_page(self, request):
+        barters = Barter.objects.all()
+        return paginate_keyset_union(
+            request,
+            [barters.filter(user_from=self.alice), barters.filter(user_to=self.alice)],
+            ("-date_requested", "-id"),
+            per_page=3,
+        )
+
+    def walk(self, paginate):
+        """Follow the next links from the first page; returns the pages' ids."""
+        pages, request = [], self.request()
+        while True:
+            page = paginate(request)
+            pages.append([row.pk for row in page])
+            if not page.has_next:
+                return pages, page
+            request = RequestFactory().get("/" + page.next_url)
+
+    def test_next_and_previous_across_ties(self):
+        expected = list(
+            Barter.objects.order_by("-date_requested", "-id").values_list("pk", flat=True)
+        )
+        for paginate in (
+            self.union_page,
+            lambda request: paginate_keyset(
+                request, Barter.objects.all(), ("-date_requested", "-id"), per_page=3
+            ),
+        ):
+            pages, last = self.walk(paginate)
+            self.assertEqual(pages, [expected[:3], expected[3:6], expected[6:]])
+            self.assertTrue(last.has_previous)
+
+            previous = paginate(RequestFactory().get("/" + last.previous_url))
+            self.assertEqual([row.pk for row in previous], expected[3:6])
+            self.assertTrue(previous.has_next)
+            self.assertTrue(previous.has_previous)
+
+    def test_ties_on_created_at(self):
+        sent = Message.objects.bulk_create(
+            Message(sender=self.bob, recipient=self.alice, body=str(i)) for i in range(5)
+        )
+        Message.objects.update(created_at=timezone.now())
+
+        pages, _ = self.walk(
+            lambda request: paginate_keyset(
+                request, Message.objects.all(), ("-created_at", "-id"), per_page=2
+            )
+        )
+
+        self.assertEqual(sum(pages, []), sorted((m.pk for m in sent), reverse=True))
+
+    def test_bad_cursors_show_the_first_page(self):
+        first = [row.pk for row in self.union_page(self.request())]
+        for cursor in [
+            "!!not base64!!",
+            "bm90IGpzb24",  # "not json"
+            encode_cursor("sideways", [1, 2]),
+            encode_cursor("next", [1]),
+            encode_cursor("next", ["yesterday", 3]),
+            encode_cursor("next", [{}, 3]),
+            encode_cursor("next", [1700000000, 3]),
+            encode_cursor("next", [["2024-01-01"], 3]),
+        ]:
+            with self.subTest(cursor=cursor):
+                page = self.union_page(self.request(cursor))
+                self.assertEqual([row.pk for row in page], first)
+                self.assertFalse(page.has_previous)
+
+    def test_links_keep_other_parameters(self):
+        page = self.union_page(self.request(q="guitar"))
+
+        self.assertIn("q=guitar", page.next_url)
+        self.assertIn(f"{CURSOR_PARAM}=", page.next_url)
+        self.assertIsNone(page.previous_url)
+
+    def test_search_cursors(self):
+        # Identical text, so identical bm25 ranks: rowid breaks the tie.
+        skills = Skill.objects.bulk_create(
+            Skill(user=self.carol, name="Chess", description="Openings") for _ in range(5)
+        )
+        get_search_backend().index_skills([skill.pk for skill in skills])
+
+        pages, last = self.walk(lambda request: search_page(request, "chess", per_page=2))
+
+        self.assertEqual(sum(pages, []), [skill.pk for skill in skills])
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        previous = search_page(RequestFactory().get("/" + last.previous_url), "chess", per_page=2)
+        self.assertEqual([row.pk for row in previous], pages[1])
+
+        for key in (["rank", 1], [0.5], [None, None]):
+            with self.subTest(key=key):
+                page = search_page(self.request(encode_cursor("next", key)), "chess", per_page=2)
+                self.assertEqual([row.pk for row in page], pages[0])
+
+    def test_user_list_pages_exclude_the_viewer(self):
+        self.client.force_login(self.alice)
+
+        with self.settings(PAGINATE_BY=1):
+            response = self.client.get(reverse("skillzone:user_list"))
+            users = [user.username for user in response.context["users"]]
+            self.assertContains(response, "Next")
+            url = reverse("skillzone:user_list") + response.context["users"].next_url
+            users += [user.username for user in self.client.get(url).context["users"]]
+
+        self.assertEqual(users, ["bob", "carol"])
+
+
+class BarterListQueryCountTests(TestCase):
+    """
+    ``my_barters`` and ``completed_barters`` must run a fixed number of
+    queries however many barters (and feedback rows) the user has.
+    """
+
+    # session + user, barters sent and received, batched feedback lookup
+    # (the navbar counters come from the cache)
+    MY_BARTERS_QUERIES = 5
+    # session + user, barters sent and received, prefetched feedback
+    COMPLETED_BARTERS_QUERIES = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user("alice", password="pw")
+        cls.bob = User.objects.create_user("bob", password="pw")
+        cls.alice_skill = Skill.objects.create(user=cls.alice, name="Guitar")
+        cls.bob_skill = Skill.objects.create(user=cls.bob, name="Spanish")
+
+    def setUp(self):
+        cache.clear()
+        get_nav_counts(self.alice.pk)
+        self.client.force_login(self.alice)
+
+    def create_barters(self, count):
+        barters = Barter.objects.bulk_create(
+            Barter(
+                user_from=self.alice,
+                user_to=self.bob,
+                skill_from=self.alice_skill,
+                skill_to=self.bob_skill,
+                status=Barter.STATUS_COMPLETED,
+                completed_by_from=True,
+                completed_by_to=True,
+            )
+            for _ in range(count)
+        )
+        Feedback.objects.bulk_create(
+            Feedback(barter=barter, user=user, rating=4, comment="Great")
+            for barter in barters
+            for user in (self.alice, self.bob)
+        )
+
+    def count_queries(self, url_name):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse(url_name))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_query_count_is_constant(self):
+        created = 0
+        for total in (10, 1000, 10000):
+            self.create_barters(total - created)
+            created = total
+            with self.subTest(barters=total):
+                self.assertEqual(
+                    self.count_queries("skillzone:my_barters"),
+                    self.MY_BARTERS_QUERIES,
+                )
+                self.assertEqual(
+                    self.count_queries("skillzone:completed_barters"),
+                    self.COMPLETED_BARTERS_QUERIES,
+                )
+
+    def test_completed_barters_only_lists_own_barters(self):
+        carol = User.objects.create_user("carol", password="pw")
+        carol_skill = Skill.objects.create(user=carol, name="Chess")
+        other = Barter.objects.create(
+            user_from=self.bob,
+            user_to=carol,
+            skill_from=self.bob_skill,
+            skill_to=carol_skill,
+            status=Barter.STATUS_COMPLETED,
+        )
+        self.create_barters(1)
+
+        response = self.client.get(reverse("skillzone:completed_barters"))
+
+        ids = [b.id for b in response.context["barters"]]
+        self.assertEqual(len(ids), 1)
+        self.assertNotIn(other.id, ids)
+        self.assertEqual(response.context["already_feedback_ids"], ids)
+
+    def test_pages_merge_sent_and_received_barters(self):
+        carol = User.objects.create_user("carol", password="pw")
+        carol_skill = Skill.objects.create(user=carol, name="Chess")
+        for i in range(30):
+            sent = i % 3 == 0
+            Barter.objects.create(
+                user_from=self.alice if sent else carol,
+                user_to=carol if sent else self.alice,
+                skill_from=self.alice_skill if sent else carol_skill,
+                skill_to=carol_skill if sent else self.alice_skill,
+                status=Barter.STATUS_ACCEPTED,
+            )
+        expected = list(
+            Barter.objects.order_by("-date_requested", "-id").values_list("id", flat=True)
+        )
+
+        seen, url = [], reverse("skillzone:my_barters")
+        while url:
+            page = self.client.get(url).context["barters"]
+            seen.extend(b.id for b in page)
+            url = page.next_url and reverse("skillzone:my_barters") + page.next_url
+        self.assertEqual(seen, expected)
+
+        back = self.client.get(reverse("skillzone:my_barters") + page.previous_url)
+        self.assertEqual([b.id for b in back.context["barters"]], expected[:20])
+
+
+class ReputationCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user("alice", password="pw")
+        cls.bob = User.objects.create_user("bob", password="pw")
+        skill = Skill.objects.create(user=cls.alice, name="Guitar")
+        cls.barter = Barter.objects.create(
+            user_from=cls.alice,
+            user_to=cls.bob,
+            skill_from=skill,
+            skill_to=skill,
+            status=Barter.STATUS_COMPLETED,
+        )
+
+    def assertCounters(self, count, total):
+        profile = User.objects.get(pk=self.bob.pk).profilemodel
+        self.assertEqual((profile.rating_count, profile.rating_sum), (count, total))
+
+    def test_counters_follow_feedback_changes(self):
+        self.client.force_login(self.alice)
+        url = reverse("skillzone:give_feedback", args=[self.barter.id])
+
+        self.client.post(url, {"rating": "4", "comment": "Good"})
+        self.assertCounters(1, 4)
+
+        self.client.post(url, {"rating": "2.5", "comment": "Meh"})
+        self.assertCounters(1, 2.5)
+
+        Feedback.objects.create(barter=self.barter, user=self.bob, rating=5, comment="!")
+        self.assertCounters(2, 7.5)
+
+        Feedback.objects.filter(user=self.alice).delete()
+        self.assertCounters(1, 5)
+
+        response = self.client.get(reverse("skillzone:user_detail", args=[self.bob.id]))
+        self.assertEqual(response.context["avg_rating"], 5)
+
+    def test_reconcile_command_repairs_counters(self):
+        Feedback.objects.create(barter=self.barter, user=self.alice, rating=3, comment="ok")
+        ProfileModel.objects.filter(user=self.bob).update(
+            rating_count=0, rating_sum=0
+        )
+
+        call_command("reconcile_ratings", chunk_size=1, stdout=StringIO())
+
+        self.assertCounters(1, 3)
+
+
+class MatchingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user("alice", password="pw")
+        cls.bob = User.objects.create_user("bob", password="pw")
+        cls.carol = User.objects.create_user("carol", password="pw")
+        Skill.objects.create(user=cls.alice, name="Guitar")
+        WantedSkill.objects.create(user=cls.alice, name="spanish ")
+        Skill.objects.create(user=cls.bob, name="Spanish")
+        WantedSkill.objects.create(user=cls.bob, name="GUITAR")
+        # Carol teaches what Alice wants but wants nothing Alice offers.
+        Skill.objects.create(user=cls.carol, name="Spanish")
+
+    def test_only_mutual_matches_are_returned(self):
+        matches = find_matches(self.alice)
+
+        self.assertEqual(
+            matches,
+            [{"user_id": self.bob.id, "teaches": ["spanish"], "learns": ["guitar"], "score": 2}],
+        )
+
+    def test_index_follows_skill_changes(self):
+        Skill.objects.filter(user=self.bob).get().delete()
+        self.assertEqual(find_matches(self.alice), [])
+
+        skill = Skill.objects.create(user=self.carol, name="Drums")
+        WantedSkill.objects.create(user=self.carol, name="Guitar")
+        self.assertEqual([m["user_id"] for m in find_matches(self.alice)], [self.carol.id])
+
+        skill.name = "Piano"
+        skill.save()
+        self.assertEqual(
+            set(
+                SkillIndexEntry.objects.filter(user=self.carol, kind="offer")
+                .values_list("term", flat=True)
+            ),
+            {"spanish", "piano"},
+        )
+
+    def test_matches_page(self):
+        self.client.force_login(self.alice)
+        response = self.client.get(reverse("skillzone:matches"))
+        self.assertEqual([m["user"] for m in response.context["matches"]], [self.bob])
+
+
+class BarterCycleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # alice -> bob -> carol -> alice
+        cls.users = [
+            User.objects.create_user(name, password="pw")
+            for name in ("alice", "bob", "carol", "dave")
+        ]
+        alice, bob, carol, dave = cls.users
+        for teacher, learner, name in (
+            (alice, bob, "Guitar"),
+            (bob, carol, "Spanish"),
+            (carol, alice, "Chess"),
+        ):
+            Skill.objects.create(user=teacher, name=name)
+            WantedSkill.objects.create(user=learner, name=name)
+
+    def legs(self, cycle):
+        return [(leg.teacher_id, leg.learner_id, leg.term) for leg in cycle.legs.all()]
+
+    def test_full_run_finds_three_way_cycle(self):
+        alice, bob, carol, _ = self.users
+
+        run = discover()
+
+        self.assertEqual(run.cycles_found, 1)
+        cycle = BarterCycle.objects.get()
+        self.assertEqual(cycle.length, 3)
+        self.assertEqual(
+            self.legs(cycle),
+            [
+                (alice.id, bob.id, "guitar"),
+                (bob.id, carol.id, "spanish"),
+                (carol.id, alice.id, "chess"),
+            ],
+        )
+
+    def test_incremental_run_only_revisits_changed_users(self):
+        alice, bob, carol, dave = self.users
+        discover()
+
+        # Dave joins as a fourth party between carol and alice.
+        Skill.objects.create(user=carol, name="Drums")
+        WantedSkill.objects.create(user=dave, name="Drums")
+        Skill.objects.create(user=dave, name="Poker")
+        WantedSkill.objects.create(user=alice, name="Poker")
+
+        run = discover(incremental=True)
+
+        self.assertTrue(run.incremental)
+        self.assertEqual(run.explored_users, 3)
+        self.assertEqual(
+            sorted(BarterCycle.objects.values_list("signature", flat=True)),
+            sorted([
+                f"{alice.id}-{bob.id}-{carol.id}",
+                f"{alice.id}-{bob.id}-{carol.id}-{dave.id}",
+            ]),
+        )
+
+
+class ThreadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user("alice", password="pw")
+        cls.bob = User.objects.create_user("bob", password="pw")
+        cls.carol = User.objects.create_user("carol", password="pw")
+
+    def send(self, sender, recipient, body="hi"):
+        return Message.objects.create(sender=sender, recipient=recipient, body=body)
+
+    def test_threads_follow_new_messages(self):
+        self.send(self.bob, self.alice)
+        self.send(self.carol, self.alice)
+        last = self.send(self.bob, self.alice, "again")
+        self.send(self.alice, self.carol)
+
+        rows = Thread.objects.filter(owner=self.alice).order_by("-last_activity", "id")
+        self.assertEqual(
+            [(t.other, t.unread_count) for t in rows], [(self.carol, 1), (self.bob, 2)]
+        )
+        bob_side = Thread.objects.get(owner=self.bob, other=self.alice)
+        self.assertEqual((bob_side.last_message, bob_side.unread_count), (last, 0))
+
+    def test_inbox_is_a_single_query(self):
+        for sender in (self.bob, self.carol):
+            self.send(sender, self.alice)
+        get_nav_counts(self.alice.pk)
+        self.client.force_login(self.alice)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("skillzone:inbox"))
+
+        # session + user, page of threads
+        self.assertEqual(len(ctx.captured_queries), 3)
+        self.assertEqual([t.other for t in response.context["threads"]], [self.carol, self.bob])
+
+    def test_opening_thread_only_writes_when_unread(self):
+        self.send(self.bob, self.alice)
+        self.client.force_login(self.alice)
+        url = reverse("skillzone:conversation", args=[self.bob.id])
+
+        self.client.get(url)
+        self.assertFalse(Message.objects.filter(is_read=False).exists())
+        self.assertEqual(Thread.objects.get(owner=self.alice).unread_count, 0)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(url)
+        self.assertFalse(
+            [q for q in ctx.captured_queries if q["sql"].startswith("UPDATE")]
+        )
+
+
+class ChatSocketTests(TransactionTestCase):
+    """The WebSocket endpoint, driven directly through its ASGI interface."""
+
+    def setUp(self):
+        self.alice = User.objects.create_user("alice", password="pw")
+        self.bob = User.objects.create_user("bob", password="pw")
+
+    def session_cookie(self, user):
+        self.client.force_login(user)
+        return self.client.cookies["sessionid"].value
+
+    async def connect(self, user, other, after=None, cookie=None):
+        if cookie is None:
+            cookie = await self.async_session_cookie(user)
+        scope = {
+            "type": "websocket",
+            "path": f"/ws/chat/{other.id}/",
+            "query_string": f"after={after}".encode() if after else b"",
+            "headers": [
+                (b"host", b"testserver"),
+                (b"origin", b"http://testserver"),
+                (b"cookie", f"sessionid={cookie}".encode()),
+            ],
+        }
+        socket = ApplicationCommunicator(chat_application, scope)
+        await socket.send_input({"type": "websocket.connect"})
+        return socket, await socket.receive_output(timeout=5)
+
+    async def async_session_cookie(self, user):
+        return await sync_to_async(self.session_cookie)(user)
+
+    async def send(self, socket, **data):
+        await socket.send_input({"type": "websocket.receive", "text": json.dumps(data)})
+
+    async def receive(self, socket):
+        event = await socket.receive_output(timeout=5)
+        return json.loads(event["text"])
+
+    async def disconnect(self, socket):
+        await socket.send_input({"type": "websocket.disconnect", "code": 1000})
+        await socket.wait(timeout=5)
+
+    def test_anonymous_connection_is_refused(self):
+        async def scenario():
+            _, event = await self.connect(self.alice, self.bob, cookie="nope")
+            return event
+
+        self.assertEqual(async_to_sync(scenario)(), {"type": "websocket.close", "code": 4401})
+
+    def test_delivery_typing_read_and_resume(self):
+        async def scenario():
+            alice, accepted = await self.connect(self.alice, self.bob)
+            self.assertEqual(accepted, {"type": "websocket.accept"})
+            bob, _ = await self.connect(self.bob, self.alice)
+
+            await self.send(alice, type="message", body="Hola")
+            first = await self.receive(alice)
+            self.assertEqual((first["body"], first["sender"]), ("Hola", self.alice.id))
+            self.assertEqual(await self.receive(bob), first)
+
+            await self.send(bob, type="typing")
+            self.assertEqual(await self.receive(alice), {"type": "typing", "from": self.bob.id})
+
+            await self.send(bob, type="read")
+            self.assertEqual(
+                await self.receive(alice),
+                {"type": "read", "by": self.bob.id, "up_to": first["id"]},
+            )
+
+            # Bob drops off, misses a message and resumes from his last id.
+            await self.disconnect(bob)
+            await self.send(alice, type="message", body="Adios")
+            second = await self.receive(alice)
+            bob, _ = await self.connect(self.bob, self.alice, after=first["id"])
+            self.assertEqual(await self.receive(bob), second)
+            self.assertTrue(await bob.receive_nothing())
+
+            await self.disconnect(alice)
+            await self.disconnect(bob)
+
+        async_to_sync(scenario)()
+        self.assertEqual(
+            Thread.objects.get(owner=self.bob, other=self.alice).unread_count, 1
+        )
+
+    def test_idle_connections_do_not_use_threads(self):
+        async def scenario():
+            cookie = await self.async_session_cookie(self.alice)
+            threads = threading.active_count()
+            sockets = [
+                (await self.connect(self.alice, self.bob, cookie=cookie))[0]
+                for _ in range(200)
+            ]
+            self.assertEqual(get_channel_layer().subscriber_count(f"user.{self.alice.id}"), 200)
+            self.assertLessEqual(threading.active_count() - threads, 2)
+            for socket in sockets:
+                await self.disconnect(socket)
+            self.assertEqual(get_channel_layer().subscriber_count(), 0)
+
+        async_to_sync(scenario)()
+
+
+class NavCountsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user("alice", password="pw")
+        cls.bob = User.objects.create_user("bob", password="pw")
+        skill = Skill.objects.create(user=cls.alice, name="Guitar")
+        cls.barter = Barter.objects.create(
+            user_from=cls.bob, user_to=cls.alice, skill_from=skill, skill_to=skill
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.alice)
+
+    def assertCounts(self, unread, pending):
+        with self.assertNumQueries(0):
+            cached = get_nav_counts(self.alice.pk)
+        self.assertEqual(cached, {"unread_messages": unread, "pending_barters": pending})
+
+    def test_miss_is_one_query_and_hit_is_free(self):
+        with self.assertNumQueries(1):
+            get_nav_counts(self.alice.pk)
+        self.assertCounts(0, 0)
+
+    def test_counts_follow_messages_and_barters(self):
+        get_nav_counts(self.alice.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            Message.objects.create(sender=self.bob, recipient=self.alice, body="hi")
+            Message.objects.create(sender=self.bob, recipient=self.alice, body="?")
+        self.assertIsNone(cache.get(f"skillzone:nav-counts:{self.alice.pk}"))
+        get_nav_counts(self.alice.pk)
+        self.assertCounts(2, 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.barter.status = Barter.STATUS_ADMIN_APPROVED
+            self.barter.save()
+        get_nav_counts(self.alice.pk)
+        self.assertCounts(2, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse("skillzone:conversation", args=[self.bob.id]))
+            self.client.get(
+                reverse(
+                    "skillzone:update_barter_status",
+                    args=[self.barter.id, Barter.STATUS_ACCEPTED],
+                )
+            )
+        response = self.client.get(reverse("skillzone:home"))
+        self.assertContains(response, "My Barters")
+        self.assertEqual(response.context["nav_counts"]["unread_messages"], 0)
+        # Accepted, but alice still has to mark it completed.
+        self.assertCounts(0, 1)
+
+
+class QueryPlanTests(TestCase):
+    """Every view's queries must be index reads on a seeded database."""
+
+    def test_views_use_indexes(self):
+        hub = User.objects.get(pk=seed_database(users=40, barters=300, messages=400)[0])
+
+        report, problems, _ = audit_views(hub)
+
+        self.assertIn(reverse("skillzone:my_barters"), report)
+        self.assertEqual([str(p) for p in problems], [])
+
+
+class BenchmarkTests(TestCase):
+    def test_benchmark_and_compare(self):
+        hub = User.objects.get(pk=seed_database(users=20, barters=100, messages=100)[0])
+
+        results, skipped = benchmark_views(hub, repeat=2, warmup=0)
+
+        self.assertIn("skillzone:home?q=python", results)
+        self.assertIn("skillzone:update_barter_status", skipped)
+        self.assertEqual(results["skillzone:my_barters"]["status"], 200)
+        self.assertEqual(compare(results, results), [])
+
+        slower = {key: dict(view) for key, view in results.items()}
+        slower["skillzone:inbox"]["queries"] += 1
+        slower["skillzone:matches"]["p95_ms"] += 1000
+        self.assertEqual(len(compare(results, slower)), 2)
+
+
+class UserImportTests(TestCase):
+    CSV = (
+        "username,email,password,password_hash,full_name,gender,skills\n"
+        "ana,ana@example.com,,{hash},Ana Rao,F,Python;Guitar\n"
+        "bad name!,,,,,X,\n"
+        "ben,ben@example.com,correct-horse-battery,,Ben Lee,M,Cooking\n"
+        "ana,other@example.com,,,,,\n"
+        "cam,ANA@example.com,,,,,\n"
+        "dee,,,,Dee,,Python\n"
+    )
+
+    def write_file(self, content, suffix=".csv"):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_imports_valid_rows_and_reports_the_rest(self):
+        from django.contrib.auth.hashers import make_password
+
+        path = self.write_file(self.CSV.format(hash=make_password("secret-ana-1")))
+        errors = []
+
+        checkpoint = import_users(path, chunk_size=2, on_error=lambda line, m: errors.append(line))
+
+        self.assertEqual(errors, [3, 5, 6])
+        self.assertEqual((checkpoint.users_created, checkpoint.rows_rejected), (3, 3))
+        self.assertIsNotNone(checkpoint.finished_at)
+        ana = User.objects.get(username="ana")
+        self.assertTrue(ana.check_password("secret-ana-1"))
+        self.assertTrue(User.objects.get(username="ben").check_password("correct-horse-battery"))
+        self.assertFalse(User.objects.get(username="dee").has_usable_password())
+        self.assertEqual((ana.first_name, ana.last_name), ("Ana", "Rao"))
+        self.assertEqual(ana.profilemodel.gender, "F")
+        self.assertIsNotNone(ana.profilemodel.skills_changed_at)
+        # The derived tables the signals would have filled.
+        self.assertEqual(
+            set(ana.skill_index_entries.values_list("term", flat=True)), {"python", "guitar"}
+        )
+        self.client.force_login(User.objects.get(username="ben"))
+        response = self.client.get(reverse("skillzone:home"), {"q": "guitar"})
+        self.assertContains(response, "Guitar")
+        self.assertContains(
+            self.client.get(reverse("skillzone:home"), {"q": "rao"}), "Guitar"
+        )
+
+    def test_resumes_after_a_failed_chunk(self):
+        lines = "".join(f'{{"username": "u{i}", "skills": ["Chess"]}}\n' for i in range(5))
+        path = self.write_file(lines, suffix=".jsonl")
+        real_bulk_create = Skill.objects.bulk_create
+        calls = []
+
+        def failing_bulk_create(objs, *args, **kwargs):
+            calls.append(objs)
+            if len(calls) == 2:
+                raise RuntimeError("disk full")
+            return real_bulk_create(objs, *args, **kwargs)
+
+        with mock.patch.object(Skill.objects, "bulk_create", failing_bulk_create):
+            with self.assertRaises(RuntimeError):
+                import_users(path, chunk_size=2)
+        self.assertEqual(ImportCheckpoint.objects.get().rows_done, 2)
+        self.assertEqual(User.objects.count(), 2)
+
+        checkpoint = import_users(path, chunk_size=2)
+
+        self.assertEqual((checkpoint.rows_done, checkpoint.users_created), (5, 5))
+        self.assertEqual(Skill.objects.filter(name="Chess").count(), 5)
+        self.assertEqual(import_users(path).users_created, 5)
+
+    def test_hashes_in_a_process_pool(self):
+        path = self.write_file('{"username": "pool", "password": "pool-password-9"}\n', ".jsonl")
+
+        import_users(path, workers=2)
+
+        self.assertTrue(User.objects.get(username="pool").check_password("pool-password-9"))
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        seed_database(users=20, barters=150, messages=50)
+
+    def test_command_streams_filtered_rows_in_one_query(self):
+        out = StringIO()
+        with CaptureQueriesContext(connection) as ctx:
+            call_command(
+                "export_data", "barters", "--filter", "status=Completed",
+                "--chunk-size", "7", stdout=out,
+            )
+
+        rows = list(csv.DictReader(StringIO(out.getvalue())))
+        completed = Barter.objects.filter(status=Barter.STATUS_COMPLETED).order_by("pk")
+        self.assertEqual([int(r["id"]) for r in rows], [b.pk for b in completed])
+        self.assertEqual(rows[0]["user_from"], completed[0].user_from.username)
+        self.assertEqual(rows[0]["skill_to"], completed[0].skill_to.name)
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+    def test_admin_action_streams_ndjson(self):
+        admin = User.objects.create_superuser("root", "root@example.com", "pw")
+        self.client.force_login(admin)
+        ids = list(Message.objects.values_list("pk", flat=True)[:3])
+
+        response = self.client.post(
+            reverse("admin:skillzone_message_changelist"),
+            {"action": "export_ndjson", "_selected_action": ids},
+        )
+
+        self.assertTrue(response.streaming)
+        self.assertIn("attachment;", response["Content-Disposition"])
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)["id"] for line in lines], ids)
+
+    def test_async_stream_matches_sync_stream(self):
+        export = EXPORTS["feedback"]
+
+        async def collect():
+            return [c async for c in astream_export(export, Feedback.objects.all(), chunk_size=5)]
+
+        out = StringIO()
+        call_command("export_data", "feedback", stdout=out)
+        self.assertEqual("".join(async_to_sync(collect)()), out.getvalue())
+
+
+class StaticFilesTests(SimpleTestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        override = override_settings(
+            DEBUG=False,
+            STATIC_ROOT=root,
+            STATICFILES_FINDERS=["django.contrib.staticfiles.finders.FileSystemFinder"],
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        call_command("collectstatic", interactive=False, verbosity=0)
+        self.root = root
+        self.middleware = StaticFilesMiddleware(lambda request: HttpResponse("from django"))
+        self.factory = RequestFactory()
+
+    def get(self, path, **headers):
+        return self.middleware(self.factory.get(path, headers=headers))
+
+    def test_collectstatic_writes_hashed_compressed_files(self):
+        url = staticfiles_storage.url("style.css")
+        self.assertRegex(url, r"^/static/style\.[0-9a-f]{12}\.css$")
+        name = url.removeprefix("/static/")
+        suffixes = ["", ".gz"] + ([".br"] if staticfiles.brotli else [])
+        for suffix in suffixes:
+            self.assertTrue(os.path.exists(os.path.join(self.root, name + suffix)))
+
+    def test_serves_hashed_files_immutably_in_the_accepted_encoding(self):
+        url = staticfiles_storage.url("style.css")
+
+        plain = self.get(url)
+        gzipped = self.get(url, accept_encoding="gzip, deflate")
+        brotli = self.get(url, accept_encoding="gzip;q=0.5, br")
+        refused = self.get(url, accept_encoding="br;q=0, gzip;q=0")
+
+        self.assertEqual(plain["Cache-Control"], "public, max-age=31536000, immutable")
+        self.assertEqual(plain["Vary"], "Accept-Encoding")
+        self.assertNotIn("Content-Encoding", plain)
+        self.assertEqual(gzip.decompress(gzipped.content), plain.content)
+        self.assertEqual(gzipped["Content-Encoding"], "gzip")
+        self.assertEqual(brotli["Content-Encoding"], "br" if staticfiles.brotli else "gzip")
+        self.assertNotIn("Content-Encoding", refused)
+        self.assertEqual(
+            self.get(url, if_none_match=gzipped["ETag"], accept_encoding="gzip").status_code, 304
+        )
+
+    def test_plain_names_revalidate_and_other_paths_pass_through(self):
+        self.assertEqual(self.get("/static/style.css")["Cache-Control"], "public, max-age=60")
+        self.assertEqual(self.get("/static/missing.css").content, b"from django")
+        self.assertEqual(self.get("/").content, b"from django")
+
+    def test_not_used_in_debug(self):
+        with override_settings(DEBUG=True):
+            with self.assertRaises(MiddlewareNotUsed):
+                StaticFilesMiddleware(lambda request: None)
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user("alice", password="pw")
+        cls.bob = User.objects.create_user("bob", password="pw")
+        cls.skill = Skill.objects.create(user=cls.alice, name="Guitar")
+
+    def setUp(self):
+        cache.clear()
+
+    def revalidate(self, url, response):
+        return self.client.get(url, headers={"if-none-match": response["ETag"]})
+
+    def test_anonymous_home(self):
+        url = reverse("skillzone:home")
+        first = self.client.get(url)
+        self.assertIn("Last-Modified", first)
+
+        with self.assertNumQueries(2), self.assertTemplateNotUsed("skillzone/home.html"):
+            self.assertEqual(self.revalidate(url, first).status_code, 304)
+        self.assertEqual(self.revalidate(url + "?q=gui", first).status_code, 200)
+
+        Skill.objects.create(user=self.bob, name="Drums")
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
+
+    def test_user_detail(self):
+        self.client.force_login(self.bob)
+        url = reverse("skillzone:user_detail", args=[self.alice.pk])
+
+        def fresh():
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            return response
+
+        response = fresh()
+        with self.assertTemplateNotUsed("skillzone/user_detail.html"):
+            self.assertEqual(self.revalidate(url, response).status_code, 304)
+
+        changes = [
+            lambda: Skill.objects.filter(pk=self.skill.pk).first().save(),
+            lambda: Skill.objects.filter(pk=self.skill.pk).delete(),
+            lambda: ProfileModel.objects.filter(user=self.alice).update(rating_count=1, rating_sum=4),
+            lambda: self.alice.profilemodel.save(),
+        ]
+        for change in changes:
+            change()
+            self.assertEqual(self.revalidate(url, response).status_code, 200)
+            response = fresh()
+
+        # What the navbar shows the viewer is part of the page too.
+        Message.objects.create(sender=self.alice, recipient=self.bob, body="hi")
+        cache.clear()
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+
+class SkillCardCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user("alice", password="pw")
+        cls.bob = User.objects.create_user("bob", password="pw")
+        cls.guitar = Skill.objects.create(user=cls.alice, name="Guitar", description="Chords")
+        cls.drums = Skill.objects.create(user=cls.alice, name="Drums")
+
+    def setUp(self):
+        cache.clear()
+        fragments.fragment_cache().clear()
+        fragments.reset_stats()
+        self.client.force_login(self.bob)
+        self.url = reverse("skillzone:user_detail", args=[self.alice.pk])
+
+    def test_second_render_hits(self):
+        first = self.client.get(self.url)
+        second = self.client.get(self.url)
+
+        self.assertEqual(fragments.stats(), {"hits": 2, "misses": 2})
+        self.assertContains(first, "Chords")
+        self.assertContains(second, "Chords")
+        self.assertContains(second, "Request Barter", count=2)
+
+    def test_viewer_gets_own_card(self):
+        self.client.get(self.url)
+        self.client.force_login(self.alice)
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(fragments.stats()["hits"], 0)
+        self.assertNotContains(response, "Request Barter")
+
+    def test_saves_bump_versions(self):
+        self.client.get(reverse("skillzone:home"))
+        self.assertContains(self.client.get(reverse("skillzone:home")), "alice")
+        fragments.reset_stats()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.guitar.description = "Scales"
+            self.guitar.save()
+        response = self.client.get(self.url)
+        self.assertContains(response, "Scales")
+        self.assertEqual(fragments.stats(), {"hits": 0, "misses": 2})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.alice.username = "alicia"
+            self.alice.save()
+        response = self.client.get(reverse("skillzone:home"))
+        self.assertContains(response, "alicia")
+
+        # Another skill of the same owner is untouched by a skill save.
+        self.client.get(self.url)
+        fragments.reset_stats()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.drums.save()
+        self.client.get(self.url)
+        self.assertEqual(fragments.stats(), {"hits": 1, "misses": 1})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.alice.profilemodel.save()
+        self.client.get(self.url)
+        self.assertEqual(fragments.stats(), {"hits": 1, "misses": 3})
+
+    def test_ownerless_skill_has_no_actions(self):
+        Skill.objects.create(user=None, name="Orphaned")
+
+        response = self.client.get(reverse("skillzone:home"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Orphaned")
+        # Only alice's two skills offer a barter.
+        self.assertContains(response, "Request Barter", count=2)
+
+
+class StartupTests(SimpleTestCase):
+    def test_warm_up_compiles_every_project_template(self):
+        result = warm_up()
+
+        self.assertEqual(result["template_errors"], [])
+        self.assertGreaterEqual(result["templates"], 20)
+        self.assertGreater(result["urls"], 0)
+        loader = engines["django"].engine.template_loaders[0]
+        cached = {key.split(":")[0] for key in loader.get_template_cache}
+        self.assertTrue({"skillzone/home.html", "partials/skill_card.html", "users/login.html"} <= cached)
+
+
+class DatabaseTuningTests(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    def test_new_connections_get_the_pragmas(self):
+        self.assertEqual(self.pragma("busy_timeout"), settings.SQLITE_PRAGMAS["busy_timeout"])
+        self.assertEqual(self.pragma("synchronous"), 1)  # NORMAL
+        self.assertEqual(self.pragma("cache_size"), settings.SQLITE_PRAGMAS["cache_size"])
+
+
+@override_settings(REPLICA_DATABASES=["replica"], REPLICA_PIN_SECONDS=30)
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    A SQLite file copy of the test database serves as the replica, and
+    only catches up when copied again: the lag lasts until ``sync()``.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Added once the test runner has set up the test databases, which
+        # it must not do for this one, and removed before teardown.
+        cls.directory = tempfile.mkdtemp()
+        connections.settings["replica"] = {
+            **connections.settings["default"],
+            "NAME": os.path.join(cls.directory, "replica.sqlite3"),
+        }
+        cls.databases = {"default", "replica"}
+
+    @classmethod
+    def tearDownClass(cls):
+        connections["replica"].close()
+        del connections["replica"]
+        del connections.settings["replica"]
+        cls.databases = {"default"}
+        shutil.rmtree(cls.directory)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user("alice", password="pw")
+        self.bob = User.objects.create_user("bob", password="pw")
+        Skill.objects.create(user=self.alice, name="Guitar")
+        self.client.force_login(self.bob)
+        self.sync()
+
+    def sync(self):
+        copy_to_replica("replica")
+
+    def test_reads_go_to_the_replica(self):
+        Skill.objects.create(user=self.alice, name="Drums")
+
+        response = self.client.get(reverse("skillzone:user_detail", args=[self.alice.pk]))
+
+        self.assertContains(response, "Guitar")
+        self.assertNotContains(response, "Drums")
+        self.sync()
+        response = self.client.get(reverse("skillzone:user_detail", args=[self.alice.pk]))
+        self.assertContains(response, "Drums")
+
+    def test_writer_reads_from_the_primary_for_a_while(self):
+        url = reverse("skillzone:conversation", args=[self.alice.pk])
+
+        response = self.client.post(url, {"body": "Fancy a lesson?"})
+        self.assertEqual(response.cookies[PIN_COOKIE]["max-age"], 30)
+        self.assertContains(self.client.get(url), "Fancy a lesson?")
+
+        # Once the pin has expired, reads lag behind again.
+        del self.client.cookies[PIN_COOKIE]
+        self.assertNotContains(self.client.get(url), "Fancy a lesson?")
+        self.sync()
+        self.assertContains(self.client.get(url), "Fancy a lesson?")
+
+    def test_nav_counts_are_refilled_from_the_primary(self):
+        self.client.force_login(self.alice)
+        self.sync()
+        url = reverse("skillzone:user_list")
+        self.client.get(url)
+        self.assertEqual(get_nav_counts(self.alice.pk)["unread_messages"], 0)
+
+        Message.objects.create(sender=self.bob, recipient=self.alice, body="Hi")
+        # The invalidated counters are recomputed by a page read from the
+        # replica, which has not seen the message yet.
+        self.client.get(url)
+
+        self.assertEqual(get_nav_counts(self.alice.pk)["unread_messages"], 1)
+
+    def test_skill_cards_are_rendered_from_the_primary(self):
+        fragments.fragment_cache().clear()
+        url = reverse("skillzone:user_detail", args=[self.alice.pk])
+        guitar = Skill.objects.get(name="Guitar")
+        self.client.get(url)
+
+        guitar.description = "Scales"
+        guitar.save()
+        response = self.client.get(url)
+
+        self.assertContains(response, "Scales")
+        self.sync()
+        self.assertContains(self.client.get(url), "Scales")
+
+    def test_outside_requests_reads_use_the_primary(self):
+        Skill.objects.create(user=self.alice, name="Drums")
+
+        self.assertTrue(Skill.objects.filter(name="Drums").exists())
+
+
+class BarterTransitionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user("alice", password="pw")
+        cls.bob = User.objects.create_user("bob", password="pw")
+        cls.staff = User.objects.create_user("staff", password="pw", is_staff=True)
+        skill = Skill.objects.create(user=cls.alice, name="Guitar")
+        cls.barter = Barter.objects.create(
+            user_from=cls.bob, user_to=cls.alice, skill_from=skill, skill_to=skill
+        )
+
+    def events(self):
+        return list(self.barter.events.values_list("transition", "from_status", "to_status", "actor__username"))
+
+    def test_full_lifecycle_is_logged(self):
+        self.assertEqual(apply_transition(self.barter, "approve", self.staff), Barter.STATUS_ADMIN_APPROVED)
+        self.client.force_login(self.alice)
+        self.client.get(reverse("skillzone:update_barter_status", args=[self.barter.pk, "Accepted"]))
+        self.assertEqual(apply_transition(self.barter, "complete", self.bob), Barter.STATUS_ACCEPTED)
+        response = self.client.get(
+            reverse("skillzone:update_barter_status", args=[self.barter.pk, "Completed"]), follow=True
+        )
+
+        self.assertIn("is now fully completed", str(list(response.context["messages"])[-1]))
+        self.barter.refresh_from_db()
+        self.assertEqual(self.barter.status, Barter.STATUS_COMPLETED)
+        self.assertIsNotNone(self.barter.date_responded)
+        self.assertEqual(self.barter.admin, self.staff)
+        self.assertEqual(self.events(), [
+            ("approve", "Pending", "Admin Approved", "staff"),
+            ("accept", "Admin Approved", "Accepted", "alice"),
+            ("complete_from", "Accepted", "Accepted", "bob"),
+            ("complete_to", "Accepted", "Completed", "alice"),
+        ])
+
+    def test_only_matching_state_and_actor(self):
+        with self.assertRaises(TransitionNotAllowed):
+            apply_transition(self.barter, "approve", self.alice)
+        with self.assertRaises(TransitionNotAllowed):
+            apply_transition(self.barter, "accept", self.bob)
+        # Still pending: nothing to accept yet.
+        self.assertIsNone(apply_transition(self.barter, "accept", self.alice))
+
+        apply_transition(self.barter, "approve", self.staff)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(apply_transition(self.barter, "reject", self.alice), Barter.STATUS_REJECTED)
+        update = next(q["sql"] for q in queries if q["sql"].startswith("UPDATE"))
+        # Only the changed columns, and only from the expected state.
+        self.assertNotIn("skill_from_id", update)
+        self.assertIn("\"status\" = 'Admin Approved'", update)
+        self.assertIsNone(apply_transition(self.barter, "accept", self.alice))
+        self.assertEqual(len(self.events()), 2)
+
+    def test_events_are_append_only(self):
+        apply_transition(self.barter, "approve", self.staff)
+        event = BarterEvent.objects.get()
+
+        with self.assertRaises(ValueError):
+            event.save()
+        with self.assertRaises(ValueError):
+            event.delete()
+
+
+class BarterTransitionStressTests(TransactionTestCase):
+    def test_concurrent_transitions_are_never_lost(self):
+        alice = User.objects.create_user("alice", password="pw")
+        bob = User.objects.create_user("bob", password="pw")
+        skill = Skill.objects.create(user=alice, name="Guitar")
+        barters = [
+            Barter.objects.create(
+                user_from=bob, user_to=alice, skill_from=skill, skill_to=skill,
+                status=Barter.STATUS_ACCEPTED,
+            )
+            for _ in range(20)
+        ]
+        racing = Barter.objects.create(
+            user_from=bob, user_to=alice, skill_from=skill, skill_to=skill,
+            status=Barter.STATUS_ADMIN_APPROVED,
+        )
+        # Both participants confirm every barter at once, and alice accepts
+        # and rejects the same barter from several tabs.
+        jobs = [(barter, "complete", user) for barter in barters for user in (alice, bob)]
+        jobs += [(racing, name, alice) for name in ("accept", "reject") * 4]
+        barrier = threading.Barrier(8)
+        results = []
+
+        def work(jobs):
+            try:
+                barrier.wait()
+                for job in jobs:
+                    # The shared in-memory test database fails at once on a
+                    # locked table rather than waiting; retry like a client.
+                    while True:
+                        try:
+                            results.append((job, apply_transition(*job)))
+                            break
+                        except OperationalError:
+                            time.sleep(0.001)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=work, args=(jobs[i::8],)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(results), len(jobs))
+        self.assertEqual(
+            Barter.objects.filter(pk__in=[b.pk for b in barters], status=Barter.STATUS_COMPLETED,
+                                  completed_by_from=True, completed_by_to=True).count(),
+            len(barters),
+        )
+        for barter in barters:
+            self.assertEqual(
+                sorted(barter.events.values_list("transition", flat=True)),
+                ["complete_from", "complete_to"],
+            )
+            # Exactly one of the two confirmations completed the barter.
+            self.assertEqual(barter.events.filter(to_status=Barter.STATUS_COMPLETED).count(), 1)
+        won = [status for (barter, _, _), status in results if barter is racing and status]
+        self.assertEqual(len(won), 1)
+        racing.refresh_from_db()
+        self.assertEqual(racing.status, won[0])
+        self.assertEqual(racing.events.count(), 1)
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        self.reply("220 stand-in ready")
+        sender, recipients = None, []
+        for line in self.rfile:
+            command = line.decode().strip()
+            verb, _, argument = command.partition(" ")
+            verb = verb.upper()
+            address = argument.partition(":")[2].strip().strip("<>")
+            if verb in ("HELO", "EHLO", "NOOP"):
+                self.reply("250 OK")
+            elif verb == "MAIL":
+                sender, recipients = address, []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                answer = server.answers.get(address, "250 OK")
+                if answer.startswith("250"):
+                    recipients.append(address)
+                self.reply(answer)
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = b"".join(iter(self.rfile.readline, b".\r\n"))
+                server.messages.append((sender, recipients, data))
+                self.reply("250 Queued")
+            elif verb == "RSET":
+                sender, recipients = None, []
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Not implemented")
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    """A local SMTP server recording what it receives."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _SMTPHandler)
+        self.connections = 0
+        self.messages = []
+        # Address -> RCPT reply, to refuse some recipients.
+        self.answers = {}
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+
+class EmailOutboxTests(TestCase):
+    def setUp(self):
+        self.smtp = SMTPStandIn()
+        self.addCleanup(self.smtp.server_close)
+        self.addCleanup(self.smtp.shutdown)
+        override = override_settings(
+            EMAIL_BACKEND="skillzone.outbox.OutboxEmailBackend",
+            EMAIL_HOST="127.0.0.1",
+            EMAIL_PORT=self.smtp.server_address[1],
+            EMAIL_HOST_USER="",
+            EMAIL_HOST_PASSWORD="",
+            EMAIL_USE_TLS=False,
+            EMAIL_TIMEOUT=5,
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def queue(self, *recipients):
+        for recipient in recipients:
+            mail.send_mail("Hello", "Body", "team@example.com", [recipient])
+
+    def test_password_reset_is_queued_then_delivered(self):
+        User.objects.create_user("alice", "alice@example.com", "pw")
+
+        response = self.client.post(reverse("password_reset"), {"email": "alice@example.com"})
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.smtp.connections, 0)
+        email = OutgoingEmail.objects.get()
+        self.assertEqual(email.recipients, ["alice@example.com"])
+        self.assertEqual(deliver_outbox(), {"sent": 1, "retried": 0, "dead": 0})
+        sender, recipients, data = self.smtp.messages[0]
+        self.assertEqual(recipients, ["alice@example.com"])
+        self.assertIn(b"/accounts/password_reset_confirm/", data)
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts, email.claim), ("sent", 1, None))
+
+    def test_batch_shares_one_connection(self):
+        self.queue(*(f"user{i}@example.com" for i in range(5)))
+
+        with self.settings(OUTBOX_BATCH_SIZE=3):
+            call_command("deliver_email", stdout=StringIO())
+
+        self.assertEqual(len(self.smtp.messages), 5)
+        self.assertEqual(self.smtp.connections, 2)
+        self.assertFalse(OutgoingEmail.objects.exclude(status="sent").exists())
+
+    def test_retry_with_backoff_then_dead_letter(self):
+        self.smtp.answers = {
+            "busy@example.com": "451 Try again later",
+            "gone@example.com": "550 No such user",
+        }
+        self.queue("busy@example.com", "gone@example.com", "ok@example.com")
+
+        with self.settings(OUTBOX_MAX_ATTEMPTS=2):
+            self.assertEqual(deliver_outbox(), {"sent": 1, "retried": 1, "dead": 1})
+            busy = OutgoingEmail.objects.get(recipients=["busy@example.com"])
+            self.assertGreater(busy.next_attempt_at, timezone.now() + timedelta(seconds=50))
+            self.assertIn("451", busy.last_error)
+            # Not due yet.
+            self.assertEqual(deliver_outbox(), {"sent": 0, "retried": 0, "dead": 0})
+
+            OutgoingEmail.objects.filter(pk=busy.pk).update(next_attempt_at=timezone.now())
+            self.assertEqual(deliver_outbox(), {"sent": 0, "retried": 0, "dead": 1})
+
+        self.assertEqual(
+            dict(OutgoingEmail.objects.values_list("recipients__0", "status")),
+            {"busy@example.com": "dead", "gone@example.com": "dead", "ok@example.com": "sent"},
+        )
+
+    @override_settings(OUTBOX_DELIVERY_BACKEND="django.core.mail.backends.locmem.EmailBackend")
+    def test_other_delivery_backends(self):
+        self.queue("alice@example.com", "bob@example.com")
+        mail.outbox = []
+
+        with mock.patch(
+            "django.core.mail.backends.locmem.EmailBackend.send_messages",
+            side_effect=[ValueError("quota exceeded"), 1],
+        ):
+            self.assertEqual(deliver_outbox(), {"sent": 1, "retried": 1, "dead": 0})
+        self.assertIn("quota", OutgoingEmail.objects.get(recipients=["alice@example.com"]).last_error)
+
+        OutgoingEmail.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(deliver_outbox(), {"sent": 1, "retried": 0, "dead": 0})
+        self.assertEqual(mail.outbox[0].to, ["alice@example.com"])
+        self.assertEqual(mail.outbox[0].message()["Subject"], "Hello")
+        self.assertEqual(self.smtp.connections, 0)
+
+    def test_unreachable_server_keeps_mail_queued(self):
+        self.queue("alice@example.com")
+        self.smtp.shutdown()
+        self.smtp.server_close()
+
+        self.assertEqual(deliver_outbox(), {"sent": 0, "retried": 1, "dead": 0})
+        self.assertEqual(OutgoingEmail.objects.get().status, "queued")
+
+
+@override_settings(EMAIL_BACKEND="skillzone.outbox.OutboxEmailBackend", NOTIFICATION_DIGEST_INTERVAL=3600)
+class NotificationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user("alice", "alice@example.com", "pw")
+        cls.bob = User.objects.create_user("bob", "bob@example.com", "pw")
+        cls.staff = User.objects.create_user("staff", password="pw", is_staff=True)
+        skill = Skill.objects.create(user=cls.alice, name="Guitar")
+        cls.barter = Barter.objects.create(
+            user_from=cls.bob, user_to=cls.alice, skill_from=skill, skill_to=skill
+        )
+
+    def kinds(self, user):
+        return list(user.notifications.order_by("id").values_list("kind", flat=True))
+
+    def test_barter_events_and_messages_notify(self):
+        apply_transition(self.barter, "approve", self.staff)
+        apply_transition(self.barter, "accept", self.alice)
+        apply_transition(self.barter, "complete", self.alice)
+        apply_transition(self.barter, "complete", self.bob)
+        Message.objects.create(sender=self.bob, recipient=self.alice, body="Hi")
+
+        self.assertEqual(self.kinds(self.alice), ["barter_request", "barter_completed", "message"])
+        self.assertEqual(
+            self.kinds(self.bob), ["barter_approved", "barter_accepted", "barter_confirmed"]
+        )
+        self.assertFalse(self.staff.notifications.exists())
+
+    def test_page_marks_rows_seen(self):
+        for i in range(3):
+            Message.objects.create(sender=self.bob, recipient=self.alice, body=str(i))
+        self.client.force_login(self.alice)
+
+        with self.settings(PAGINATE_BY=2):
+            url = reverse("skillzone:notifications")
+            response = self.client.get(url)
+            self.assertContains(response, "bob sent you a message", count=2)
+            self.assertEqual(self.alice.notifications.filter(seen_at__isnull=True).count(), 1)
+            response = self.client.get(url + response.context["notifications"].next_url)
+
+        self.assertContains(response, "New", count=1)
+        self.assertFalse(self.alice.notifications.filter(seen_at__isnull=True).exists())
+
+    def test_digest_groups_per_user_once_per_interval(self):
+        apply_transition(self.barter, "approve", self.staff)
+        for _ in range(3):
+            Message.objects.create(sender=self.bob, recipient=self.alice, body="Hi")
+        read = Message.objects.create(sender=self.alice, recipient=self.bob, body="Read")
+        Message.objects.filter(pk=read.pk).update(is_read=True)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            result = send_digests(workers=1, chunk_size=1)
+
+        self.assertEqual(result, {"users": 2, "queued": 2})
+        digests = {e.recipients[0]: bytes(e.message).decode() for e in OutgoingEmail.objects.all()}
+        self.assertIn("3 new messages from bob", digests["alice@example.com"])
+        self.assertIn("bob sent you a barter request", digests["alice@example.com"])
+        self.assertIn("Your barter request #", digests["bob@example.com"])
+        # A message already read in its conversation is left out.
+        self.assertNotIn("Messages:", digests["bob@example.com"])
+
+        # New activity waits for the next interval.
+        Message.objects.create(sender=self.bob, recipient=self.alice, body="Again")
+        self.assertEqual(send_digests(workers=1), {"users": 0, "queued": 0})
+        Notification.objects.filter(digested_at__isnull=False).update(
+            digested_at=timezone.now() - timedelta(hours=2)
+        )
+        self.assertEqual(send_digests(workers=1), {"users": 1, "queued": 1})
+
+
+@override_settings(
+    SESSION_ENGINE="django.contrib.sessions.backends.cached_db",
+    MESSAGE_STORAGE="django.contrib.messages.storage.cookie.CookieStorage",
+)
+class SessionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user("alice", password="pw")
+        bob = User.objects.create_user("bob", password="pw")
+        skill = Skill.objects.create(user=cls.alice, name="Guitar")
+        cls.barter = Barter.objects.create(user_from=bob, user_to=cls.alice, skill_from=skill, skill_to=skill)
+
+    def setUp(self):
+        caches["sessions"].clear()
+
+    def test_pages_do_not_query_sessions(self):
+        self.client.force_login(self.alice)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse("skillzone:inbox"))
+        self.assertFalse([q for q in ctx.captured_queries if "django_session" in q["sql"]])
+
+    def test_flash_messages_use_a_cookie(self):
+        self.client.force_login(self.alice)
+        response = self.client.get(reverse("skillzone:update_barter_status", args=[self.barter.pk, "Unknown"]))
+        self.assertIn("messages", response.cookies)
+        self.assertNotIn("_messages", self.client.session)
+
+    @override_settings(SESSION_ENGINE="django.contrib.sessions.backends.db")
+    def test_unchanged_session_is_not_saved(self):
+        self.client.force_login(self.alice)
+        session_key = self.client.session.session_key
+        values = iter(["a", "a", "b"])
+
+        def view(request):
+            request.session["choice"] = next(values)
+            return HttpResponse()
+
+        middleware = SessionMiddleware(view)
+        saves = []
+        for _ in range(3):
+            request = RequestFactory().get("/")
+            request.COOKIES[settings.SESSION_COOKIE_NAME] = session_key
+            with CaptureQueriesContext(connection) as ctx:
+                middleware(request)
+            saves.append(any(q["sql"].startswith("UPDATE") for q in ctx.captured_queries))
+
+        # The first request changes the session, the second sets the same
+        # value again.
+        self.assertEqual(saves, [True, False, True])
+
+    def test_per_process_session_cache_is_flagged(self):
+        self.assertEqual([w.id for w in check_session_cache(None)], ["skillzone.W001"])
+        shared = {**settings.CACHES, "sessions": {"BACKEND": "django.core.cache.backends.redis.RedisCache"}}
+        with override_settings(CACHES=shared):
+            self.assertEqual(check_session_cache(None), [])
+        with override_settings(SESSION_ENGINE="django.contrib.sessions.backends.db"):
+            self.assertEqual(check_session_cache(None), [])
+
+    @override_settings(SESSION_ENGINE="django.contrib.sessions.backends.db")
+    def test_purge_expired_sessions_in_chunks(self):
+        store = import_module(settings.SESSION_ENGINE).SessionStore
+        for expiry in (-60, -60, -60, 3600):
+            session = store()
+            session.set_expiry(expiry)
+            session.create()
+
+        self.assertEqual(purge_expired_sessions(chunk_size=2), 3)
+        self.assertEqual(Session.objects.count(), 1)
+
+
+@override_settings(PROFILING_SAMPLE_RATE=1, PROFILING_SERVER_TIMING=True, PROFILING_SLOW_MS=0)
+class ProfilingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user("alice", password="pw")
+
+    def test_server_timing_header(self):
+        self.client.force_login(self.alice)
+        with self.assertLogs("skillzone.profiling"), CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("skillzone:my_barters"))
+
+        timing = response["Server-Timing"]
+        self.assertIn("db;dur=", timing)
+        self.assertIn(f'desc="{len(ctx.captured_queries)} queries"', timing)
+        self.assertIn("tpl;dur=", timing)
+        self.assertIn("view;dur=", timing)
+        self.assertIn('desc="skillzone:my_barters"', timing)
+
+    def test_slow_request_log_lists_repeated_sql(self):
+        def view(request):
+            for i in range(1, 4):
+                list(User.objects.filter(pk__in=range(i)))
+            engines["django"].from_string("{{ x }}").render({"x": 1})
+            return HttpResponse()
+
+        with self.assertLogs("skillzone.profiling") as logs:
+            response = ProfilingMiddleware(view)(RequestFactory().get("/anywhere/"))
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["view"], "unresolved")
+        self.assertEqual(record["queries"], 3)
+        self.assertGreater(record["template_ms"], 0)
+        [shape] = record["repeated_sql"]
+        self.assertEqual(shape["count"], 3)
+        self.assertIn("IN (...)", shape["sql"])
+        self.assertIn("Server-Timing", response)
+
+    def test_unsampled_requests_are_untouched(self):
+        with self.settings(PROFILING_SAMPLE_RATE=0.0001), mock.patch("random.random", return_value=0.5):
+            response = self.client.get(reverse("skillzone:home"))
+        self.assertNotIn("Server-Timing", response)
@@ -0,0 +1,91 @@
+"""
+Per-user conversation summaries for the inbox.
+
+Each message updates two ``Thread`` rows: the sender's (new last message,
+nothing unread) and the recipient's (new last message, one more unread).
+Both are plain ``UPDATE``s with ``F()`` so concurrent messages do not lose
+counts; the rows are only created the first time a pair talks.
+"""
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from .counters import invalidate_nav_counts
+from .models import Message, Thread
+
+
+def _touch(owner_id, other_id, message, unread):
+    values = {
+        "last_message": message,
+        "last_activity": message.created_at,
+        "unread_count": F("unread_count") + unread,
+    }
+    threads = Thread.objects.filter(owner_id=owner_id, other_id=other_id)
+    if threads.update(**values):
+        return
+    try:
+        with transaction.atomic():
+            Thread.objects.create(
+                owner_id=owner_id,
+                other_id=other_id,
+                last_message=message,
+                last_activity=message.created_at,
+                unread_count=unread,
+            )
+    except IntegrityError:
+        # Created concurrently by another message of the same pair.
+        threads.update(**values)
+
+
+def record_message(message):
+    """Fold a newly created ``message`` into both participants' threads."""
+    _touch(message.sender_id, message.recipient_id, message, 0)
+    _touch(message.recipient_id, message.sender_id, message, 1)
+
+
+def mark_read(thread):
+    """
+    Mark everything ``thread.other`` sent to ``thread.owner`` as read.
+
+    Does nothing, and runs no query, when the thread has no unread messages.
+    """
+    if not thread or not thread.unread_count:
+        return
+    with transaction.atomic():
+        read = Message.objects.filter(
+            sender_id=thread.other_id, recipient_id=thread.owner_id, is_read=False
+        ).update(is_read=True)
+        # Subtract rather than reset, so a message that arrives in between
+        # stays counted.
+        Thread.objects.filter(pk=thread.pk).update(
+            unread_count=Greatest(F("unread_count") - read, 0)
+        )
+        invalidate_nav_counts(thread.owner_id)
+    thread.unread_count = 0
+
+
+def rebuild_threads(chunk_size=2000):
+    """
+    Recreate every ``Thread`` row from the messages table, e.g. after
+    messages were bulk-inserted without signals. Returns the number of rows.
+    """
+    threads = {}
+    rows = Message.objects.order_by("created_at", "id").values_list(
+        "id", "sender_id", "recipient_id", "created_at", "is_read"
+    )
+    for message_id, sender_id, recipient_id, created_at, is_read in rows.iterator(
+        chunk_size=chunk_size
+    ):
+        for owner, other in ((sender_id, recipient_id), (recipient_id, sender_id)):
+            thread = threads.setdefault(
+                (owner, other), Thread(owner_id=owner, other_id=other, unread_count=0)
+            )
+            thread.last_message_id = message_id
+            thread.last_activity = created_at
+        if not is_read:
+            threads[(recipient_id, sender_id)].unread_count += 1
+    with transaction.atomic():
+        Thread.objects.all().delete()
+        Thread.objects.bulk_create(threads.values(), batch_size=chunk_size)
+    return len(threads)
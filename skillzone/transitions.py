@@ -0,0 +1,138 @@
+"""
+Barter status changes as compare-and-swap updates.
+
+``TRANSITIONS`` declares every allowed change: the status it starts from,
+who may make it and what it writes. ``apply_transition`` turns one into a
+single ``UPDATE ... WHERE id = ? AND status = <source>`` that writes only
+the changed columns, so two requests racing on the same barter cannot
+both succeed from the same state, and a stale page cannot move a barter
+that has moved on. Completion is per participant: each side sets its own
+flag, and the status becomes Completed in the same statement when the
+other flag is already set, which the database evaluates against the
+latest row, so neither confirmation is lost.
+
+Each successful change appends a ``BarterEvent`` in the same
+transaction. ``update()`` sends no signals, so the navbar counters are
+invalidated here.
+"""
+
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from .counters import invalidate_nav_counts
+from .models import Barter, BarterEvent
+
+
+# Who may make a transition.
+ADMIN = "admin"
+RECEIVER = "receiver"
+PARTICIPANT = "participant"
+
+
+class Transition:
+    def __init__(self, name, source, actor, target=None, responded=False):
+        self.name = name
+        self.source = source
+        self.actor = actor
+        # None: a completion, which sets the actor's flag (see ``changes``).
+        self.target = target
+        self.responded = responded
+
+    def side(self, barter, user):
+        """
+        The actor's side (``"from"``/``"to"``), ``"admin"``, or ``None`` if
+        ``user`` may not make this transition on ``barter``.
+        """
+        if self.actor == ADMIN:
+            return ADMIN if user.is_staff else None
+        if user.pk == barter.user_to_id:
+            return "to"
+        if self.actor == PARTICIPANT and user.pk == barter.user_from_id:
+            return "from"
+        return None
+
+    def condition(self, side):
+        condition = {"status": self.source}
+        if self.target is None:
+            condition[f"completed_by_{side}"] = False
+        return condition
+
+    def changes(self, side, user):
+        if self.target is None:
+            other = "to" if side == "from" else "from"
+            return {
+                f"completed_by_{side}": True,
+                "status": Case(
+                    When(**{f"completed_by_{other}": True}, then=Value(Barter.STATUS_COMPLETED)),
+                    default=F("status"),
+                ),
+            }
+        changes = {"status": self.target}
+        if self.responded:
+            changes["date_responded"] = timezone.now()
+        if self.actor == ADMIN:
+            changes["admin"] = user
+        return changes
+
+
+TRANSITIONS = {
+    transition.name: transition
+    for transition in [
+        Transition("approve", Barter.STATUS_PENDING, ADMIN, Barter.STATUS_ADMIN_APPROVED),
+        Transition("accept", Barter.STATUS_ADMIN_APPROVED, RECEIVER, Barter.STATUS_ACCEPTED, responded=True),
+        Transition("reject", Barter.STATUS_ADMIN_APPROVED, RECEIVER, Barter.STATUS_REJECTED, responded=True),
+        Transition("complete", Barter.STATUS_ACCEPTED, PARTICIPANT),
+    ]
+}
+
+# The transition the barters page asks for with each target status.
+BY_STATUS = {
+    Barter.STATUS_ACCEPTED: "accept",
+    Barter.STATUS_REJECTED: "reject",
+    Barter.STATUS_COMPLETED: "complete",
+}
+
+
+class TransitionNotAllowed(Exception):
+    """The user may not make this transition on this barter."""
+
+
+def record_request(barter, user):
+    """Log the creation of a barter as its first event."""
+    BarterEvent.objects.create(
+        barter=barter,
+        actor=user,
+        transition="request",
+        to_status=barter.status,
+    )
+
+
+def apply_transition(barter, name, user):
+    """
+    Make transition ``name`` on ``barter`` as ``user``.
+
+    Returns the barter's new status, or ``None`` when the barter was not in
+    the transition's source state (it changed meanwhile, or the user
+    already confirmed completion). Raises ``TransitionNotAllowed`` for a
+    user who may never make it.
+    """
+    transition = TRANSITIONS[name]
+    side = transition.side(barter, user)
+    if side is None:
+        raise TransitionNotAllowed(name)
+
+    barters = Barter.objects.filter(pk=barter.pk)
+    with transaction.atomic():
+        if not barters.filter(**transition.condition(side)).update(**transition.changes(side, user)):
+            return None
+        status = barters.values_list("status", flat=True).get()
+        BarterEvent.objects.create(
+            barter_id=barter.pk,
+            actor=user,
+            transition=name if transition.target else f"{name}_{side}",
+            from_status=transition.source,
+            to_status=status,
+        )
+        invalidate_nav_counts(barter.user_from_id, barter.user_to_id)
+    return status
@@ -8,6 +8,15 @@ urlpatterns = [
     path("profile/", views.my_profile, name="profile"),
     path("skills/add/", views.add_skill, name="add_skill"),
 
+    # Wanted skills & reciprocal matches
+    path("matches/", views.matches, name="matches"),
+    path("skills/wanted/add/", views.add_wanted_skill, name="add_wanted_skill"),
+    path(
+        "skills/wanted/<int:wanted_id>/remove/",
+        views.remove_wanted_skill,
+        name="remove_wanted_skill",
+    ),
+
     # Barter flows
     path("barters/", views.my_barters, name="my_barters"),
     path(
@@ -38,4 +47,7 @@ urlpatterns = [
     # Messaging
     path("inbox/", views.inbox, name="inbox"),
     path("messages/<int:user_id>/", views.conversation, name="conversation"),
+
+    # Notifications
+    path("notifications/", views.notifications, name="notifications"),
 ]
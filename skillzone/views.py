@@ -2,13 +2,21 @@ from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth.models import User
-from django.db.models import Q, Avg
+from django.db.models import Q, Prefetch, prefetch_related_objects
 from .models import Barter, Feedback
 
-from .models import Skill, Barter, Feedback, Message
+from .models import Skill, Barter, Feedback, Message, Notification, Thread, WantedSkill
 from users.models import ProfileModel
+from .freshness import conditional, home_validator, user_detail_validator
+from .matching import find_matches
+from .notifications import mark_seen
+from .pagination import paginate_keyset, paginate_keyset_union
+from .search import search_page
+from .threads import mark_read
+from .transitions import BY_STATUS, TransitionNotAllowed, apply_transition, record_request
 
 
+@conditional(home_validator)
 def home(request):
     """
     Dashboard listing skills with simple search.
@@ -16,33 +24,34 @@ def home(request):
     - If the user is logged in, show their own skills separately from
       skills offered by other users.
     - Anonymous users see the combined list of all skills.
-    - Supports search on skill name, description and user name.
+    - Searches go through the skill search index (skill name, description,
+      user name and full name) and are ranked by relevance.
+    - Results are keyset-paginated; see ``skillzone.pagination``.
     """
     query = request.GET.get("q", "").strip()
 
-    all_skills = Skill.objects.select_related("user")
-
-    if query:
-        all_skills = all_skills.filter(
-            Q(name__icontains=query)
-            | Q(description__icontains=query)
-            | Q(user__username__icontains=query)
-            | Q(user__profilemodel__full_name__icontains=query)
-        )
-
     my_skills = None
-    other_skills = None
 
-    if request.user.is_authenticated:
-        my_skills = all_skills.filter(user=request.user)
-        other_skills = all_skills.exclude(user=request.user)
+    if query:
+        page = search_page(request, query)
+        if request.user.is_authenticated:
+            my_skills = [s for s in page if s.user_id == request.user.id]
+            other_skills = [s for s in page if s.user_id != request.user.id]
+        else:
+            other_skills = page.object_list
     else:
-        other_skills = all_skills
+        all_skills = Skill.objects.select_related("user")
+        if request.user.is_authenticated:
+            my_skills = all_skills.filter(user=request.user)
+            all_skills = all_skills.exclude(user=request.user)
+        page = paginate_keyset(request, all_skills, ("id",))
+        other_skills = page.object_list
 
     context = {
         "skills": other_skills,   # skills from other users / all skills
         "my_skills": my_skills,   # skills belonging to the logged-in user
         "query": query,
+        "page": page,
     }
     return render(request, "skillzone/home.html", context)
 
@@ -72,9 +81,7 @@ def my_profile(request):
 ).order_by("-date_requested")
 
 
-    avg_rating = Feedback.objects.filter(
-        barter__user_to=request.user
-    ).aggregate(avg=Avg("rating"))["avg"]
+    avg_rating = profile.avg_rating if profile else None
 
     context = {
         "profile": profile,
@@ -106,6 +113,51 @@ def add_skill(request):
     return render(request, "skillzone/add_skill.html")
 
 
+@login_required
+def add_wanted_skill(request):
+    """
+    Add a skill the user wants to learn (POST from the matches page).
+    """
+    if request.method == "POST":
+        name = request.POST.get("name", "").strip()
+        if not name:
+            messages.error(request, "Skill name is required.")
+        else:
+            WantedSkill.objects.create(user=request.user, name=name[:25])
+            messages.success(request, "Wanted skill added.")
+    return redirect("skillzone:matches")
+
+
+@login_required
+def remove_wanted_skill(request, wanted_id):
+    if request.method == "POST":
+        WantedSkill.objects.filter(id=wanted_id, user=request.user).delete()
+    return redirect("skillzone:matches")
+
+
+@login_required
+def matches(request):
+    """
+    Users who teach what the current user wants and want what the current
+    user teaches, ranked by how much the two sides overlap.
+    """
+    found = find_matches(request.user)
+    users = User.objects.select_related("profilemodel").in_bulk(
+        [m["user_id"] for m in found]
+    )
+    for match in found:
+        match["user"] = users.get(match["user_id"])
+
+    return render(
+        request,
+        "skillzone/matches.html",
+        {
+            "matches": [m for m in found if m["user"]],
+            "wanted_skills": WantedSkill.objects.filter(user=request.user).order_by("name"),
+        },
+    )
+
+
 @login_required
 def send_barter_request(request, skill_id, user_to_id):
     """
@@ -151,6 +203,7 @@ def send_barter_request(request, skill_id, user_to_id):
             user_from=request.user,
             user_to=user_to,
         )
+        record_request(barter, request.user)
 
         messages.success(request, f"Barter request #{barter.id} sent successfully.")
         return redirect("skillzone:my_barters")
@@ -175,23 +228,26 @@ def my_barters(request):
     # barters = Barter.objects.filter(
     #     Q(user_to=request.user) | Q(user_from=request.user)
     # ).select_related("user_from", "user_to", "skill_from", "skill_to").order_by("-date_requested")
-    barters = Barter.objects.filter(
-    Q(user_from=request.user) |
-    Q(
-        user_to=request.user,
-        status__in=[
-            Barter.STATUS_ADMIN_APPROVED,
-            Barter.STATUS_ACCEPTED,
-            Barter.STATUS_REJECTED,
-            Barter.STATUS_COMPLETED,
+    barters = Barter.objects.select_related(
+        "user_from", "user_to", "skill_from", "skill_to"
+    )
+    # Barters I sent, plus those sent to me once an admin approved them.
+    barters = paginate_keyset_union(
+        request,
+        [
+            barters.filter(user_from=request.user),
+            barters.filter(user_to=request.user).exclude(status=Barter.STATUS_PENDING),
         ],
-    )).select_related("user_from", "user_to", "skill_from", "skill_to").order_by("-date_requested")
-
-    feedback_map = {}
+        ("-date_requested", "-id"),
+    )
 
-    for b in barters:
-        fb = b.feedback_set.filter(user=request.user).first()
-        feedback_map[b.id] = fb if fb else None
+    # One query for the current user's feedback on every barter of the page.
+    feedback_map = {
+        fb.barter_id: fb
+        for fb in Feedback.objects.filter(
+            user=request.user, barter_id__in=[b.id for b in barters]
+        )
+    }
 
     return render(
         request,
@@ -206,65 +262,33 @@ def my_barters(request):
 @login_required
 def update_barter_status(request, barter_id, new_status):
     """
-    Update the status of a barter with simple rules:
+    Move a barter to ``new_status`` (see ``skillzone.transitions``):
 
-    - Only the receiver (user_to) can Accept or Reject a Pending barter.
-    - Either participant (user_from or user_to) can mark an Accepted barter as Completed.
-    - Only valid status values from Barter.STATUS_CHOICES are allowed.
+    - Only the receiver (user_to) can Accept or Reject an approved barter.
+    - Each participant marks an Accepted barter as Completed; it is
+      completed once both have.
     """
     barter = get_object_or_404(Barter, id=barter_id)
 
-    valid_statuses = dict(Barter.STATUS_CHOICES).keys()
-    if new_status not in valid_statuses:
+    name = BY_STATUS.get(new_status)
+    if name is None:
         messages.error(request, "Invalid status.")
         return redirect("skillzone:my_barters")
 
-    # Pending -> Accepted / Rejected (only receiver)
-    if (
-    barter.status == Barter.STATUS_ADMIN_APPROVED
-    and request.user == barter.user_to):
-        if new_status in [Barter.STATUS_ACCEPTED, Barter.STATUS_REJECTED]:
-            barter.status = new_status
-            barter.save()
-            messages.success(request, f"Barter #{barter.id} updated to {new_status}.")
-            return redirect("skillzone:my_barters")
-        else:
-            messages.error(request, "You can only accept or reject a pending barter.")
-            return redirect("skillzone:my_barters")
-
-    # Accepted -> Completed (either participant)
-    # if (
-    #     barter.status == Barter.STATUS_ACCEPTED
-    #     and new_status == Barter.STATUS_COMPLETED
-    #     and request.user in [barter.user_from, barter.user_to]
-    # ):
-    #     barter.status = Barter.STATUS_COMPLETED
-    #     barter.save()
-    #     messages.success(request, f"Barter #{barter.id} marked as completed.")
-    #     return redirect("skillzone:my_barters")
-    
-    # Accepted -> Completed (needs BOTH users)
-    if barter.status == Barter.STATUS_ACCEPTED and new_status == Barter.STATUS_COMPLETED:
-        if request.user == barter.user_from:
-            barter.completed_by_from = True
-            messages.success(request, "You marked this barter as completed.")
-        elif request.user == barter.user_to:
-            barter.completed_by_to = True
-            messages.success(request, "You marked this barter as completed.")
-        else:
-            messages.error(request, "You are not allowed to do this.")
-            return redirect("skillzone:my_barters")
+    try:
+        status = apply_transition(barter, name, request.user)
+    except TransitionNotAllowed:
+        messages.error(request, "You are not allowed to update this barter.")
+        return redirect("skillzone:my_barters")
 
-    # If both confirmed → complete barter
-    if barter.completed_by_from and barter.completed_by_to:
-        barter.status = Barter.STATUS_COMPLETED
+    if status is None:
+        messages.error(request, f"Barter #{barter.id} cannot be updated to {new_status} any more.")
+    elif name != "complete":
+        messages.success(request, f"Barter #{barter.id} updated to {new_status}.")
+    elif status == Barter.STATUS_COMPLETED:
         messages.success(request, f"Barter #{barter.id} is now fully completed!")
-
-    barter.save()
-    return redirect("skillzone:my_barters")
-
-
-    messages.error(request, "You are not allowed to update this barter.")
+    else:
+        messages.success(request, "You marked this barter as completed.")
     return redirect("skillzone:my_barters")
 
 
@@ -289,7 +313,7 @@ def give_feedback(request, barter_id):
         if not created:
             fb.rating = rating
             fb.comment = comment
-            fb.save()
+            fb.save(update_fields=["rating", "comment"])
             messages.success(request, "Feedback updated!")
         else:
             messages.success(request, "Feedback submitted!")
@@ -301,14 +325,35 @@ def give_feedback(request, barter_id):
 
 @login_required
 def completed_barters(request):
-    barters = Barter.objects.filter(status="Completed")
+    """
+    Completed barters the current user took part in, with the feedback
+    left by both sides.
+
+    The page is fetched with its users joined in and every barter's
+    feedback prefetched, so the number of queries does not depend on how
+    many barters are listed.
+    """
+    barters = Barter.objects.filter(status=Barter.STATUS_COMPLETED).select_related(
+        "user_from", "user_to"
+    )
+    barters = paginate_keyset_union(
+        request,
+        [barters.filter(user_from=request.user), barters.filter(user_to=request.user)],
+        ("-date_requested", "-id"),
+    )
+    prefetch_related_objects(
+        barters.object_list,
+        Prefetch("feedback_set", queryset=Feedback.objects.select_related("user")),
+    )
 
     feedback_map = {}
     already_feedback_ids = []
 
     for b in barters:
-        fb = b.feedback_set.filter(user=request.user).first()
-        feedback_map[b.id] = fb if fb else None
+        fb = next(
+            (f for f in b.feedback_set.all() if f.user_id == request.user.id), None
+        )
+        feedback_map[b.id] = fb
         if fb:
             already_feedback_ids.append(b.id)
 
@@ -329,7 +374,7 @@ def user_list(request):
     Browse and search other users.
     """
     query = request.GET.get("q", "").strip()
-    users = User.objects.all().select_related("profilemodel")
+    users = User.objects.exclude(pk=request.user.pk).select_related("profilemodel")
 
     if query:
         users = users.filter(
@@ -338,6 +383,8 @@ def user_list(request):
             | Q(skills__name__icontains=query)
         ).distinct()
 
+    users = paginate_keyset(request, users, ("id",))
+
     return render(
         request,
         "skillzone/user_list.html",
@@ -346,6 +393,7 @@ def user_list(request):
 
 
 @login_required
+@conditional(user_detail_validator)
 def user_detail(request, user_id):
     """
     View another user's public profile + skills and overall rating.
@@ -353,9 +401,8 @@ def user_detail(request, user_id):
     other_user = get_object_or_404(User.objects.select_related("profilemodel"), id=user_id)
     skills = Skill.objects.filter(user=other_user)
 
-    avg_rating = Feedback.objects.filter(
-        barter__user_to=other_user
-    ).aggregate(avg=Avg("rating"))["avg"]
+    profile = getattr(other_user, "profilemodel", None)
+    avg_rating = profile.avg_rating if profile else None
 
     return render(
         request,
@@ -374,15 +421,17 @@ def user_detail(request, user_id):
 @login_required
 def inbox(request):
     """
-    Very simple inbox: list of latest messages received.
+    One row per conversation, most recent activity first, with unread badges.
     """
-    messages_qs = Message.objects.filter(recipient=request.user).select_related(
-        "sender"
-    ).order_by("-created_at")
+    threads = paginate_keyset(
+        request,
+        Thread.objects.filter(owner=request.user).select_related("other", "last_message"),
+        ("-last_activity", "id"),
+    )
     return render(
         request,
         "skillzone/inbox.html",
-        {"messages": messages_qs},
+        {"threads": threads},
     )
 
 
@@ -390,19 +439,12 @@ def inbox(request):
 def conversation(request, user_id):
     """
     One-to-one conversation between the current user and another user.
+
+    Shows the latest page of messages; older ones are reached through the
+    page links.
     """
     other_user = get_object_or_404(User, id=user_id)
 
-    messages_qs = Message.objects.filter(
-        Q(sender=request.user, recipient=other_user)
-        | Q(sender=other_user, recipient=request.user)
-    ).select_related("sender", "recipient").order_by("created_at")
-
-    # Mark incoming messages as read
-    Message.objects.filter(
-        sender=other_user, recipient=request.user, is_read=False
-    ).update(is_read=True)
-
     if request.method == "POST":
         body = request.POST.get("body", "").strip()
         if body:
@@ -413,8 +455,41 @@ def conversation(request, user_id):
             )
             return redirect("skillzone:conversation", user_id=other_user.id)
 
+    # Mark incoming messages as read, only if there is anything unread.
+    mark_read(Thread.objects.filter(owner=request.user, other=other_user).first())
+
+    messages_qs = Message.objects.select_related("sender")
+    page = paginate_keyset_union(
+        request,
+        [
+            messages_qs.filter(sender=request.user, recipient=other_user),
+            messages_qs.filter(sender=other_user, recipient=request.user),
+        ],
+        ("-created_at", "-id"),
+    )
+    messages_qs = list(reversed(page.object_list))
+
     return render(
         request,
         "skillzone/conversation.html",
-        {"other_user": other_user, "messages": messages_qs},
+        {"other_user": other_user, "messages": messages_qs, "page": page},
+    )
+
+
+@login_required
+def notifications(request):
+    """
+    The user's notifications, newest first. Unseen ones on the page are
+    highlighted once and marked seen, which keeps them out of the digest.
+    """
+    page = paginate_keyset(
+        request,
+        Notification.objects.filter(user=request.user).select_related("actor"),
+        ("-id",),
+    )
+    mark_seen(page)
+    return render(
+        request,
+        "skillzone/notifications.html",
+        {"notifications": page},
     )
@@ -0,0 +1,138 @@
+// Live updates for the conversation page (see skillzone/chat.py).
+// Without a WebSocket the page keeps working through the plain form POST.
+(function () {
+  var log = document.getElementById("chat-log");
+  if (!log || log.dataset.live !== "1" || !window.WebSocket) {
+    return;
+  }
+
+  var userId = Number(log.dataset.userId);
+  var otherId = Number(log.dataset.otherId);
+  var otherName = log.dataset.otherName;
+  var lastId = Number(log.dataset.lastId) || 0;
+  var form = document.getElementById("chat-form");
+  var input = form.querySelector("textarea[name=body]");
+  var status = document.getElementById("chat-status");
+
+  var socket = null;
+  var retryDelay = 1000;
+  var typingTimer = null;
+  var FATAL_CODES = [4401, 4403, 4404];
+
+  function showStatus(text) {
+    status.textContent = text;
+    status.hidden = !text;
+  }
+
+  function appendMessage(m) {
+    if (m.id <= lastId) {
+      return;
+    }
+    lastId = m.id;
+    var empty = log.querySelector("p.text-muted");
+    if (empty) {
+      empty.remove();
+    }
+    var outgoing = m.sender === userId;
+    var item = document.createElement("div");
+    item.className = "mb-3";
+    item.dataset.messageId = m.id;
+
+    var meta = document.createElement("div");
+    meta.className =
+      "message-meta small text-muted " + (outgoing ? "outgoing" : "incoming");
+    meta.textContent =
+      (outgoing ? "You" : otherName) +
+      " • " +
+      new Date(m.created_at).toLocaleString();
+
+    var wrapper = document.createElement("div");
+    wrapper.className = "message-wrapper";
+    var bubble = document.createElement("div");
+    bubble.className =
+      "sbz-message-bubble " +
+      (outgoing ? "sbz-message-outgoing" : "sbz-message-incoming");
+    bubble.style.whiteSpace = "pre-line";
+    bubble.textContent = m.body;
+    wrapper.appendChild(bubble);
+
+    item.appendChild(meta);
+    item.appendChild(wrapper);
+    log.appendChild(item);
+    log.scrollTop = log.scrollHeight;
+
+    if (!outgoing) {
+      showStatus("");
+      markRead();
+    }
+  }
+
+  function send(data) {
+    if (socket && socket.readyState === WebSocket.OPEN) {
+      socket.send(JSON.stringify(data));
+      return true;
+    }
+    return false;
+  }
+
+  function markRead() {
+    if (document.visibilityState === "visible") {
+      send({ type: "read" });
+    }
+  }
+
+  function connect() {
+    var scheme = window.location.protocol === "https:" ? "wss://" : "ws://";
+    socket = new WebSocket(
+      scheme + window.location.host + "/ws/chat/" + otherId + "/?after=" + lastId
+    );
+
+    socket.onopen = function () {
+      retryDelay = 1000;
+      markRead();
+    };
+
+    socket.onmessage = function (event) {
+      var data = JSON.parse(event.data);
+      if (data.type === "message") {
+        appendMessage(data);
+      } else if (data.type === "typing") {
+        showStatus(otherName + " is typing…");
+        clearTimeout(typingTimer);
+        typingTimer = setTimeout(function () {
+          showStatus("");
+        }, 4000);
+      } else if (data.type === "read") {
+        showStatus("Seen");
+      } else if (data.type === "error" && data.error === "resync") {
+        window.location.reload();
+      }
+    };
+
+    socket.onclose = function (event) {
+      socket = null;
+      if (FATAL_CODES.indexOf(event.code) !== -1) {
+        return;
+      }
+      setTimeout(connect, retryDelay);
+      retryDelay = Math.min(retryDelay * 2, 30000);
+    };
+  }
+
+  form.addEventListener("submit", function (event) {
+    var body = input.value.trim();
+    if (body && send({ type: "message", body: body })) {
+      event.preventDefault();
+      input.value = "";
+    }
+  });
+
+  input.addEventListener("input", function () {
+    send({ type: "typing" });
+  });
+
+  document.addEventListener("visibilitychange", markRead);
+
+  log.scrollTop = log.scrollHeight;
+  connect();
+})();
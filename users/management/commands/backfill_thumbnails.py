@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from users.models import ProfileModel
+from users.thumbnails import schedule_thumbnails, wait_for_thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Generate avatar thumbnails for profile images that do not have them yet.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Regenerate for every image, not only those without thumbnails.',
+        )
+
+    def handle(self, *args, **options):
+        profiles = ProfileModel.objects.exclude(image='')
+        if not options['all']:
+            profiles = profiles.filter(image_digest='')
+        # One job per distinct file: many profiles share the default image.
+        names = list(profiles.order_by().values_list('image', flat=True).distinct())
+        futures = {name: schedule_thumbnails(name) for name in names}
+        wait_for_thumbnails()
+
+        failed = [name for name, future in futures.items() if future.result() is None]
+        for name in failed:
+            self.stderr.write(f'Could not read {name}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated thumbnails for {len(names) - len(failed)} of {len(names)} images.'
+        ))
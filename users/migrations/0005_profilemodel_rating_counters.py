@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_alter_profilemodel_gender_alter_profilemodel_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profilemodel',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profilemodel',
+            name='rating_sum',
+            field=models.FloatField(default=0),
+        ),
+    ]
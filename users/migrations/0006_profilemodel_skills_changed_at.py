@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_profilemodel_rating_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profilemodel',
+            name='skills_changed_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
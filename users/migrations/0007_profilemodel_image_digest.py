@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_profilemodel_skills_changed_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profilemodel',
+            name='image_digest',
+            field=models.CharField(blank=True, editable=False, max_length=16),
+        ),
+    ]
@@ -31,6 +31,47 @@ class ProfileModel(models.Model):
         upload_to='profile',
         validators=[FileExtensionValidator(['png', 'jpg'])]
     )
+    # Reputation counters for feedback on barters this user received.
+    # Kept up to date by skillzone.signals; rebuilt by `reconcile_ratings`.
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.FloatField(default=0)
+    # When the user's offered/wanted skills last changed; used by the
+    # incremental barter cycle search (skillzone.cycles).
+    skills_changed_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    # Digest of ``image`` naming its thumbnails (see users.thumbnails);
+    # empty until they have been generated.
+    image_digest = models.CharField(max_length=16, blank=True, editable=False)
+    # Set by save() only; the derived fields above change without it.
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    # Maintained with queryset updates only, never by saving an instance.
+    DERIVED_FIELDS = ('rating_count', 'rating_sum', 'skills_changed_at', 'image_digest')
 
     def __str__(self) -> str:
         return self.user.username
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored image so a save can tell if it changed.
+        if 'image' in field_names:
+            instance._loaded_image = instance.image.name
+        return instance
+
+    def save(self, *args, **kwargs):
+        # The derived fields are only changed with queryset updates. A plain
+        # save of an instance loaded earlier (e.g. the profile form) must
+        # not write its possibly stale copies back over them.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.DERIVED_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+    @property
+    def avg_rating(self):
+        """Average feedback rating, or ``None`` when there is none yet."""
+        if not self.rating_count:
+            return None
+        return self.rating_sum / self.rating_count
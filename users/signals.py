@@ -1,5 +1,7 @@
 from django.contrib.auth.models import User
 from .models import ProfileModel
+from .thumbnails import schedule_thumbnails
+from django.db import transaction
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
@@ -8,3 +10,18 @@ from django.dispatch import receiver
 def create_profile(sender, instance, created, *args, **kwargs):
     if created:
         ProfileModel.objects.create(user=instance)
+
+
+@receiver(post_save, sender=ProfileModel)
+def make_thumbnails(sender, instance, created, *args, **kwargs):
+    # Profiles created with the default image share its thumbnails, which
+    # backfill_thumbnails generates; only react to a new upload.
+    loaded = getattr(instance, '_loaded_image', None)
+    if created or instance.image.name == loaded:
+        return
+    instance._loaded_image = instance.image.name
+    ProfileModel.objects.filter(pk=instance.pk).update(image_digest='')
+    if not instance.image:
+        return
+    name = instance.image.name
+    transaction.on_commit(lambda: schedule_thumbnails(name))
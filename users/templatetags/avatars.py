@@ -0,0 +1,41 @@
+from django import template
+from django.utils.html import format_html
+
+from users.thumbnails import SIZES, thumbnail_name
+
+register = template.Library()
+
+
+def _srcset(storage, digest, size, extension):
+    candidates = [f'{storage.url(thumbnail_name(digest, size, extension))} 1x']
+    if size * 2 in SIZES:
+        candidates.append(f'{storage.url(thumbnail_name(digest, size * 2, extension))} 2x')
+    return ', '.join(candidates)
+
+
+@register.simple_tag
+def avatar(profile, size=48, css_class='', alt=''):
+    """
+    Square avatar of ``profile``: WebP and JPEG thumbnails with a 2x
+    ``srcset``, lazily loaded. Until the thumbnails exist the original
+    image is shown, scaled by the browser.
+    """
+    size = next((s for s in SIZES if s >= size), SIZES[-1])
+    if not profile or not profile.image:
+        return ''
+    if not profile.image_digest:
+        return format_html(
+            '<img src="{}" width="{}" height="{}" class="{}" alt="{}" loading="lazy" decoding="async">',
+            profile.image.url, size, size, css_class, alt,
+        )
+    storage = profile.image.storage
+    digest = profile.image_digest
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}">'
+        '<img src="{}" srcset="{}" width="{}" height="{}" class="{}" alt="{}" loading="lazy" decoding="async">'
+        '</picture>',
+        _srcset(storage, digest, size, 'webp'),
+        storage.url(thumbnail_name(digest, size, 'jpg')),
+        _srcset(storage, digest, size, 'jpg'),
+        size, size, css_class, alt,
+    )
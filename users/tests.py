@@ -1,3 +1,87 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
 
-# Create your tests here.
+from PIL import Image
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template import Context, Template
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from .models import ProfileModel
+from .thumbnails import SIZES, generate_thumbnails, thumbnail_name, wait_for_thumbnails
+
+
+def image_bytes(size=(640, 480), format='PNG', mode='RGBA'):
+    buffer = io.BytesIO()
+    Image.new(mode, size, (200, 40, 40, 128)[:len(mode)]).save(buffer, format)
+    return buffer.getvalue()
+
+
+class MediaRootMixin:
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        override = override_settings(MEDIA_ROOT=media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+
+class ThumbnailTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('ana', password='pw')
+        self.profile = self.user.profilemodel
+        self.profile.image.save('ana.png', SimpleUploadedFile('ana.png', image_bytes()))
+
+    def test_generates_every_size_and_format(self):
+        digest = generate_thumbnails(self.profile.image.name)
+
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.image_digest, digest)
+        storage = self.profile.image.storage
+        for size in SIZES:
+            for extension, format in (('jpg', 'JPEG'), ('webp', 'WEBP')):
+                with storage.open(thumbnail_name(digest, size, extension)) as f:
+                    with Image.open(f) as thumb:
+                        self.assertEqual((thumb.format, thumb.size), (format, (size, size)))
+
+    def test_avatar_tag(self):
+        template = Template('{% load avatars %}{% avatar profile 40 %}')
+
+        before = template.render(Context({'profile': self.profile}))
+        digest = generate_thumbnails(self.profile.image.name)
+        self.profile.refresh_from_db()
+        after = template.render(Context({'profile': self.profile}))
+
+        self.assertIn(self.profile.image.url, before)
+        self.assertIn(f'{digest}-48.webp 1x', after)
+        self.assertIn(f'{digest}-96.jpg 2x', after)
+        self.assertIn('width="48"', after)
+        self.assertIn('loading="lazy"', after)
+
+    def test_unreadable_image_is_skipped(self):
+        self.profile.image.save('bad.png', SimpleUploadedFile('bad.png', b'not an image'))
+
+        self.assertIsNone(generate_thumbnails(self.profile.image.name))
+        self.assertIsNone(generate_thumbnails('profile/missing.png'))
+
+
+class ThumbnailUploadTests(MediaRootMixin, TransactionTestCase):
+    def test_upload_generates_thumbnails_in_the_background(self):
+        user = User.objects.create_user('ben', 'ben@example.com', 'pw')
+        self.client.force_login(user)
+
+        self.client.post(reverse('users-profile'), {
+            'username': 'ben',
+            'email': 'ben@example.com',
+            'image': SimpleUploadedFile('ben.jpg', image_bytes(format='JPEG', mode='RGB')),
+        })
+        wait_for_thumbnails(timeout=30)
+
+        profile = ProfileModel.objects.get(user=user)
+        self.assertTrue(profile.image.name.startswith('profile/ben'))
+        self.assertEqual(len(profile.image_digest), 16)
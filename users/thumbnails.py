@@ -0,0 +1,122 @@
+"""
+Avatar thumbnails for profile images.
+
+Pages show profile images as small avatars, so sending the original upload
+wastes bandwidth and decode time. After a new image is saved,
+``schedule_thumbnails`` renders it in a background thread pool into square
+JPEG and WebP thumbnails of every size in ``SIZES``. The files are named
+after a digest of the source image, e.g. ``avatars/3f2a...-96.webp``, so
+their content never changes and they can be cached forever; the profile
+only stores the digest (``ProfileModel.image_digest``).
+
+The ``avatar`` template tag (``users.templatetags.avatars``) turns the
+digest into a ``<picture>`` with WebP and JPEG ``srcset``s, and falls back
+to the original image until the thumbnails exist. ``backfill_thumbnails``
+generates them for images uploaded before this existed.
+"""
+
+import hashlib
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+
+# Rendered edge lengths in pixels: 1x and 2x of the 48px and 96px avatars.
+SIZES = (48, 96, 192)
+
+FORMATS = {
+    "jpg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+    "webp": ("WEBP", {"quality": 80, "method": 6}),
+}
+
+DIRECTORY = "avatars"
+
+_executor = None
+_lock = threading.Lock()
+_pending = set()
+
+
+def thumbnail_name(digest, size, extension):
+    return f"{DIRECTORY}/{digest}-{size}.{extension}"
+
+
+def image_digest(data):
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def render_thumbnails(data, digest, storage=default_storage):
+    """Write every size and format of the image in ``data`` that is missing."""
+    with Image.open(io.BytesIO(data)) as source:
+        source = ImageOps.exif_transpose(source)
+        if source.mode not in ("RGB", "L"):
+            # Flatten transparency onto white; JPEG has no alpha.
+            background = Image.new("RGB", source.size, "white")
+            background.paste(source.convert("RGBA"), mask=source.convert("RGBA"))
+            source = background
+        for size in SIZES:
+            thumb = ImageOps.fit(source, (size, size), Image.Resampling.LANCZOS)
+            for extension, (format, options) in FORMATS.items():
+                name = thumbnail_name(digest, size, extension)
+                if storage.exists(name):
+                    continue
+                buffer = io.BytesIO()
+                thumb.convert("RGB").save(buffer, format, **options)
+                storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def generate_thumbnails(image_name):
+    """
+    Render the thumbnails of one stored image and record its digest on
+    every profile using it (many share the default image).
+
+    Returns the digest, or ``None`` when the image is missing or cannot be
+    read. Profiles that switched to another image meanwhile are left
+    alone, so a slow job cannot overwrite a newer upload's digest.
+    """
+    from .models import ProfileModel
+
+    storage = ProfileModel._meta.get_field("image").storage
+    try:
+        with storage.open(image_name, "rb") as f:
+            data = f.read()
+        digest = image_digest(data)
+        render_thumbnails(data, digest, storage)
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+        return None
+    ProfileModel.objects.filter(image=image_name).update(image_digest=digest)
+    return digest
+
+
+def _run(image_name):
+    try:
+        return generate_thumbnails(image_name)
+    finally:
+        # Pool threads outlive the job; do not leave connections open.
+        connections.close_all()
+
+
+def schedule_thumbnails(image_name):
+    """Generate the thumbnails in the background; returns a ``Future``."""
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "THUMBNAIL_WORKERS", 2),
+                thread_name_prefix="thumbnails",
+            )
+        future = _executor.submit(_run, image_name)
+        _pending.add(future)
+    future.add_done_callback(_pending.discard)
+    return future
+
+
+def wait_for_thumbnails(timeout=None):
+    """Block until every scheduled job is done (for commands and tests)."""
+    for future in list(_pending):
+        future.result(timeout)